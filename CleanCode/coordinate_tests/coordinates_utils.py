@@ -9,16 +9,26 @@ COORDINATES = ['x', 'y', 'z']
 def get_moving_average(data_column: pd.Series, minutes: int = 10) -> pd.Series:
     """
     Get the average of the data around a certain point
-    :param data_column: column to average
+    The window bounds are found with searchsorted and the window sums with cumulative sums, so irregular times are
+    handled in one pass
+    :param data_column: column to average, with a sorted DatetimeIndex
     :param minutes: minutes to the right and to the left that will be considered when taking the moving average
     :return:
     """
-    moving_average = pd.Series(np.zeros_like(data_column.values), index=data_column.index)
-    for index, value in data_column.iteritems():
-        start_time = index - timedelta(minutes=minutes)
-        end_time = index + timedelta(minutes=minutes)
-        moving_average.loc[index] = np.mean(data_column.loc[start_time:end_time])
-    return moving_average
+    times = data_column.index.values.astype(np.int64)
+    half_width = int(timedelta(minutes=minutes) / timedelta(microseconds=1)) * 1000
+    lower = np.searchsorted(times, times - half_width, side='left')
+    upper = np.searchsorted(times, times + half_width, side='right')
+
+    values = data_column.values.astype(np.float64)
+    finite = np.isfinite(values)
+    # values are centred before being summed so that the differences of the cumulative sums stay accurate
+    offset = values[finite].mean() if finite.any() else 0
+    sums = np.concatenate(([0], np.cumsum(np.where(finite, values - offset, 0))))
+    counts = np.concatenate(([0], np.cumsum(finite)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        moving_average = (sums[upper] - sums[lower]) / (counts[upper] - counts[lower]) + offset
+    return pd.Series(moving_average, index=data_column.index)
 
 
 def get_derivative(data_column: pd.Series) -> pd.Series:
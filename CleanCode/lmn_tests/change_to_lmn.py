@@ -1,5 +1,5 @@
 from datetime import timedelta, datetime
-from typing import List, Tuple
+from typing import List, Tuple, Union
 import numpy as np
 from numpy import linalg as la
 import pandas as pd
@@ -31,46 +31,52 @@ def get_side_data_v_and_b(imported_data, event_date: datetime, outside_interval:
     return b1, b2, v1, v2
 
 
-def mva(b: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+def mva_batch(b: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
-    MVA analysis of the magnetic field in order to get LMN coordinates (part 1 of hybrid MVA)
-    :param b: magnetic field from which to find LMN coordinates
-    :return:
+    MVA analysis of many windows of the magnetic field at once, with one eigenvalue problem per window solved together
+    :param b: magnetic field of the windows, of shape (number of windows, points, 3), rows containing nan are ignored
+    :return: L, M and N vectors, each of shape (number of windows, 3), nan for windows with less than two points
     """
-    magnetic_matrix = np.matrix([[0, 0, 0], [0, 0, 0], [0, 0, 0]])
-    for n in range(3):
-        bn = np.array([b[n] for b in b])
-        for m in range(3):
-            bm = np.array([b[m] for b in b])
+    b = np.asarray(b, dtype=np.float64)
+    is_valid = np.all(np.isfinite(b), axis=2)
+    b = np.where(is_valid[:, :, np.newaxis], b, 0)
+    number_of_points = is_valid.sum(axis=1)
+    has_enough_points = number_of_points > 1
+    weights = 1 / np.maximum(number_of_points, 1)
 
-            magnetic_matrix[n, m] = np.mean(bn * bm) - np.mean(bn) * np.mean(bm)
+    b_mean = b.sum(axis=1) * weights[:, np.newaxis]
+    magnetic_matrix = np.einsum('wpi,wpj->wij', b, b) * weights[:, np.newaxis, np.newaxis] - np.einsum(
+        'wi,wj->wij', b_mean, b_mean)
+    magnetic_matrix[~has_enough_points] = np.eye(3)
 
-    w, v = la.eig(magnetic_matrix)
-    w_max = np.argmax(w)  # maximum value gives L
-    w_min = np.argmin(w)  # minimum eigenvalue gives N
-    w_intermediate = np.min(np.delete([0, 1, 2], [w_min, w_max]))
+    _, v = la.eigh(magnetic_matrix)  # eigenvalues in ascending order
+    v[~has_enough_points] = np.nan
+    return v[:, :, 2], v[:, :, 1], v[:, :, 0]
 
-    L, N, M = np.zeros(3), np.zeros(3), np.zeros(3)
-    for coordinate in range(len(v[:, w_max])):
-        L[coordinate] = v[:, w_max][coordinate]
-        N[coordinate] = v[:, w_min][coordinate]
-        M[coordinate] = v[:, w_intermediate][coordinate]
 
-    return L, M, N
+def mva(b: Union[List[np.ndarray], np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    MVA analysis of the magnetic field in order to get LMN coordinates (part 1 of hybrid MVA)
+    :param b: magnetic field from which to find LMN coordinates
+    :return:
+    """
+    L, M, N = mva_batch(np.asarray(b, dtype=np.float64).reshape(1, -1, 3))
+    return L[0], M[0], N[0]
 
 
 def hybrid(_l: np.ndarray, b1: np.ndarray, b2: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Use MVA analysis and side data to find more accurate version of LMN coordinates
+    Works on single vectors as well as on arrays of shape (number of events, 3)
     :param _l: intermediate L
     :param b1: b on the left hand side of the data
     :param b2: b on the right hand side of the data
     :return:
     """
     cross_of_b = np.cross(b1, b2)
-    N = cross_of_b / np.sqrt(cross_of_b[0] ** 2 + cross_of_b[1] ** 2 + cross_of_b[2] ** 2)  # normalised vector
+    N = cross_of_b / la.norm(cross_of_b, axis=-1, keepdims=True)  # normalised vector
     cross_n_l = np.cross(N, _l)
-    M = cross_n_l / np.sqrt(cross_n_l[0] ** 2 + cross_n_l[1] ** 2 + cross_n_l[2] ** 2)
+    M = cross_n_l / la.norm(cross_n_l, axis=-1, keepdims=True)
     L = np.cross(M, N)
     return L, M, N
 
@@ -86,16 +92,38 @@ def hybrid_mva(imported_data, event_date, outside_interval: int = 10, inside_int
     :param mva_interval: interval on each side of the event to consider for the MVA analysis
     :return:
     """
+    L, M, N = hybrid_mva_batch(imported_data, [event_date], outside_interval, inside_interval, mva_interval)
+    return L[0], M[0], N[0]
+
+
+def hybrid_mva_batch(imported_data, event_dates: List[datetime], outside_interval: int = 10, inside_interval: int = 2,
+                     mva_interval: int = 30) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds LMN with hybrid mva for many potential events in the same data at once
+    :param imported_data: data to perform the analysis on
+    :param event_dates: dates of the potential events
+    :param outside_interval: most outward limit to consider for the side data
+    :param inside_interval: inward limit to consider for the side data
+    :param mva_interval: interval on each side of the events to consider for the MVA analysis
+    :return: L, M and N vectors, each of shape (number of events, 3)
+    """
     imported_data.data.dropna(inplace=True)
-    b = []
-    data = imported_data.data[event_date - timedelta(minutes=mva_interval):event_date + timedelta(minutes=mva_interval)]
-    b_x, b_y, b_z = data['Bx'].values, data['By'].values, data['Bz'].values
-    for n in range(len(b_x)):
-        b.append(np.array([b_x[n], b_y[n], b_z[n]]))
-    L, M, N = mva(b)
-    b1, b2, v1, v2 = get_side_data_v_and_b(imported_data, event_date, outside_interval, inside_interval)
-    L, M, N = hybrid(L, b1, b2)
-    return L, M, N
+    times = imported_data.data.index.values
+    b = imported_data.data[['Bx', 'By', 'Bz']].values.astype(np.float64)
+    dates = pd.DatetimeIndex(event_dates).values
+    starts = np.searchsorted(times, dates - pd.Timedelta(minutes=mva_interval).to_timedelta64(), side='left')
+    ends = np.searchsorted(times, dates + pd.Timedelta(minutes=mva_interval).to_timedelta64(), side='right')
+
+    b_windows = np.full((len(event_dates), np.max(ends - starts, initial=0), 3), np.nan)
+    for window, (start, end) in enumerate(zip(starts, ends)):
+        b_windows[window, :end - start] = b[start:end]
+    L, _, _ = mva_batch(b_windows)
+
+    side_data = [get_side_data_v_and_b(imported_data, event_date, outside_interval, inside_interval) for event_date in
+                 event_dates]
+    b1 = np.array([b1 for b1, _, _, _ in side_data]).reshape(-1, 3)
+    b2 = np.array([b2 for _, b2, _, _ in side_data]).reshape(-1, 3)
+    return hybrid(L, b1, b2)
 
 
 def change_coordinates_to_lmn(imported_data, L, M=None, N=None) -> None:
@@ -0,0 +1,90 @@
+from typing import Callable, Dict, Optional, Union
+import numpy as np
+import pandas as pd
+
+from data_handler.utils.column_processing import get_window_bounds
+
+# a standard column is either copied from a column of the probe data or derived from the whole probe data frame
+ColumnSource = Union[str, Callable[[pd.DataFrame], pd.Series]]
+
+DEFAULT_B_HALF_WIDTH = np.timedelta64(2, 'm')
+
+
+def sun_distance_from_earth_position(x_column: str, y_column: str, z_column: str,
+                                     to_au: float) -> Callable[[pd.DataFrame], pd.Series]:
+    """
+    Creates the r_sun column builder for probes whose position is given relative to the Earth
+    :param x_column: name of the x position column
+    :param y_column: name of the y position column
+    :param z_column: name of the z position column
+    :param to_au: conversion factor from the position units to astronomical units
+    :return: function returning r_sun for given probe data
+    """
+
+    def r_sun(data: pd.DataFrame) -> pd.Series:
+        x, y, z = (data[column].astype(np.float64) for column in (x_column, y_column, z_column))
+        return 1 - np.sqrt(x ** 2 + y ** 2 + z ** 2) * to_au  # 1- because distance initially from earth
+
+    return r_sun
+
+
+def get_b_half_widths(times: np.ndarray) -> np.ndarray:
+    """
+    Finds the half width of the window over which the magnetic field is averaged around each plasma data point
+    This is the time between the neighbouring data points, and two minutes at the edges of the data
+    :param times: sorted times (as int64 nanoseconds) of the plasma data
+    :return: half widths in nanoseconds
+    """
+    half_widths = np.full(len(times), DEFAULT_B_HALF_WIDTH.astype('timedelta64[ns]').astype(np.int64))
+    if len(times) > 2:
+        half_widths[1:-1] = times[2:] - times[:-2]
+    return half_widths
+
+
+def get_window_means(values: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    """
+    Finds the mean of the finite values between each pair of positions
+    Every window is summed on its own (rather than with cumulative sums) so that the results are identical to the
+    means taken on each slice of the data
+    :param values: values to average
+    :param lower: position of the first value of each window
+    :param upper: position after the last value of each window
+    :return: means of the windows, nan for windows without finite values
+    """
+    finite = np.isfinite(values)
+    finite_values = np.where(finite, values, 0)
+    counts = np.concatenate(([0], np.cumsum(finite)))
+    counts = (counts[upper] - counts[lower]).astype(finite_values.dtype)
+    sums = np.array([finite_values[start:end].sum() for start, end in zip(lower, upper)], dtype=finite_values.dtype)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def merge_probe_columns(data: pd.DataFrame, columns: Dict[str, ColumnSource], data_b: Optional[pd.DataFrame] = None,
+                        b_columns: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """
+    Creates the standard data frame of a probe from the data downloaded from Heliopy
+    :param data: plasma (and possibly magnetic field) data, which gives the times of the merged data
+    :param columns: standard column names, with the data column they are copied from or a function deriving them
+    :param data_b: higher cadence magnetic field data, averaged around each time of data
+    :param b_columns: standard column names, with the data_b column they are averaged from
+    :return: merged data
+    """
+    index = pd.DatetimeIndex(data.index.values)
+    combined_data = pd.DataFrame(index=index)
+    for column_name, source in columns.items():
+        column = data[source] if isinstance(source, str) else source(data)
+        combined_data[column_name] = np.asarray(column, dtype=np.float64)
+
+    if b_columns:
+        if not data_b.index.is_monotonic_increasing:
+            data_b = data_b.sort_index()
+        # times are truncated to microseconds, as datetime objects are
+        times = index.values.astype(np.int64) // 1000 * 1000
+        half_widths = get_b_half_widths(times)
+        lower, upper = get_window_bounds(data_b.index.values.astype(np.int64), times - half_widths,
+                                         times + half_widths)
+        for column_name, source in b_columns.items():
+            combined_data[column_name] = get_window_means(data_b[source].values, lower, upper).astype(np.float64)
+
+    return combined_data
@@ -0,0 +1,169 @@
+import os
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+DEFAULT_COVERAGE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.magrec', 'coverage')
+# the directory of the Helios corefit files can be given with the HELIOS_DATA_DIRECTORY environment variable
+DEFAULT_HELIOS_DATA_DIRECTORY = os.environ.get('HELIOS_DATA_DIRECTORY', os.path.join(
+    os.path.expanduser('~'), 'heliopy', 'data', 'helios', 'E1_experiment', 'New_proton_corefit_data_2017', 'ascii'))
+HELIOS_FILE_PATTERN = re.compile(r'^h(\d)_(\d{4})_(\d{3})_corefit\.csv$')
+
+
+class CoverageIndex:
+    def __init__(self, directory: str = DEFAULT_COVERAGE_DIRECTORY,
+                 data_directory: str = DEFAULT_HELIOS_DATA_DIRECTORY):
+        """
+        Index of the days for which the data of a probe is available, kept as one boolean per day from the first to the
+        last available day
+        The index of a probe is built once from the files of the data directory and saved, and the cumulative sum of
+        the days gives the number of available days between any two dates without going through them.
+        :param directory: directory where the indices of the probes are kept
+        :param data_directory: directory holding the helios1 and helios2 directories of the corefit files, one
+        directory per year
+        """
+        self.directory = directory
+        self.data_directory = data_directory
+        self.coverages: Dict[Union[int, str], Tuple[np.datetime64, np.ndarray, np.ndarray]] = {}
+
+    def __repr__(self):
+        return '{}: {} for the data in {}'.format(self.__class__.__name__, self.directory, self.data_directory)
+
+    def get_file_path(self, probe: Union[int, str]) -> str:
+        """
+        :param probe: probe of the data
+        :return: path of the file holding the index of the probe
+        """
+        return os.path.join(self.directory, 'coverage_{}.npz'.format(probe))
+
+    def build(self, probe: Union[int, str], days: Optional[Iterable[date]] = None):
+        """
+        Builds and saves the index of a probe
+        :param probe: probe of the data
+        :param days: available days, found in the data directory if None
+        :return:
+        """
+        if days is None:
+            days = get_helios_corefit_days(probe, self.data_directory)
+        days = np.unique(np.array(sorted(days), dtype='datetime64[D]'))
+        if len(days) == 0:
+            first_day, available = np.datetime64('1970-01-01', 'D'), np.zeros(0, dtype=bool)
+        else:
+            first_day = days[0]
+            available = np.zeros((days[-1] - first_day).astype(int) + 1, dtype=bool)
+            available[(days - first_day).astype(int)] = True
+        os.makedirs(self.directory, exist_ok=True)
+        file_path = self.get_file_path(probe)
+        temporary_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(temporary_file_path, 'wb') as index_file:
+            np.savez(index_file, first_day=first_day, available=available)
+        os.replace(temporary_file_path, file_path)
+        self.coverages.pop(probe, None)
+
+    def get_coverage(self, probe: Union[int, str]) -> Tuple[np.datetime64, np.ndarray, np.ndarray]:
+        """
+        :param probe: probe of the data
+        :return: first day of the index, availability of each day from it, and cumulative number of available days
+        (starting with 0) of the probe, the index being built if it has not been saved yet
+        """
+        if probe not in self.coverages:
+            if not os.path.isfile(self.get_file_path(probe)):
+                self.build(probe)
+            with np.load(self.get_file_path(probe), allow_pickle=False) as index_file:
+                first_day, available = index_file['first_day'], index_file['available']
+            self.coverages[probe] = (first_day, available, np.concatenate([[0], np.cumsum(available)]))
+        return self.coverages[probe]
+
+    def get_positions(self, probe: Union[int, str], days: np.ndarray) -> np.ndarray:
+        """
+        :param probe: probe of the data
+        :param days: days, as datetime64
+        :return: positions of the days in the index, clipped to the days before and after it
+        """
+        first_day, available, _ = self.get_coverage(probe)
+        return np.clip((days.astype('datetime64[D]') - first_day).astype(int), -1, len(available))
+
+    def is_available(self, probe: Union[int, str],
+                     times: Union[datetime, Iterable[datetime]]) -> Union[bool, np.ndarray]:
+        """
+        :param probe: probe of the data
+        :param times: datetime or datetimes
+        :return: True for the datetimes of which the day is available
+        """
+        first_day, available, _ = self.get_coverage(probe)
+        positions = self.get_positions(probe, np.array(times, dtype='datetime64[ns]'))
+        inside = (positions >= 0) & (positions < len(available))
+        result = np.zeros(positions.shape, dtype=bool)
+        result[inside] = available[positions[inside]]
+        return result if result.ndim else bool(result)
+
+    def count_days(self, probe: Union[int, str], start_day: date, end_day: date) -> int:
+        """
+        :param probe: probe of the data
+        :param start_day: first day
+        :param end_day: last day (included)
+        :return: number of available days between the two days
+        """
+        _, _, cumulative_days = self.get_coverage(probe)
+        start, end = self.get_positions(probe, np.array([start_day, end_day + timedelta(days=1)],
+                                                        dtype='datetime64[D]'))
+        return int(cumulative_days[max(end, 0)] - cumulative_days[max(start, 0)])
+
+    def get_available_days(self, probe: Union[int, str], start_day: date, end_day: date) -> List[date]:
+        """
+        :param probe: probe of the data
+        :param start_day: first day
+        :param end_day: last day (included)
+        :return: available days between the two days
+        """
+        first_day, available, _ = self.get_coverage(probe)
+        start, end = self.get_positions(probe, np.array([start_day, end_day + timedelta(days=1)],
+                                                        dtype='datetime64[D]'))
+        start, end = max(start, 0), max(end, 0)
+        return list((first_day + start + np.flatnonzero(available[start:end])).astype(date))
+
+    def get_month_gaps(self, probe: Union[int, str], start_date: date, end_date: date,
+                       maximum_missing_days: int = 25) -> List[List[int]]:
+        """
+        :param probe: probe of the data
+        :param start_date: date in the first month
+        :param end_date: end of the analysis, the months starting before it are checked
+        :param maximum_missing_days: months with more missing days are gaps
+        :return: year and month of the months with more than maximum_missing_days missing days, as find_data_gaps
+        """
+        month_gaps = []
+        month = datetime(start_date.year, start_date.month, 1)
+        end_date = datetime(end_date.year, end_date.month, end_date.day)
+        while month < end_date:
+            next_month = datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+            # the last day of the month is not checked
+            checked_days = (next_month - month).days - 1
+            missing = checked_days - self.count_days(probe, month.date(), next_month.date() - timedelta(days=2))
+            if missing > maximum_missing_days:
+                month_gaps.append([month.year, month.month])
+            month = next_month
+        return month_gaps
+
+
+def get_helios_corefit_days(probe: Union[int, str], data_directory: str = DEFAULT_HELIOS_DATA_DIRECTORY) -> List[date]:
+    """
+    :param probe: 1 or 2 for Helios 1 or 2
+    :param data_directory: directory holding the helios1 and helios2 directories of the corefit files
+    :return: days for which there is a corefit file
+    """
+    probe_directory = os.path.join(data_directory, 'helios{}'.format(probe))
+    if not os.path.isdir(probe_directory):
+        raise ValueError('Please enter the location of the helios files on your computer (not found in {})'.format(
+            probe_directory))
+    days = []
+    for root, _, file_names in os.walk(probe_directory):
+        for file_name in file_names:
+            match = HELIOS_FILE_PATTERN.match(file_name)
+            if match is not None and match.group(1) == str(probe):
+                days.append(date(int(match.group(2)), 1, 1) + timedelta(days=int(match.group(3)) - 1))
+    return days
+
+
+coverage_index = CoverageIndex()
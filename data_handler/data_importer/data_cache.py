@@ -0,0 +1,182 @@
+import hashlib
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.magrec', 'probe_data')
+DEFAULT_CACHE_SIZE = 2 * 1024 ** 3  # bytes
+# days without data are fetched again after this time, as the data may only have been missing for a while
+DEFAULT_EMPTY_DAY_TTL = 24 * 3600  # seconds
+# changing the version invalidates all the cached days, which should be done when the merged columns change
+CACHE_VERSION = 1
+
+
+class ProbeDataCache:
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY, max_size: int = DEFAULT_CACHE_SIZE,
+                 empty_day_ttl: float = DEFAULT_EMPTY_DAY_TTL):
+        """
+        Local cache of the merged data of the probes, with one file per probe and day
+        Each file holds the numeric standard columns of the day, one array per column. The least recently used days
+        are evicted when the files take more than max_size bytes.
+        :param directory: directory where the cached days are kept
+        :param max_size: maximum size of the cache in bytes
+        :param empty_day_ttl: seconds after which a day cached without data is considered missing again
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.empty_day_ttl = empty_day_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return '{}: {} with {} hits, {} misses and {} evictions'.format(self.__class__.__name__, self.directory,
+                                                                       self.hits, self.misses, self.evictions)
+
+    def get_file_path(self, probe: Union[int, str], day: date) -> str:
+        """
+        :param probe: probe of the data
+        :param day: day of the data
+        :return: path of the file holding the data of the probe on the given day
+        """
+        key = '{}/{:%Y-%m-%d}/{}'.format(probe, day, CACHE_VERSION)
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+    def get_day(self, probe: Union[int, str], day: date) -> Optional[pd.DataFrame]:
+        """
+        :param probe: probe of the data
+        :param day: day of the data
+        :return: cached data of the probe on the given day, None if the day is not cached
+        """
+        file_path = self.get_file_path(probe, day)
+        try:
+            with np.load(file_path, allow_pickle=False) as cached_day:
+                data = pd.DataFrame(cached_day['values'].T, columns=cached_day['columns'],
+                                    index=pd.DatetimeIndex(cached_day['index']))
+                # empty days cached before the fetch time was saved are expired
+                fetched = float(cached_day['fetched']) if 'fetched' in cached_day.files else 0
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return None
+        if len(data) == 0 and time.time() - fetched > self.empty_day_ttl:
+            self.misses += 1
+            return None
+        os.utime(file_path)  # the modification time gives the last use of the day
+        self.hits += 1
+        return data
+
+    def put_day(self, probe: Union[int, str], day: date, data: pd.DataFrame):
+        """
+        Caches the data of a probe on a given day, and evicts the least recently used days if the cache is too big
+        :param probe: probe of the data
+        :param day: day of the data
+        :param data: data of the day, of which only the numeric columns are kept
+        :return:
+        """
+        data = data.select_dtypes(include=[np.number])
+        os.makedirs(self.directory, exist_ok=True)
+        file_path = self.get_file_path(probe, day)
+        # each process writes to its own temporary file, so that processes sharing the cache do not clash
+        temporary_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(temporary_file_path, 'wb') as cache_file:
+            np.savez(cache_file, index=data.index.values.astype('datetime64[ns]'),
+                     columns=np.array(data.columns, dtype=str), values=data.values.astype(np.float64).T,
+                     fetched=np.float64(time.time()))
+        os.replace(temporary_file_path, file_path)
+        self.evict()
+
+    def load_day(self, probe: Union[int, str], day: date, fetch_day: Callable[[date], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Gets the data of a probe on a given day from the cache, fetching and caching it if it is missing
+        :param probe: probe of the data
+        :param day: day of the data
+        :param fetch_day: function returning the data of the probe on a given day
+        :return: data of the day
+        """
+        data = self.get_day(probe, day)
+        if data is None:
+            data = fetch_day(day).select_dtypes(include=[np.number])
+            # data at midnight belongs to the next day
+            data = data.loc[(data.index >= pd.Timestamp(day)) & (data.index < pd.Timestamp(day + timedelta(1)))]
+            self.put_day(probe, day, data)
+        return data
+
+    def get_window(self, probe: Union[int, str], start_datetime: datetime, end_datetime: datetime,
+                   fetch_day: Callable[[date], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Gets the data of a probe between two datetimes from the cached days, fetching and caching the missing days
+        :param probe: probe of the data
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :param fetch_day: function returning the data of the probe on a given day
+        :return: data of the window
+        """
+        days = []
+        day = start_datetime.date()
+        while day <= end_datetime.date():
+            data = self.load_day(probe, day, fetch_day)
+            if len(data) > 0:
+                days.append(data)
+            day += timedelta(days=1)
+        if not days:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+        return pd.concat(days).loc[start_datetime:end_datetime]
+
+    def get_size(self) -> int:
+        """
+        :return: size of the cached days in bytes
+        """
+        return sum(os.path.getsize(file_path) for file_path in self.get_cached_files())
+
+    def get_cached_files(self) -> List[str]:
+        """
+        :return: paths of the files of the cached days
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, file_name) for file_name in os.listdir(self.directory) if
+                file_name.endswith('.npz')]
+
+    def evict(self):
+        """
+        Removes the least recently used days until the cache is smaller than its maximum size
+        Files removed in the meantime by other processes sharing the cache are skipped
+        :return:
+        """
+        cached_files = []
+        for file_path in self.get_cached_files():
+            try:
+                cached_files.append((os.path.getmtime(file_path), os.path.getsize(file_path), file_path))
+            except FileNotFoundError:
+                pass
+        size = sum(file_size for _, file_size, _ in cached_files)
+        for _, file_size, file_path in sorted(cached_files):
+            if size <= self.max_size:
+                break
+            size -= file_size
+            try:
+                os.remove(file_path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """
+        Removes all the cached days
+        :return:
+        """
+        for file_path in self.get_cached_files():
+            os.remove(file_path)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: hits, misses and evictions since the cache was created, and the current size of the cache in bytes
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': self.get_size()}
+
+
+probe_data_cache = ProbeDataCache()
@@ -1,25 +1,271 @@
-from typing import Union
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
 
 from data_handler.data_importer.ace_data import AceData
+from data_handler.data_importer.data_cache import ProbeDataCache, probe_data_cache
 from data_handler.data_importer.helios_data import HeliosData
 from data_handler.data_importer.imp_data import ImpData
 from data_handler.data_importer.imported_data import ImportedData
+from data_handler.data_importer.labelled_dataset import LabelledDataset, labelled_dataset
+from data_handler.data_importer.mission_store import MissionStore, mission_store
 from data_handler.data_importer.ulysses_data import UlyssesData
 from data_handler.data_importer.wind_data import WindData
+from data_handler.data_importer.window_cache import WindowCache, window_cache as default_window_cache
 
 
-def get_probe_data(probe: Union[int, str], start_date: str, start_hour: int = 0, duration: int = 6) -> ImportedData:
-    if probe == 1 or probe == 2:
-        imported_data = HeliosData(probe=probe, start_date=start_date, start_hour=start_hour, duration=duration)
-    elif probe == 'ulysses':
-        imported_data = UlyssesData(start_date=start_date, start_hour=start_hour, duration=duration)
-    elif probe == 'imp_8':
-        imported_data = ImpData(start_date=start_date, duration=duration, start_hour=start_hour, probe=probe)
-    elif probe == 'ace':
-        imported_data = AceData(start_date=start_date, duration=duration, start_hour=start_hour)
-    elif probe == 'wind':
-        imported_data = WindData(start_date=start_date, duration=duration, start_hour=start_hour)
-    else:
+class FetchCounter:
+    def __init__(self):
+        """
+        Counts the windows of data which had to be fetched, and the ones which were cut out of data that was already
+        loaded instead
+        """
+        self.fetched = 0
+        self.avoided = 0
+
+    def __repr__(self):
+        return '{}: {} fetches, {} fetches avoided'.format(self.__class__.__name__, self.fetched, self.avoided)
+
+
+class DataBlocks(list):
+    def __init__(self, data_blocks: Iterable[ImportedData] = ()):
+        """
+        List of loaded data blocks, indexed by probe and day so that the block covering a window is found without
+        looking at all the blocks
+        Blocks can be appended to the list or extend it, other changes of the list are not seen by the index.
+        :param data_blocks: data which was already loaded
+        """
+        super().__init__(data_blocks)
+        self.day_index: Dict[tuple, List[ImportedData]] = {}
+        self.indexed = 0
+
+    def find(self, probe: Union[int, str], start_datetime: datetime,
+             end_datetime: datetime) -> Optional[ImportedData]:
+        """
+        :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :return: first data block of the probe covering the whole window, None if there is none
+        """
+        for data_block in self[self.indexed:]:
+            day = data_block.start_datetime.date()
+            while day <= data_block.end_datetime.date():
+                self.day_index.setdefault((data_block.probe, day), []).append(data_block)
+                day += timedelta(days=1)
+        self.indexed = len(self)
+        for data_block in self.day_index.get((probe, start_datetime.date()), []):
+            if data_block.start_datetime <= start_datetime and end_datetime <= data_block.end_datetime:
+                return data_block
+        return None
+
+
+PROBE_CLASSES = {1: HeliosData, 2: HeliosData, 'ulysses': UlyssesData, 'imp_8': ImpData, 'ace': AceData,
+                 'wind': WindData}
+
+
+def get_probe_class(probe: Union[int, str]) -> type:
+    """
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :return: ImportedData subclass importing the data of the probe
+    """
+    if probe not in PROBE_CLASSES:
         raise NotImplementedError('This function has only been implemented for Helios 1, Helios 2, Ulysses, Imp 8, ACE '
                                   'and Wind so far')
-    return imported_data
+    return PROBE_CLASSES[probe]
+
+
+def get_probe_day(probe: Union[int, str], day: date) -> pd.DataFrame:
+    """
+    Imports the data of a whole day from Heliopy
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param day: day to import
+    :return: data of the day, empty if there is no data on that day
+    """
+    try:
+        return get_probe_class(probe)(start_date=day.strftime('%d/%m/%Y'), start_hour=0, duration=24,
+                                      probe=probe).data
+    except RuntimeWarning:
+        return pd.DataFrame(index=pd.DatetimeIndex([]))
+
+
+def get_probe_data(probe: Union[int, str], start_date: str, start_hour: int = 0, duration: int = 6,
+                   use_cache: bool = True, cache: ProbeDataCache = probe_data_cache,
+                   window_cache: Optional[WindowCache] = default_window_cache,
+                   store: Optional[MissionStore] = mission_store,
+                   dataset: Optional[LabelledDataset] = labelled_dataset, copy: bool = True) -> ImportedData:
+    """
+    Gets the data of a probe, from the labelled dataset or the mission store if one of them holds the whole window, and
+    otherwise from the cached days when use_cache is True
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start_date: string of 'DD/MM/YYYY'
+    :param start_hour: int from 0 to 23 indicating starting hour of given start_date
+    :param duration: int in hours
+    :param use_cache: if True, the data is taken from the mission store or the cache (and imported and cached if
+    missing), otherwise the data is imported from Heliopy
+    :param cache: cache of the probe data on disk
+    :param window_cache: cache of the recently used days in memory, in front of the cache on disk (None to skip it)
+    :param store: store of the ingested probes (None to skip it)
+    :param dataset: dataset of the data around the labelled events (None to skip it)
+    :param copy: if False, the data taken from the dataset, the mission store or the window cache is a read only view
+    of it, which avoids a copy when the data is only read
+    :return: ImportedData of the probe
+    """
+    probe_class = get_probe_class(probe)
+    if not use_cache:
+        return probe_class(start_date=start_date, start_hour=start_hour, duration=duration, probe=probe)
+
+    start_datetime = datetime.strptime(start_date + '/%i' % start_hour, '%d/%m/%Y/%H')
+    end_datetime = start_datetime + timedelta(hours=duration)
+    if dataset is not None and dataset.covers(probe, start_datetime, end_datetime):
+        data = dataset.get_window(probe, start_datetime, end_datetime)
+    elif store is not None and store.covers(probe, start_datetime, end_datetime):
+        data = store.get_window(probe, start_datetime, end_datetime)
+    elif window_cache is None:
+        data = cache.get_window(probe, start_datetime, end_datetime, fetch_day=lambda day: get_probe_day(probe, day))
+    else:
+        data = window_cache.get_window(probe, start_datetime, end_datetime, load_day=lambda day: cache.load_day(
+            probe, day, fetch_day=lambda _day: get_probe_day(probe, _day)))
+    if copy:
+        data = data.copy()
+    return probe_class(start_date=start_date, start_hour=start_hour, duration=duration, probe=probe, data=data)
+
+
+def get_data_window(imported_data: ImportedData, start_datetime: datetime,
+                    duration: int) -> Optional[ImportedData]:
+    """
+    Cuts a window out of data which was already loaded, so that nothing needs to be fetched
+    :param imported_data: loaded data
+    :param start_datetime: start of the window
+    :param duration: duration of the window in hours
+    :return: ImportedData of the window (a copy, which can be modified without changing the loaded data), None if the
+    loaded data does not cover the whole window
+    """
+    end_datetime = start_datetime + timedelta(hours=duration)
+    if start_datetime < imported_data.start_datetime or end_datetime > imported_data.end_datetime:
+        return None
+    times = imported_data.data.index.values
+    start = np.searchsorted(times, np.datetime64(start_datetime, 'ns'), side='left')
+    end = np.searchsorted(times, np.datetime64(end_datetime, 'ns'), side='right')
+    return imported_data.__class__(start_date=start_datetime.strftime('%d/%m/%Y'), start_hour=start_datetime.hour,
+                                   duration=duration, probe=imported_data.probe,
+                                   data=imported_data.data.iloc[start:end].copy())
+
+
+def get_event_data(probe: Union[int, str], start_datetime: datetime, duration: int,
+                   data_blocks: Optional[List[ImportedData]] = None,
+                   fetch_counter: Optional[FetchCounter] = None) -> ImportedData:
+    """
+    Gets the data of a window, from the loaded data blocks when one of them covers it and otherwise with get_probe_data
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start_datetime: start of the window, which starts at the beginning of its hour (as with get_probe_data)
+    :param duration: duration of the window in hours
+    :param data_blocks: data of the probe which was already loaded
+    :param fetch_counter: counter of the fetched and avoided windows
+    :return: ImportedData of the window
+    """
+    start_datetime = start_datetime.replace(minute=0, second=0, microsecond=0)
+    data_block = find_data_block(probe, start_datetime, duration, data_blocks)
+    if data_block is not None:
+        if fetch_counter is not None:
+            fetch_counter.avoided += 1
+        return get_data_window(data_block, start_datetime, duration)
+    if fetch_counter is not None:
+        fetch_counter.fetched += 1
+    return get_probe_data(probe=probe, start_date=start_datetime.strftime('%d/%m/%Y'), start_hour=start_datetime.hour,
+                          duration=duration)
+
+
+def find_data_block(probe: Union[int, str], start_datetime: datetime, duration: int,
+                    data_blocks: Optional[List[ImportedData]]) -> Optional[ImportedData]:
+    """
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start_datetime: start of the window
+    :param duration: duration of the window in hours
+    :param data_blocks: data which was already loaded, looked up in its index if it is DataBlocks
+    :return: first data block of the probe covering the whole window, None if there is none
+    """
+    end_datetime = start_datetime + timedelta(hours=duration)
+    if isinstance(data_blocks, DataBlocks):
+        return data_blocks.find(probe, start_datetime, end_datetime)
+    for data_block in data_blocks or []:
+        if data_block.probe == probe and data_block.start_datetime <= start_datetime and \
+                end_datetime <= data_block.end_datetime:
+            return data_block
+    return None
+
+
+def get_event_data_blocks(probe: Union[int, str], event_dates: List[datetime], duration: int,
+                          fetch_counter: Optional[FetchCounter] = None,
+                          data_blocks: Optional[List[ImportedData]] = None) -> List[ImportedData]:
+    """
+    Loads the data of each day holding events once, with enough data on both sides of the day for the windows of the
+    given duration around all of its events
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param event_dates: dates of the events
+    :param duration: duration of the windows around the events in hours
+    :param fetch_counter: counter of the fetched and avoided windows
+    :param data_blocks: data which was already loaded (for example by the finder), the days whose events all have
+    their windows in it are not loaded again
+    :return: given data blocks and data of the loaded days as DataBlocks (read only, the windows cut out of it with
+    get_data_window can be modified), days without any data are left out
+    """
+    data_blocks = DataBlocks(data_blocks or [])
+    margin = int(np.ceil(duration / 2))
+    # the windows start at the beginning of their hour, as in get_event_data
+    missing_days = {event_date.date() for event_date in event_dates if find_data_block(
+        probe, (event_date - timedelta(hours=duration / 2)).replace(minute=0, second=0, microsecond=0), duration,
+        data_blocks) is None}
+    for day in sorted(missing_days):
+        block_start = datetime.combine(day, datetime.min.time()) - timedelta(hours=margin)
+        if fetch_counter is not None:
+            fetch_counter.fetched += 1
+        try:
+            data_blocks.append(get_probe_data(probe=probe, start_date=block_start.strftime('%d/%m/%Y'),
+                                              start_hour=block_start.hour, duration=24 + 2 * margin, copy=False))
+        except RuntimeWarning:
+            pass
+    return data_blocks
+
+
+def ingest_probe(probe: Union[int, str], start_date: str, end_date: str, store: MissionStore = mission_store,
+                 cache: ProbeDataCache = probe_data_cache, dtype: type = np.float64):
+    """
+    Ingests the data of a probe between two days (included) in the mission store, so that later scans of these days
+    do not need to import or load any data
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start_date: first day to ingest, as 'DD/MM/YYYY'
+    :param end_date: last day to ingest, as 'DD/MM/YYYY'
+    :param store: store of the ingested probes
+    :param cache: cache of the probe data on disk, which gives the days to ingest
+    :param dtype: type of the stored columns, if the probe has not been ingested yet
+    :return:
+    """
+    start_day = datetime.strptime(start_date, '%d/%m/%Y').date()
+    end_day = datetime.strptime(end_date, '%d/%m/%Y').date()
+    store.ingest(probe, start_day, end_day,
+                 load_day=lambda day: cache.load_day(probe, day, fetch_day=lambda _day: get_probe_day(probe, _day)),
+                 dtype=dtype)
+
+
+def build_labelled_dataset(windows: List[dict], dataset: LabelledDataset = labelled_dataset, dtype: type = np.float64):
+    """
+    Builds the dataset of the data around the labelled events once, so that later uses of these windows by
+    get_probe_data are views of the dataset
+    :param windows: dictionaries with the probe, start_datetime and duration (in hours) of each window, and any other
+    information on it (such as its label)
+    :param dataset: dataset to build
+    :param dtype: type of the stored columns
+    :return:
+    """
+
+    def load_window(probe: Union[int, str], start_datetime: datetime, end_datetime: datetime) -> pd.DataFrame:
+        duration = int((end_datetime - start_datetime).total_seconds() // 3600)
+        try:
+            return get_probe_data(probe=probe, start_date=start_datetime.strftime('%d/%m/%Y'),
+                                  start_hour=start_datetime.hour, duration=duration, dataset=None, copy=False).data
+        except RuntimeWarning:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+
+    dataset.build(windows, load_window, dtype=dtype)
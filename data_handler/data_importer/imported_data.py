@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-from typing import Union
+from typing import Optional, Union
 
 import numpy as np
 import pandas as pd
@@ -9,21 +9,22 @@ from data_handler.utils.column_creator import SUPPORTED_COLUMNS
 
 class ImportedData:
     def __init__(self, start_date: str = '27/01/1976', duration: int = 15, start_hour: int = 0,
-                 probe: Union[int, str] = 2):
+                 probe: Union[int, str] = 2, data: Optional[pd.DataFrame] = None):
         """
         :param start_date: string of 'DD/MM/YYYY'
         :param duration: int in hours
         :param start_hour: int from 0 to 23 indicating starting hour of given start_date
         :param probe: 1 for Helios 1, 2 for Helios 2
+        :param data: already imported data (for example from the cache), imported from Heliopy if None
         """
         self.probe = probe
         self.duration = duration
         self.start_datetime = datetime.strptime(start_date + '/%i' % start_hour, '%d/%m/%Y/%H')
         self.end_datetime = self.start_datetime + timedelta(hours=duration)
-        self.data = self.get_imported_data()
+        self.data = self.get_imported_data() if data is None else data
 
         if len(self.data) == 0:
-            raise RuntimeWarning('Created ImportedData object has retrieved no data: {}'.format(self))
+            raise RuntimeWarning('Created {} object has retrieved no data: {}'.format(self.__class__.__name__, self))
 
     def __repr__(self):
         return '{}: at {:%H:%M %d/%m/%Y} by probe {}. Data has {} entries.'.format(self.__class__.__name__,
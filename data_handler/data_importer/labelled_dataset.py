@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from data_handler.data_importer.mission_store import TIMES_FILE, get_memmap_window, open_memmaps
+
+DEFAULT_DATASET_DIRECTORY = os.path.join(os.path.expanduser('~'), '.magrec', 'labelled_events')
+INDEX_FILE = 'index.json'
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+class LabelledDataset:
+    def __init__(self, directory: str = DEFAULT_DATASET_DIRECTORY):
+        """
+        Dataset of the data around the labelled events, built once so that the optimisations and tests do not need to
+        import any data
+        The windows of the events are merged into segments when they overlap. The segments of each probe are stored one
+        after the other in one binary file per column (and one for the times, as int64 nanoseconds since the epoch),
+        and the index gives the offset and length of each segment. The files are memory mapped, so that the windows
+        are opened as views of them.
+        :param directory: directory where the dataset is kept
+        """
+        self.directory = directory
+        self.index: Optional[dict] = None
+        self.is_index_read = False
+        self.opened_probes: Dict[str, Dict[str, np.memmap]] = {}
+
+    def __repr__(self):
+        return '{}: {}'.format(self.__class__.__name__, self.directory)
+
+    def get_index(self) -> Optional[dict]:
+        """
+        :return: columns of each probe, segments (probe, start, end, offset, length) and labelled windows of the
+        dataset, None if the dataset has not been built (the file is only read once, as covers is called for every
+        window of data)
+        """
+        if not self.is_index_read:
+            try:
+                with open(os.path.join(self.directory, INDEX_FILE)) as index_file:
+                    self.index = json.load(index_file)
+            except FileNotFoundError:
+                self.index = None
+            self.is_index_read = True
+        return self.index
+
+    def build(self, windows: List[dict], load_window: Callable[[Union[int, str], datetime, datetime], pd.DataFrame],
+              dtype: type = np.float64):
+        """
+        Builds the dataset from the labelled windows, replacing the previous dataset
+        :param windows: dictionaries with the probe, start_datetime and duration (in hours) of each window, and any
+        other information on it (such as its label) which is kept in the index
+        :param load_window: function returning the data of a probe between two datetimes
+        :param dtype: type of the stored columns, np.float32 halves the size of the dataset
+        :return:
+        """
+        temporary_directory = '{}.{}.tmp'.format(self.directory, os.getpid())
+        shutil.rmtree(temporary_directory, ignore_errors=True)
+        os.makedirs(temporary_directory)
+        index = {'columns': {}, 'dtype': np.dtype(dtype).name, 'segments': [], 'windows': []}
+        for window in windows:
+            index['windows'].append({key: value.strftime(DATETIME_FORMAT) if isinstance(value, datetime) else value
+                                     for key, value in window.items()})
+
+        lengths: Dict[str, int] = {}
+        for probe, start_datetime, end_datetime in get_segments(windows):
+            data = load_window(probe, start_datetime, end_datetime).select_dtypes(include=[np.number])
+            if len(data) == 0:
+                continue
+            probe_key = str(probe)
+            probe_directory = os.path.join(temporary_directory, probe_key)
+            os.makedirs(probe_directory, exist_ok=True)
+            if probe_key not in index['columns']:
+                index['columns'][probe_key] = list(data.columns)
+            data = data.reindex(columns=index['columns'][probe_key])
+            with open(os.path.join(probe_directory, TIMES_FILE), 'ab') as times_file:
+                times_file.write(data.index.values.astype('datetime64[ns]').astype(np.int64).tobytes())
+            for column in index['columns'][probe_key]:
+                with open(os.path.join(probe_directory, column + '.bin'), 'ab') as column_file:
+                    column_file.write(data[column].values.astype(dtype).tobytes())
+            index['segments'].append({'probe': probe, 'start': start_datetime.strftime(DATETIME_FORMAT),
+                                      'end': end_datetime.strftime(DATETIME_FORMAT),
+                                      'offset': lengths.get(probe_key, 0), 'length': len(data)})
+            lengths[probe_key] = lengths.get(probe_key, 0) + len(data)
+
+        with open(os.path.join(temporary_directory, INDEX_FILE), 'w') as index_file:
+            json.dump(index, index_file)
+        self.index = None
+        self.is_index_read = False
+        self.opened_probes = {}
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.replace(temporary_directory, self.directory)
+
+    def find_segment(self, probe: Union[int, str], start_datetime: datetime, end_datetime: datetime) -> Optional[dict]:
+        """
+        :param probe: probe of the data
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :return: segment of the dataset holding the whole window, None if there is none
+        """
+        index = self.get_index()
+        if index is None:
+            return None
+        start, end = start_datetime.strftime(DATETIME_FORMAT), end_datetime.strftime(DATETIME_FORMAT)
+        for segment in index['segments']:
+            # the datetimes are compared as strings, which have the same order
+            if str(segment['probe']) == str(probe) and segment['start'] <= start and end <= segment['end']:
+                return segment
+        return None
+
+    def covers(self, probe: Union[int, str], start_datetime: datetime, end_datetime: datetime) -> bool:
+        """
+        :param probe: probe of the data
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :return: True if one of the segments of the dataset holds the whole window
+        """
+        return self.find_segment(probe, start_datetime, end_datetime) is not None
+
+    def open_probe(self, probe: Union[int, str]) -> Dict[str, np.memmap]:
+        """
+        :param probe: probe of the data
+        :return: read only memory maps of the times and columns of the probe
+        """
+        probe_key = str(probe)
+        if probe_key not in self.opened_probes:
+            index = self.get_index()
+            length = sum(segment['length'] for segment in index['segments'] if str(segment['probe']) == probe_key)
+            self.opened_probes[probe_key] = open_memmaps(os.path.join(self.directory, probe_key),
+                                                         index['columns'][probe_key], index['dtype'], length)
+        return self.opened_probes[probe_key]
+
+    def get_window(self, probe: Union[int, str], start_datetime: datetime,
+                   end_datetime: datetime) -> Optional[pd.DataFrame]:
+        """
+        Opens the data of the probe between two datetimes (included) as views of the stored columns
+        :param probe: probe of the data
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :return: data of the window (the stored files are opened read only, so they are never modified), None if the
+        dataset does not hold the whole window
+        """
+        segment = self.find_segment(probe, start_datetime, end_datetime)
+        if segment is None:
+            return None
+        return get_memmap_window(self.open_probe(probe), start_datetime, end_datetime, offset=segment['offset'],
+                                 length=segment['length'])
+
+
+def get_segments(windows: List[dict]) -> List[list]:
+    """
+    Merges the overlapping windows of each probe, with their bounds extended to whole hours
+    :param windows: dictionaries with the probe, start_datetime and duration (in hours) of each window
+    :return: probe, start and end of each segment, sorted by probe and start
+    """
+    bounds = []
+    for window in windows:
+        start_datetime = window['start_datetime'].replace(minute=0, second=0, microsecond=0)
+        end_datetime = window['start_datetime'] + timedelta(hours=window['duration'])
+        if end_datetime != end_datetime.replace(minute=0, second=0, microsecond=0):
+            end_datetime = end_datetime.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        bounds.append([window['probe'], start_datetime, end_datetime])
+
+    segments = []
+    for probe, start_datetime, end_datetime in sorted(bounds, key=lambda _bounds: (str(_bounds[0]), _bounds[1])):
+        if segments and segments[-1][0] == probe and start_datetime <= segments[-1][2]:
+            segments[-1][2] = max(segments[-1][2], end_datetime)
+        else:
+            segments.append([probe, start_datetime, end_datetime])
+    return segments
+
+
+labelled_dataset = LabelledDataset()
@@ -0,0 +1,212 @@
+import json
+import os
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STORE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.magrec', 'mission_store')
+TIMES_FILE = 'times.bin'
+METADATA_FILE = 'metadata.json'
+
+
+class MissionStore:
+    def __init__(self, directory: str = DEFAULT_STORE_DIRECTORY):
+        """
+        Store of the whole data of the probes, with one binary file per column (and one for the times, as int64
+        nanoseconds since the epoch) for each probe
+        The files are memory mapped, so that any window of the data is opened as views of them without being read into
+        memory.
+        :param directory: directory where the data of the probes is kept
+        """
+        self.directory = directory
+        self.metadata: Dict[Union[int, str], Optional[dict]] = {}
+        self.empty_days: Dict[Union[int, str], Set[str]] = {}
+        self.opened_probes: Dict[Union[int, str], Dict[str, np.memmap]] = {}
+
+    def __repr__(self):
+        return '{}: {}'.format(self.__class__.__name__, self.directory)
+
+    def get_probe_directory(self, probe: Union[int, str]) -> str:
+        """
+        :param probe: probe of the data
+        :return: directory holding the files of the probe
+        """
+        return os.path.join(self.directory, str(probe))
+
+    def get_metadata(self, probe: Union[int, str]) -> Optional[dict]:
+        """
+        :param probe: probe of the data
+        :return: columns, dtypes, length, first and last ingested days and ingested days without data of the data of
+        the probe, None if the probe has not been ingested or its metadata cannot be read (the file is only read once,
+        as covers is called for every window of data)
+        """
+        if probe not in self.metadata:
+            try:
+                with open(os.path.join(self.get_probe_directory(probe), METADATA_FILE)) as metadata_file:
+                    self.metadata[probe] = json.load(metadata_file)
+            except (FileNotFoundError, ValueError):
+                self.metadata[probe] = None
+        return self.metadata[probe]
+
+    def get_empty_days(self, probe: Union[int, str]) -> Set[str]:
+        """
+        :param probe: probe of the data
+        :return: ingested days without data of the probe, as YYYY-MM-DD strings
+        """
+        if probe not in self.empty_days:
+            metadata = self.get_metadata(probe)
+            self.empty_days[probe] = set(metadata.get('empty_days', [])) if metadata is not None else set()
+        return self.empty_days[probe]
+
+    def covers(self, probe: Union[int, str], start_datetime: datetime, end_datetime: datetime) -> bool:
+        """
+        :param probe: probe of the data
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :return: True if all the days of the window have been ingested with data (the days without data may have been
+        missing only for a while, so they are left to the other sources of data)
+        """
+        metadata = self.get_metadata(probe)
+        if metadata is None or metadata['first_day'] is None:
+            return False
+        first_day = datetime.strptime(metadata['first_day'], '%Y-%m-%d').date()
+        last_day = datetime.strptime(metadata['last_day'], '%Y-%m-%d').date()
+        if start_datetime.date() < first_day or last_day < end_datetime.date():
+            return False
+        empty_days = self.get_empty_days(probe)
+        day = start_datetime.date()
+        while empty_days and day <= end_datetime.date():
+            if '{:%Y-%m-%d}'.format(day) in empty_days:
+                return False
+            day += timedelta(days=1)
+        return True
+
+    def ingest(self, probe: Union[int, str], start_day: date, end_day: date, load_day: Callable[[date], pd.DataFrame],
+               dtype: type = np.float64):
+        """
+        Appends the data of the probe between two days (included) to the store
+        The days must follow the last ingested day, and the columns are the ones of the first ingested day with data.
+        The days without data are recorded, so that covers leaves the windows touching them to the other sources.
+        :param probe: probe of the data
+        :param start_day: first day to ingest
+        :param end_day: last day to ingest
+        :param load_day: function returning the data of the probe on a given day
+        :param dtype: type of the stored columns if the probe has not been ingested yet, np.float32 halves the size of
+        the store
+        :return:
+        """
+        probe_directory = self.get_probe_directory(probe)
+        os.makedirs(probe_directory, exist_ok=True)
+        # the metadata is read again in case another store ingested the probe in the meantime
+        self.metadata.pop(probe, None)
+        self.empty_days.pop(probe, None)
+        metadata = self.get_metadata(probe) or {'columns': None, 'dtype': np.dtype(dtype).name, 'length': 0,
+                                                'first_day': None, 'last_day': None}
+        metadata.setdefault('empty_days', [])
+        if metadata['last_day'] is not None:
+            next_day = datetime.strptime(metadata['last_day'], '%Y-%m-%d').date() + timedelta(days=1)
+            if start_day != next_day:
+                raise ValueError('The data of probe {} can only be extended from {}'.format(probe, next_day))
+        self.opened_probes.pop(probe, None)
+
+        # anything written after the last saved metadata (by an interrupted ingestion) is discarded
+        for file_name in os.listdir(probe_directory):
+            if file_name.endswith('.bin'):
+                item_size = 8 if file_name == TIMES_FILE else np.dtype(metadata['dtype']).itemsize
+                os.truncate(os.path.join(probe_directory, file_name), metadata['length'] * item_size)
+
+        day = start_day
+        while day <= end_day:
+            data = load_day(day)
+            if len(data) > 0:
+                if metadata['columns'] is None:
+                    metadata['columns'] = list(data.select_dtypes(include=[np.number]).columns)
+                data = data.reindex(columns=metadata['columns'])
+                with open(os.path.join(probe_directory, TIMES_FILE), 'ab') as times_file:
+                    times_file.write(data.index.values.astype('datetime64[ns]').astype(np.int64).tobytes())
+                for column in metadata['columns']:
+                    with open(os.path.join(probe_directory, column + '.bin'), 'ab') as column_file:
+                        column_file.write(data[column].values.astype(metadata['dtype']).tobytes())
+                metadata['length'] += len(data)
+            else:
+                metadata['empty_days'].append('{:%Y-%m-%d}'.format(day))
+            metadata['first_day'] = metadata['first_day'] or '{:%Y-%m-%d}'.format(day)
+            metadata['last_day'] = '{:%Y-%m-%d}'.format(day)
+            # the metadata marks the data as saved, so it is replaced at once and never left half written
+            metadata_path = os.path.join(probe_directory, METADATA_FILE)
+            temporary_metadata_path = '{}.{}.tmp'.format(metadata_path, os.getpid())
+            with open(temporary_metadata_path, 'w') as metadata_file:
+                json.dump(metadata, metadata_file)
+            os.replace(temporary_metadata_path, metadata_path)
+            self.metadata[probe] = metadata
+            self.empty_days.pop(probe, None)
+            day += timedelta(days=1)
+
+    def open_probe(self, probe: Union[int, str]) -> Dict[str, np.memmap]:
+        """
+        :param probe: probe of the data
+        :return: read only memory maps of the times and columns of the probe
+        """
+        if probe not in self.opened_probes:
+            metadata = self.get_metadata(probe)
+            if metadata is None:
+                raise KeyError('Probe {} has not been ingested in {}'.format(probe, self))
+            arrays = {}
+            if metadata['length'] > 0:
+                arrays = open_memmaps(self.get_probe_directory(probe), metadata['columns'], metadata['dtype'],
+                                      metadata['length'])
+            self.opened_probes[probe] = arrays
+        return self.opened_probes[probe]
+
+    def get_window(self, probe: Union[int, str], start_datetime: datetime, end_datetime: datetime) -> pd.DataFrame:
+        """
+        Opens the data of the probe between two datetimes (included) as views of the stored columns
+        :param probe: probe of the data
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :return: data of the window (the stored files are opened read only, so they are never modified)
+        """
+        arrays = self.open_probe(probe)
+        if not arrays:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+        return get_memmap_window(arrays, start_datetime, end_datetime)
+
+
+def open_memmaps(directory: str, columns: List[str], dtype: str, length: int) -> Dict[str, np.memmap]:
+    """
+    :param directory: directory holding one binary file per column, and TIMES_FILE for the times
+    :param columns: names of the columns
+    :param dtype: type of the stored columns
+    :param length: number of stored rows
+    :return: read only memory maps of the times and columns
+    """
+    arrays = {TIMES_FILE: np.memmap(os.path.join(directory, TIMES_FILE), dtype=np.int64, mode='r', shape=(length,))}
+    for column in columns:
+        arrays[column] = np.memmap(os.path.join(directory, column + '.bin'), dtype=dtype, mode='r', shape=(length,))
+    return arrays
+
+
+def get_memmap_window(arrays: Dict[str, np.memmap], start_datetime: datetime, end_datetime: datetime, offset: int = 0,
+                      length: Optional[int] = None) -> pd.DataFrame:
+    """
+    Opens the rows between two datetimes (included) as views of the memory maps
+    :param arrays: memory maps of the times and columns, as returned by open_memmaps
+    :param start_datetime: start of the window
+    :param end_datetime: end of the window
+    :param offset: first row of the sorted rows to look into
+    :param length: number of sorted rows to look into, all the rows after the offset if None
+    :return: data of the window
+    """
+    times = arrays[TIMES_FILE]
+    length = len(times) - offset if length is None else length
+    sorted_times = times[offset:offset + length]
+    start = offset + np.searchsorted(sorted_times, np.datetime64(start_datetime, 'ns').astype(np.int64), side='left')
+    end = offset + np.searchsorted(sorted_times, np.datetime64(end_datetime, 'ns').astype(np.int64), side='right')
+    index = pd.DatetimeIndex(np.asarray(times[start:end]).view('datetime64[ns]'))
+    # a dictionary of arrays is not consolidated into a single block when it is not copied
+    return pd.DataFrame({column: np.asarray(array[start:end]) for column, array in arrays.items() if
+                         column != TIMES_FILE}, index=index, copy=False)
+
+mission_store = MissionStore()
@@ -1,24 +1,34 @@
-import numpy as np
+from typing import Optional
 import pandas as pd
-from datetime import timedelta
 from heliopy.data import wind
 
+from data_handler.data_importer.column_merger import merge_probe_columns, sun_distance_from_earth_position
 from data_handler.data_importer.imported_data import ImportedData
 
+WIND_COLUMNS = {
+    'vp_x': 'Proton_VX_nonlin',
+    'vp_y': 'Proton_VY_nonlin',
+    'vp_z': 'Proton_VZ_nonlin',
+    'n_p': 'Proton_Np_nonlin',
+    # no temperature yet, the threedp_pm P_TEMP data would have to be averaged around the swe_h1 times
+    'r_sun': sun_distance_from_earth_position('xgse', 'ygse', 'zgse', 4.26354E-5),  # earth radius to au
+    'Bx': 'BX',
+    'By': 'BY',
+    'Bz': 'BZ',
+}
+
 
 class WindData(ImportedData):
-    def __init__(self, start_date: str = '25/12/1994', duration: int = 15, start_hour: int = 0, probe: str = 'wind'):
+    def __init__(self, start_date: str = '25/12/1994', duration: int = 15, start_hour: int = 0, probe: str = 'wind',
+                 data: Optional[pd.DataFrame] = None):
         """
         :param start_date: string of 'DD/MM/YYYY'
         :param duration: int in hours
         :param start_hour: int from 0 to 23 indicating starting hour of given start_date
         :param probe: 'ace'
+        :param data: already imported data, imported from Heliopy if None
         """
-        super().__init__(start_date, duration, start_hour, probe)
-        self.data = self.get_imported_data()
-
-        if len(self.data) == 0:
-            raise RuntimeWarning('Created AceData object has retrieved no data: {}'.format(self))
+        super().__init__(start_date, duration, start_hour, probe, data)
 
     def __repr__(self):
         return '{}: at {:%H:%M %d/%m/%Y} by probe {}. Data has {} entries.'.format(self.__class__.__name__,
@@ -31,32 +41,7 @@ class WindData(ImportedData):
         data_bv = data_bv.data  # data_bv was previously a time series
         # data_t = wind.threedp_pm(self.start_datetime, self.end_datetime)
         # data_t = data_t.data  # data_b was previously a time series
-        indices = [pd.Timestamp(index).to_pydatetime() for index in data_bv.index.values]
-        combined_data = pd.DataFrame(index=indices)
-        iteration = 0
-        for index in indices:
-            interval = 2
-            if iteration != 0 and iteration != len(indices) - 1:
-                interval = (indices[iteration + 1] - indices[iteration - 1]).total_seconds() / 60
-            combined_data.loc[index, 'vp_x'] = data_bv.loc[index, 'Proton_VX_nonlin']
-            combined_data.loc[index, 'vp_y'] = data_bv.loc[index, 'Proton_VY_nonlin']
-            combined_data.loc[index, 'vp_z'] = data_bv.loc[index, 'Proton_VZ_nonlin']
-            combined_data.loc[index, 'n_p'] = data_bv.loc[index, 'Proton_Np_nonlin']
-            # for now both temperatures are equal to keep it similar to other classes as no separate data was found
-            # combined_data.loc[index, 'Tp_par'] = np.mean(
-            #     data_t.loc[index - timedelta(minutes=interval):index + timedelta(minutes=interval), 'P_TEMP'])
-            # combined_data.loc[index, 'Tp_perp'] = np.mean(
-            #     data_t.loc[index - timedelta(minutes=interval):index + timedelta(minutes=interval), 'P_TEMP'])
-            combined_data.loc[index, 'r_sun'] = 1 - np.sqrt(
-                data_bv.loc[index, 'xgse'] ** 2 + data_bv.loc[index, 'ygse'] ** 2 + data_bv.loc[
-                    index, 'zgse'] ** 2) * 4.26354E-5  # earth radius to au, 1- because distance initially from earth
-            combined_data.loc[index, 'Bx'] = data_bv.loc[index, 'BX']
-            combined_data.loc[index, 'By'] = data_bv.loc[index, 'BY']
-            combined_data.loc[index, 'Bz'] = data_bv.loc[index, 'BZ']
-
-            iteration += 1
-
-        return combined_data
+        return merge_probe_columns(data_bv, WIND_COLUMNS)
 
 
 if __name__ == '__main__':
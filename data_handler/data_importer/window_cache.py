@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOW_CACHE_SIZE = 512 * 1024 ** 2  # bytes
+
+
+class DayBlock:
+    def __init__(self, data: pd.DataFrame):
+        """
+        Data of a probe on a given day, kept as read only arrays so that windows can be views of it
+        :param data: data of the day
+        """
+        self.times = data.index.values.astype('datetime64[ns]')
+        self.values = np.ascontiguousarray(data.values, dtype=np.float64)
+        self.columns = list(data.columns)
+        self.times.flags.writeable = False
+        self.values.flags.writeable = False
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes
+
+    def get_bounds(self, start_datetime: datetime, end_datetime: datetime) -> Tuple[int, int]:
+        """
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :return: positions of the first point of the block in the window and of the point after the last one
+        """
+        return (np.searchsorted(self.times, np.datetime64(start_datetime, 'ns'), side='left'),
+                np.searchsorted(self.times, np.datetime64(end_datetime, 'ns'), side='right'))
+
+
+class WindowCache:
+    def __init__(self, max_size: int = DEFAULT_WINDOW_CACHE_SIZE):
+        """
+        In memory cache of the recently used days of data, from which the windows are assembled
+        Windows within a single day are views of the cached arrays, windows over several days are concatenations of
+        them. The least recently used days are evicted when the cached arrays take more than max_size bytes.
+        :param max_size: maximum size of the cached arrays in bytes
+        """
+        self.max_size = max_size
+        self.blocks: Dict[Tuple[Union[int, str], date], DayBlock] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return '{}: {} days in {} bytes, hit rate of {:.2f} with {} evictions'.format(
+            self.__class__.__name__, len(self.blocks), self.size, self.get_hit_rate(), self.evictions)
+
+    def get_block(self, probe: Union[int, str], day: date, load_day: Callable[[date], pd.DataFrame]) -> DayBlock:
+        """
+        :param probe: probe of the data
+        :param day: day of the data
+        :param load_day: function returning the data of the probe on a given day, used when the day is not cached
+        :return: data of the probe on the given day
+        """
+        key = (probe, day)
+        if key in self.blocks:
+            self.blocks.move_to_end(key)
+            self.hits += 1
+            return self.blocks[key]
+
+        self.misses += 1
+        block = DayBlock(load_day(day))
+        self.blocks[key] = block
+        self.size += block.nbytes
+        while self.size > self.max_size and self.blocks:
+            _, evicted_block = self.blocks.popitem(last=False)
+            self.size -= evicted_block.nbytes
+            self.evictions += 1
+        return block
+
+    def get_window(self, probe: Union[int, str], start_datetime: datetime, end_datetime: datetime,
+                   load_day: Callable[[date], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Assembles the data of a probe between two datetimes from the cached days, loading the missing days
+        :param probe: probe of the data
+        :param start_datetime: start of the window
+        :param end_datetime: end of the window
+        :param load_day: function returning the data of the probe on a given day
+        :return: data of the window, which must not be modified in place when it is a view of a single day
+        """
+        slices: List[Tuple[DayBlock, int, int]] = []
+        day = start_datetime.date()
+        while day <= end_datetime.date():
+            block = self.get_block(probe, day, load_day)
+            start, end = block.get_bounds(start_datetime, end_datetime)
+            if end > start:
+                slices.append((block, start, end))
+            day += timedelta(days=1)
+
+        if not slices:
+            return pd.DataFrame(index=pd.DatetimeIndex([]))
+        columns = slices[0][0].columns
+        if len(slices) == 1:
+            block, start, end = slices[0]
+            return pd.DataFrame(block.values[start:end], index=pd.DatetimeIndex(block.times[start:end]),
+                                columns=columns, copy=False)
+        if any(block.columns != columns for block, _, _ in slices):
+            return pd.concat([pd.DataFrame(block.values[start:end], index=pd.DatetimeIndex(block.times[start:end]),
+                                           columns=block.columns) for block, start, end in slices])
+        return pd.DataFrame(np.concatenate([block.values[start:end] for block, start, end in slices]),
+                            index=pd.DatetimeIndex(np.concatenate([block.times[start:end] for block, start, end in
+                                                                   slices])), columns=columns)
+
+    def get_hit_rate(self) -> float:
+        """
+        :return: fraction of the requested days that were already cached
+        """
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0
+
+    def report(self) -> Dict[str, Union[int, float]]:
+        """
+        :return: hits, misses, evictions and hit rate since the cache was created, and the current number of cached
+        days and size in bytes
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'hit_rate': self.get_hit_rate(),
+                'days': len(self.blocks), 'size': self.size}
+
+    def clear(self):
+        """
+        Removes all the cached days
+        :return:
+        """
+        self.blocks.clear()
+        self.size = 0
+
+
+window_cache = WindowCache()
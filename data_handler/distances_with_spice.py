@@ -78,7 +78,7 @@ def get_data(dates: list, probe: int = 2) -> List[ImportedData]:
     for n in range(len(dates)):
         start, end = dates[n][0], dates[n][1]
         delta_t = end - start
-        hours = np.int(delta_t.total_seconds() / 3600)
+        hours = int(delta_t.total_seconds() / 3600)
         start_date = start.strftime('%d/%m/%Y')
         try:
             _data = get_probe_data(probe=probe, start_date=start_date, duration=hours)
@@ -87,7 +87,7 @@ def get_data(dates: list, probe: int = 2) -> List[ImportedData]:
             print('Previous method not working, switching to "day-to-day" method')
             hard_to_get_data = []
             interval = 24
-            number_of_loops = np.int(hours/interval)
+            number_of_loops = int(hours/interval)
             for loop in range(number_of_loops):
                 try:
                     hard_data = get_probe_data(probe=probe, start_date=start.strftime('%d/%m/%Y'), duration=interval)
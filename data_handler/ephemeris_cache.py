@@ -0,0 +1,178 @@
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import astropy.units as u
+import numpy as np
+
+DEFAULT_EPHEMERIS_DIRECTORY = os.path.join(os.path.expanduser('~'), '.magrec', 'ephemeris')
+NANOSECONDS_PER_DAY = 24 * 3600 * 10 ** 9
+
+
+class Ephemeris:
+    def __init__(self, times: np.ndarray, positions: np.ndarray):
+        """
+        Positions of a body at given times, which can be used in place of the spice trajectories (with times, x, y and
+        z) and interpolated at any time
+        :param times: times of the positions, as datetime64
+        :param positions: positions of the body in au, of shape (number of times, 3)
+        """
+        self.times_array = np.asarray(times, dtype='datetime64[ns]')
+        self.positions = np.asarray(positions, dtype=np.float64).reshape(-1, 3)
+        self._times: Optional[List[datetime]] = None
+
+    def __repr__(self):
+        return '{}: {} positions'.format(self.__class__.__name__, len(self.times_array))
+
+    def __len__(self):
+        return len(self.times_array)
+
+    @property
+    def times(self) -> List[datetime]:
+        if self._times is None:
+            self._times = list(self.times_array.astype('datetime64[us]').astype(datetime))
+        return self._times
+
+    @property
+    def x(self) -> u.Quantity:
+        return self.positions[:, 0] * u.au
+
+    @property
+    def y(self) -> u.Quantity:
+        return self.positions[:, 1] * u.au
+
+    @property
+    def z(self) -> u.Quantity:
+        return self.positions[:, 2] * u.au
+
+    def get_positions(self, times: Union[datetime, Iterable[datetime]]) -> np.ndarray:
+        """
+        :param times: datetime or datetimes
+        :return: positions in au at the given times, linearly interpolated between the known positions, of shape
+        (number of times, 3) (or (3,) for a single datetime), nan outside of the known times
+        """
+        requested_times = np.array(times, dtype='datetime64[ns]')
+        known_times = self.times_array.astype(np.int64)
+        positions = np.stack([np.interp(requested_times.reshape(-1).astype(np.int64), known_times,
+                                        self.positions[:, n], left=np.nan, right=np.nan) for n in range(3)], axis=-1)
+        return positions[0] if requested_times.ndim == 0 else positions
+
+    def get_radii(self, times: Union[datetime, Iterable[datetime]]) -> np.ndarray:
+        """
+        :param times: datetime or datetimes
+        :return: distances from the observing body in au at the given times
+        """
+        return np.linalg.norm(self.get_positions(times), axis=-1)
+
+
+class EphemerisCache:
+    def __init__(self, directory: str = DEFAULT_EPHEMERIS_DIRECTORY):
+        """
+        Cache of the positions of the bodies, with one table per body, observing body, frame and interval
+        The times of the tables are multiples of the interval since the epoch, so that a table can be extended on both
+        sides by generating only the missing positions.
+        :param directory: directory where the tables are kept
+        """
+        self.directory = directory
+        self.tables: Dict[Tuple[str, str, str, float], Ephemeris] = {}
+        self.generated = 0
+
+    def __repr__(self):
+        return '{}: {} with {} generated positions'.format(self.__class__.__name__, self.directory, self.generated)
+
+    def get_file_path(self, body: Union[int, str], observing_body: str, frame: str, interval: float) -> str:
+        """
+        :param body: 1 or 2 for Helios 1 or 2, or name of a planet
+        :param observing_body: body from which the positions are seen
+        :param frame: frame of the positions
+        :param interval: interval between the positions in days
+        :return: path of the file holding the table
+        """
+        file_name = 'ephemeris_{}_{}_{}_{}.npz'.format(body, observing_body, frame, interval).replace(' ', '_')
+        return os.path.join(self.directory, file_name)
+
+    def get_table(self, body: Union[int, str], start_time: datetime, end_time: datetime,
+                  generate_positions: Callable[[List[datetime]], np.ndarray], observing_body: str = 'Sun',
+                  frame: str = 'ECLIPJ2000', interval: float = 1) -> Ephemeris:
+        """
+        Gets the table of positions of a body, generating and saving the positions which are not in it yet
+        :param body: 1 or 2 for Helios 1 or 2, or name of a planet
+        :param start_time: first time which must be in the table
+        :param end_time: last time which must be in the table
+        :param generate_positions: function returning the positions in au of the body at the given times
+        :param observing_body: body from which the positions are seen
+        :param frame: frame of the positions
+        :param interval: interval between the positions in days
+        :return: table of the positions, covering at least the two times
+        """
+        key = (str(body), observing_body, frame, interval)
+        file_path = self.get_file_path(body, observing_body, frame, interval)
+        if key not in self.tables and os.path.isfile(file_path):
+            with np.load(file_path, allow_pickle=False) as table_file:
+                self.tables[key] = Ephemeris(table_file['times'], table_file['positions'])
+        table = self.tables.get(key, Ephemeris(np.zeros(0, dtype='datetime64[ns]'), np.zeros((0, 3))))
+
+        step = int(round(interval * NANOSECONDS_PER_DAY))
+        start = np.datetime64(start_time, 'ns').astype(np.int64) // step * step
+        end = -(-np.datetime64(end_time, 'ns').astype(np.int64) // step) * step
+        # the numbers of times are counted with integers, np.arange can miss the last time of long ranges
+        if len(table) > 0:
+            known_start, known_end = table.times_array[[0, -1]].astype(np.int64)
+            missing_before = start + step * np.arange(max(0, -(-(known_start - start) // step)))
+            missing_after = known_end + step * np.arange(1, max(0, (end - known_end) // step) + 1)
+        else:
+            missing_before, missing_after = start + step * np.arange((end - start) // step + 1), np.zeros(0, np.int64)
+        if len(missing_before) == 0 and len(missing_after) == 0:
+            return table
+
+        new_positions = []
+        for missing_times in (missing_before, missing_after):
+            if len(missing_times) > 0:
+                times = list(missing_times.astype('datetime64[ns]').astype('datetime64[us]').astype(datetime))
+                new_positions.append(np.asarray(generate_positions(times), dtype=np.float64).reshape(-1, 3))
+                self.generated += len(missing_times)
+            else:
+                new_positions.append(np.zeros((0, 3)))
+        table = Ephemeris(np.concatenate([missing_before, table.times_array.astype(np.int64),
+                                          missing_after]).astype('datetime64[ns]'),
+                          np.concatenate([new_positions[0], table.positions, new_positions[1]]))
+        self.tables[key] = table
+
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(temporary_file_path, 'wb') as table_file:
+            np.savez(table_file, times=table.times_array, positions=table.positions)
+        os.replace(temporary_file_path, file_path)
+        return table
+
+    def get_ephemeris(self, body: Union[int, str], times: List[datetime],
+                      generate_positions: Callable[[List[datetime]], np.ndarray], observing_body: str = 'Sun',
+                      frame: str = 'ECLIPJ2000', interval: float = 1) -> Ephemeris:
+        """
+        :param body: 1 or 2 for Helios 1 or 2, or name of a planet
+        :param times: times at which the positions are wanted
+        :param generate_positions: function returning the positions in au of the body at the given times
+        :param observing_body: body from which the positions are seen
+        :param frame: frame of the positions
+        :param interval: interval between the positions of the table in days
+        :return: positions of the body at the given times, interpolated from the table
+        """
+        if len(times) == 0:
+            return Ephemeris(np.zeros(0, dtype='datetime64[ns]'), np.zeros((0, 3)))
+        table = self.get_table(body, min(times), max(times), generate_positions, observing_body=observing_body,
+                               frame=frame, interval=interval)
+        return Ephemeris(np.array(times, dtype='datetime64[ns]'), table.get_positions(times))
+
+    def clear(self):
+        """
+        Removes all the tables
+        :return:
+        """
+        self.tables.clear()
+        if os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                if file_name.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, file_name))
+
+
+ephemeris_cache = EphemerisCache()
@@ -1,12 +1,14 @@
 import heliopy.data.spice as spice_data
 import heliopy.spice as spice
-from datetime import datetime, timedelta
+from datetime import datetime
 import astropy.units as u
 import numpy as np
 import matplotlib.pyplot as plt
 from astropy.visualization import quantity_support
 from typing import List, Optional, Union
 
+from data_handler.ephemeris_cache import Ephemeris, EphemerisCache, ephemeris_cache
+
 
 def kernel_loader(spacecraft: Union[int, str] = 2) -> spice.Trajectory:
     """
@@ -40,13 +42,11 @@ def orbit_times_generator(start_date: str = '20/01/1976', end_date: str = '01/10
     :param interval: interval over which the times are returned (one day by default)
     :return: orbiter times
     """
-    start_time = datetime.strptime(start_date, '%d/%m/%Y')
-    end_time = datetime.strptime(end_date, '%d/%m/%Y')
-    times = []
-    while start_time < end_time:
-        times.append(start_time)
-        start_time = start_time + timedelta(days=interval)
-    return times
+    start_time = np.datetime64(datetime.strptime(start_date, '%d/%m/%Y'), 'us')
+    end_time = np.datetime64(datetime.strptime(end_date, '%d/%m/%Y'), 'us')
+    step = np.timedelta64(int(round(interval * 24 * 3600 * 10 ** 6)), 'us')
+    number_of_times = max(0, -(-(end_time - start_time) // step))
+    return list((start_time + step * np.arange(number_of_times)).astype(datetime))
 
 
 def furnish_spice_sse(probe: int):
@@ -74,46 +74,76 @@ def orbit_generator(orbiter: spice.Trajectory, times: List[datetime], observing_
     orbiter.change_units(u.au)
 
 
+def generate_positions(body: Union[int, str], times: List[datetime], observing_body: str = 'Sun',
+                       frame: str = 'ECLIPJ2000') -> np.ndarray:
+    """
+    Generates the positions of a body with spice
+    :param body: 1 or 2 for Helios 1 or 2, or name of a planet
+    :param times: times of the positions
+    :param observing_body: the orbit will be in the stationary frame of the observing body
+    :param frame: frame to be used
+    :return: positions in au, of shape (number of times, 3)
+    """
+    if body == 1 or body == 2:
+        orbiter = kernel_loader(body)
+        orbit_generator(orbiter, times, observing_body=observing_body, frame=frame, probe=body)
+    else:
+        spice.furnish(spice_data.get_kernel('planet_trajectories'))
+        orbiter = spice.Trajectory(body)
+        orbiter.generate_positions(times, observing_body, frame)
+        orbiter.change_units(u.au)
+    return np.stack([np.asarray(orbiter.x.to(u.au).value), np.asarray(orbiter.y.to(u.au).value),
+                     np.asarray(orbiter.z.to(u.au).value)], axis=-1)
+
+
+def get_ephemeris(body: Union[int, str], times: List[datetime], observing_body: str = 'Sun', frame: str = 'ECLIPJ2000',
+                  interval: float = 1, cache: EphemerisCache = ephemeris_cache) -> Ephemeris:
+    """
+    Gets the positions of a body from the cached tables, generating the positions missing from them with spice
+    :param body: 1 or 2 for Helios 1 or 2, or name of a planet
+    :param times: times of the positions, which can be any datetimes
+    :param observing_body: the orbit will be in the stationary frame of the observing body
+    :param frame: frame to be used
+    :param interval: interval in days between the positions of the table the positions are interpolated from
+    :param cache: cache of the tables of positions
+    :return: positions of the body at the given times
+    """
+    return cache.get_ephemeris(body, times, lambda _times: generate_positions(body, _times, observing_body, frame),
+                               observing_body=observing_body, frame=frame, interval=interval)
+
+
 def get_orbiter(probe: int = 1, start_time: str = '15/12/1974', end_time: str = '08/08/1984',
-                interval: float = 1) -> spice.Trajectory:
+                interval: float = 1, cache: EphemerisCache = ephemeris_cache) -> Ephemeris:
     """
     Returns the orbiter
     :param probe: 1 or 2 for Helios 1 or 2, can also be 'ulysses'
     :param start_time: start time of the orbiter generation
     :param end_time: end time of the orbiter generation
     :param interval: time interval in days between data probing
+    :param cache: cache of the tables of positions
     :return: orbiter of the spacecraft
     """
     if probe == 1 and datetime.strptime(end_time, '%d/%m/%Y') > datetime(1981, 9, 30):
         raise NotImplementedError('the Helios 1 Spice kernel only runs until 30/09/1981 ')
-    orbiter = kernel_loader(probe)
+    if probe not in (1, 2):
+        kernel_loader(probe)  # raises NotImplementedError for the probes that are not in spice
     times = orbit_times_generator(start_date=start_time, end_date=end_time, interval=interval)
-    orbit_generator(orbiter, times)
-    return orbiter
+    return get_ephemeris(probe, times, interval=interval, cache=cache)
 
 
 def get_planet_orbit(planet: str, start_date: str = '20/01/1976', end_date: str = '01/10/1979',
-                     interval: float = 1) -> spice.Trajectory:
+                     interval: float = 1, cache: EphemerisCache = ephemeris_cache) -> Ephemeris:
     """
     Finds the orbiter for a given planet
     :param planet: planet that we want to analyse
     :param start_date: start date of analysis
     :param end_date: end date of analysis
     :param interval: interval between each date in the orbiter, defaults to 1
+    :param cache: cache of the tables of positions
     :return: orbiter of the planet
     """
-    orbiter_kernel = spice_data.get_kernel('planet_trajectories')
-    spice.furnish(orbiter_kernel)
-    orbiter = spice.Trajectory(planet)
-    start_time = datetime.strptime(start_date, '%d/%m/%Y')
-    end_time = datetime.strptime(end_date, '%d/%m/%Y')
-    times = []
-    while start_time < end_time:
-        times.append(start_time)
-        start_time = start_time + timedelta(days=interval)
-    orbiter.generate_positions(times, 'Sun', 'ECLIPJ2000')
-    orbiter.change_units(u.au)
-    return orbiter
+    times = orbit_times_generator(start_date=start_date, end_date=end_date, interval=interval)
+    return get_ephemeris(planet, times, interval=interval, cache=cache)
 
 
 def plot_orbit(orbiter: spice.Trajectory, spacecraft: Union[int, str] = 2, planets: Optional[List[str]] = None):
@@ -1,15 +1,53 @@
+import bisect
 import pandas as pd
 import numpy as np
 from datetime import timedelta
+from typing import Tuple
+
+
+def get_window_bounds(times: np.ndarray, window_starts: np.ndarray, window_ends: np.ndarray) -> Tuple[
+                      np.ndarray, np.ndarray]:
+    """
+    Finds the positions delimiting closed time windows, as a .loc[start:end] slice on a sorted index would
+    :param times: sorted times (as int64 nanoseconds) of the data
+    :param window_starts: start of each window (as int64 nanoseconds)
+    :param window_ends: end of each window (as int64 nanoseconds)
+    :return: positions of the first point in each window and of the point after the last one
+    """
+    return np.searchsorted(times, window_starts, side='left'), np.searchsorted(times, window_ends, side='right')
+
+
+def get_nanoseconds(minutes: float) -> int:
+    """
+    Converts a number of minutes to nanoseconds, with the microsecond rounding of timedelta
+    :param minutes: number of minutes
+    :return: number of nanoseconds
+    """
+    return int(timedelta(minutes=minutes) / timedelta(microseconds=1)) * 1000
 
 
 def get_moving_average(data_column: pd.Series, minutes: int = 10) -> pd.Series:
-    moving_average = pd.Series(np.zeros_like(data_column.values), index=data_column.index)
-    for index, value in data_column.iteritems():
-        start_time = index - timedelta(minutes=minutes)
-        end_time = index + timedelta(minutes=minutes)
-        moving_average.loc[index] = np.mean(data_column.loc[start_time:end_time])
-    return moving_average
+    """
+    Get the average of the data around each point, in a time window centred on the point
+    The windows are found with searchsorted on the (possibly irregular) times and their sums are taken from cumulative
+    sums, so that the whole column is averaged in one pass
+    :param data_column: column to average, with a sorted DatetimeIndex
+    :param minutes: minutes to the right and to the left that will be considered when taking the moving average
+    :return: moving average, nan where the window has no finite value
+    """
+    times = data_column.index.values.astype(np.int64)
+    half_width = get_nanoseconds(minutes)
+    lower, upper = get_window_bounds(times, times - half_width, times + half_width)
+
+    values = data_column.values.astype(np.float64)
+    finite = np.isfinite(values)
+    # values are centred before being summed so that the differences of the cumulative sums stay accurate
+    offset = values[finite].mean() if finite.any() else 0
+    sums = np.concatenate(([0], np.cumsum(np.where(finite, values - offset, 0))))
+    counts = np.concatenate(([0], np.cumsum(finite)))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        moving_average = (sums[upper] - sums[lower]) / (counts[upper] - counts[lower]) + offset
+    return pd.Series(moving_average, index=data_column.index)
 
 
 def get_derivative(data_column: pd.Series) -> pd.Series:
@@ -18,29 +56,141 @@ def get_derivative(data_column: pd.Series) -> pd.Series:
 
 def get_outliers(data_column: pd.Series, minutes: float = 10, standard_deviations: float = 2,
                  ignore_minutes_around: float = 0, reference='median') -> pd.Series:
-    outliers = pd.Series(np.zeros_like(data_column.values), index=data_column.index)
+    """
+    Find outliers in a given column, by comparing each point to the points around it
+    Without ignore_minutes_around, the points within minutes of a point (except the ones at the time of the point) are
+    considered. Otherwise, the points between ignore_minutes_around and minutes + ignore_minutes_around on each side of
+    the point are considered.
+    :param data_column: column to analyse, with a sorted DatetimeIndex
+    :param minutes: minutes during which the data will be considered for the outliers tests
+    :param standard_deviations: standard deviations that will be used when comparing data points to surrounding points
+    :param ignore_minutes_around: number of minutes around potential events (to the right and to the left) to ignore
+    :param reference: reference to use in comparison ('median' of the values to consider, or a number such as 0)
+    :return: values of the outliers, nan elsewhere
+    """
+    deviations, standard_deviation = get_outlier_statistics(data_column, minutes=minutes,
+                                                            ignore_minutes_around=ignore_minutes_around,
+                                                            reference=reference)
+    with np.errstate(invalid='ignore'):
+        is_outlier = deviations > standard_deviations * standard_deviation
+    return pd.Series(np.where(is_outlier, data_column.values, np.nan), index=data_column.index)
 
-    for index, value in data_column.iteritems():
-        if not ignore_minutes_around:
-            start_time = index - timedelta(minutes=minutes)
-            end_time = index + timedelta(minutes=minutes)
-            values_to_consider = data_column[data_column.index.values != index].loc[start_time:end_time]
-        else:
-            left_interval_start = index - timedelta(minutes=(minutes + ignore_minutes_around))
-            left_interval_end = index - timedelta(minutes=ignore_minutes_around)
-            right_interval_start = index + timedelta(minutes=ignore_minutes_around)
-            right_interval_end = index + timedelta(minutes=(minutes + ignore_minutes_around))
-
-            values_to_consider = pd.concat((data_column.loc[left_interval_start: left_interval_end],
-                                            data_column.loc[right_interval_start: right_interval_end]))
-            # print(values_to_consider)
-        if reference == 'median':
-            reference = values_to_consider.median()
-        elif reference == 0:
-            reference = 0
-        if abs(value - reference) > standard_deviations * values_to_consider.std():
-            outliers.loc[index] = value
-            # outliers.loc[index] = abs(value - values_to_consider.median()) / values_to_consider.std()
+
+def get_outlier_statistics(data_column: pd.Series, minutes: float = 10, ignore_minutes_around: float = 0,
+                           reference='median') -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the statistics of the outliers test of get_outliers, which do not depend on the number of standard
+    deviations, so that many numbers of standard deviations can be tested at once
+    The standard deviations of the windows are found with cumulative sums and their medians with a sorted window that
+    is updated as the windows move along the data, so that the column is only gone through once
+    :param data_column: column to analyse, with a sorted DatetimeIndex
+    :param minutes: minutes during which the data will be considered for the outliers tests
+    :param ignore_minutes_around: number of minutes around potential events (to the right and to the left) to ignore
+    :param reference: reference to use in comparison ('median' of the values to consider, or a number such as 0)
+    :return: distances of the points to their reference (nan for the points which can not be outliers), and standard
+    deviations of the points around them
+    """
+    times = data_column.index.values.astype(np.int64)
+    if not ignore_minutes_around:
+        # the points at the time of the point considered are left out
+        left_starts, right_ends = get_window_bounds(times, times - get_nanoseconds(minutes),
+                                                    times + get_nanoseconds(minutes))
+        left_ends, right_starts = get_window_bounds(times, times, times)
+    else:
+        left_starts, left_ends = get_window_bounds(times, times - get_nanoseconds(minutes + ignore_minutes_around),
+                                                   times - get_nanoseconds(ignore_minutes_around))
+        right_starts, right_ends = get_window_bounds(times, times + get_nanoseconds(ignore_minutes_around),
+                                                     times + get_nanoseconds(minutes + ignore_minutes_around))
+
+    values = data_column.values.astype(np.float64)
+    finite = np.isfinite(values)
+    standard_deviation = get_windows_standard_deviation(values, finite, (left_starts, left_ends),
+                                                        (right_starts, right_ends))
+
+    # points which can not be outliers do not need a reference
+    candidates = finite & np.isfinite(standard_deviation)
+    if reference == 'median':
+        reference = get_windows_median(values, finite, candidates, (left_starts, left_ends), (right_starts, right_ends))
+    with np.errstate(invalid='ignore'):
+        deviations = np.where(candidates, np.abs(values - reference), np.nan)
+    return deviations, standard_deviation
+
+
+def get_windows_standard_deviation(values: np.ndarray, finite: np.ndarray, *windows: Tuple[
+                                   np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    Finds the sample standard deviation of the finite values in the union of disjoint windows around each point
+    :param values: values of the data
+    :param finite: whether each value is finite
+    :param windows: positions of the first value of each window and of the value after its last one
+    :return: standard deviations, nan when there are fewer than two finite values to consider
+    """
+    # values are centred before being summed so that the differences of the cumulative sums stay accurate
+    centred_values = np.where(finite, values - (values[finite].mean() if finite.any() else 0), 0)
+    counts = np.concatenate(([0], np.cumsum(finite)))
+    sums = np.concatenate(([0], np.cumsum(centred_values)))
+    squared_sums = np.concatenate(([0], np.cumsum(centred_values ** 2)))
+
+    count = np.zeros(len(values), dtype=np.int64)
+    total = np.zeros(len(values))
+    squared_total = np.zeros(len(values))
+    for starts, ends in windows:
+        count += counts[ends] - counts[starts]
+        total += sums[ends] - sums[starts]
+        squared_total += squared_sums[ends] - squared_sums[starts]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = (squared_total - total ** 2 / count) / (count - 1)
+    variance[count < 2] = np.nan
+    return np.sqrt(np.maximum(variance, 0))
+
+
+def get_windows_median(values: np.ndarray, finite: np.ndarray, needed: np.ndarray,
+                       left_window: Tuple[np.ndarray, np.ndarray],
+                       right_window: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """
+    Finds the median of the finite values in the union of a left and a right window around each point
+    The bounds of both windows only move forward, so the values of the windows are kept in a sorted list which is
+    updated as the bounds move
+    :param values: values of the data
+    :param finite: whether each value is finite
+    :param needed: whether the median is needed for each point
+    :param left_window: positions of the first value of each left window and of the value after its last one
+    :param right_window: positions of the first value of each right window and of the value after its last one
+    :return: medians, nan where they are not needed or where there is no finite value to consider
+    """
+    medians = np.full(len(values), np.nan)
+    # bounds are converted to positions among the finite values, and python lists are used as they are much faster
+    # than arrays to index one element at a time
+    finite_values = values[finite].tolist()
+    finite_before = np.concatenate(([0], np.cumsum(finite)))
+    left_starts, left_ends, right_starts, right_ends = (finite_before[bound[needed]].tolist() for bound in (
+        *left_window, *right_window))
+
+    window_values = []
+    left_start = left_end = right_start = right_end = 0
+    window_medians = []
+    # a value enters the right window, leaves it, enters the left window and then leaves it, so the bounds are moved
+    # in that order
+    for new_left_start, new_left_end, new_right_start, new_right_end in zip(left_starts, left_ends, right_starts,
+                                                                            right_ends):
+        for position in range(right_end, new_right_end):
+            bisect.insort(window_values, finite_values[position])
+        for position in range(right_start, new_right_start):
+            del window_values[bisect.bisect_left(window_values, finite_values[position])]
+        for position in range(left_end, new_left_end):
+            bisect.insort(window_values, finite_values[position])
+        for position in range(left_start, new_left_start):
+            del window_values[bisect.bisect_left(window_values, finite_values[position])]
+        left_start, left_end, right_start, right_end = new_left_start, new_left_end, new_right_start, new_right_end
+
+        length = len(window_values)
+        middle = length // 2
+        if not length:
+            window_medians.append(np.nan)
+        elif length % 2:
+            window_medians.append(window_values[middle])
         else:
-            outliers.loc[index] = np.nan
-    return outliers
+            window_medians.append((window_values[middle - 1] + window_values[middle]) / 2)
+    medians[needed] = window_medians
+    return medians
@@ -1,9 +1,10 @@
 import csv
-from datetime import datetime, timedelta
-from typing import List, Union
+from datetime import datetime
+from typing import Iterable, List, Optional, Union
 import numpy as np
+import pandas as pd
 
-from data_handler.data_importer.data_import import get_probe_data
+from data_handler.data_importer.data_import import find_data_block, get_event_data_blocks
 
 
 def get_dates_from_csv(filename: str, probe=None):
@@ -16,8 +17,8 @@ def get_dates_from_csv(filename: str, probe=None):
     with open(filename) as csv_file:
         reader = csv.DictReader(csv_file)
         for row in reader:
-            year, month, day = np.int(row['year']), np.int(row['month']), np.int(row['day'])
-            hours, minutes, seconds = np.int(row['hours']), np.int(row['minutes']), np.int(row['seconds'])
+            year, month, day = int(row['year']), int(row['month']), int(row['day'])
+            hours, minutes, seconds = int(row['hours']), int(row['minutes']), int(row['seconds'])
             if probe is not None:
                 events_list.append([datetime(year, month, day, hours, minutes, seconds), probe])
             else:
@@ -25,35 +26,53 @@ def get_dates_from_csv(filename: str, probe=None):
     return events_list
 
 
-def send_dates_to_csv(filename: str, events_list: List[datetime], probe: int, add_radius: bool = True):
+def send_dates_to_csv(filename: str, events_list: List[datetime], probe: int, add_radius: bool = True,
+                      radii: Optional[Iterable[float]] = None):
     """
     :param filename: name of the output file
     :param events_list: list of events to send to csv
     :param probe: probe corresponding to the events
     :param add_radius: if True, adds the position of the probe at each event
+    :param radii: positions of the probe at the events if they were already found, found from the data if None
     :return:
     """
+    fieldnames = ['year', 'month', 'day', 'hours', 'minutes', 'seconds']
+    rows = [{'year': reconnection_date.year, 'month': reconnection_date.month, 'day': reconnection_date.day,
+             'hours': reconnection_date.hour, 'minutes': reconnection_date.minute, 'seconds': reconnection_date.second}
+            for reconnection_date in events_list]
+    if add_radius:
+        fieldnames.append('radius')
+        if radii is None:
+            radii = get_event_radii(events_list, probe)
+        for row, radius in zip(rows, radii):
+            row['radius'] = radius
     with open(filename + '.csv', 'w', newline='') as csv_file:
-        fieldnames = ['year', 'month', 'day', 'hours', 'minutes', 'seconds']
-        if add_radius:
-            fieldnames.append('radius')
         writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
         writer.writeheader()
-        for reconnection_date in events_list:
-            year, month, day = reconnection_date.year, reconnection_date.month, reconnection_date.day
-            hour, minutes, seconds = reconnection_date.hour, reconnection_date.minute, reconnection_date.second
-            if add_radius:
-                start = reconnection_date - timedelta(hours=1)
-                imported_data = get_probe_data(probe=probe, start_date=start.strftime('%d/%m/%Y'),
-                                               start_hour=start.hour, duration=2)
-                radius = imported_data.data['r_sun'].loc[
-                         reconnection_date - timedelta(minutes=1): reconnection_date + timedelta(minutes=1)][0]
-                writer.writerow(
-                    {'year': year, 'month': month, 'day': day, 'hours': hour, 'minutes': minutes, 'seconds': seconds,
-                     'radius': radius})
-            if not add_radius:
-                writer.writerow(
-                    {'year': year, 'month': month, 'day': day, 'hours': hour, 'minutes': minutes, 'seconds': seconds})
+        writer.writerows(rows)
+
+
+def get_event_radii(events_list: List[datetime], probe: int) -> np.ndarray:
+    """
+    Finds the positions of the probe at the events, with the data of each day holding events loaded once
+    :param events_list: list of events
+    :param probe: probe corresponding to the events
+    :return: distances from the sun at the events, interpolated from the r_sun column of the data (nan if no data
+    block covers an event)
+    """
+    if len(events_list) == 0:
+        return np.zeros(0)
+    data_blocks = get_event_data_blocks(probe, events_list, duration=2)
+    r_sun = [data_block.data['r_sun'].dropna() for data_block in data_blocks]
+    r_sun = pd.concat(r_sun).sort_index() if r_sun else pd.Series(dtype=float)
+    if len(r_sun) == 0:
+        return np.full(len(events_list), np.nan)
+    event_times = np.array(events_list, dtype='datetime64[ns]').astype(np.int64)
+    radii = np.interp(event_times, r_sun.index.values.astype('datetime64[ns]').astype(np.int64), r_sun.values)
+    # np.interp would give the events of the days without data the values of the closest days
+    is_covered = [find_data_block(probe, event, 0, data_blocks) is not None for event in events_list]
+    radii[~np.array(is_covered)] = np.nan
+    return radii
 
 
 def create_events_list_from_csv_files(files: List[List[Union[str, int]]]):
@@ -62,10 +81,12 @@ def create_events_list_from_csv_files(files: List[List[Union[str, int]]]):
     :param files: list of lists of files and associated probe
     :return:
     """
-    events = []
+    events, seen_events = [], set()
     for file, probe in files:
-        _events = get_dates_from_csv(file, probe)
-        for event in _events:
-            if event not in events:
+        for event in get_dates_from_csv(file, probe):
+            # events are [date, probe] lists, or dates when the probe is None
+            key = tuple(event) if isinstance(event, list) else event
+            if key not in seen_events:
+                seen_events.add(key)
                 events.append(event)
     return events
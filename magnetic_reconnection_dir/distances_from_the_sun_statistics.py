@@ -1,4 +1,3 @@
-import os
 from datetime import timedelta, datetime
 from typing import List, Optional
 from astropy.visualization import quantity_support
@@ -6,9 +5,10 @@ import matplotlib.pyplot as plt
 import numpy as np
 import matplotlib.lines as m_lines
 import matplotlib.patches as m_patches
-from dateutil.relativedelta import relativedelta
 
-from data_handler.data_importer.helios_data import HeliosData
+from data_handler.data_importer.coverage_index import CoverageIndex, coverage_index
+from data_handler.data_importer.data_import import get_probe_data
+from data_handler.ephemeris_cache import Ephemeris
 from data_handler.orbit_with_spice import get_planet_orbit, get_orbiter
 from data_handler.utils.column_processing import get_outliers, get_derivative
 from magnetic_reconnection_dir.csv_utils import get_dates_from_csv
@@ -79,11 +79,14 @@ def plot_hist_dist(orbiter, spacecraft, stat, planet: Optional[str] = None, even
     plt.show()
 
 
-def plot_event_info(ax, orbiter, spacecraft_planet: np.ndarray, events: List[datetime], spacecraft: int,
+def plot_event_info(ax, orbiter: Ephemeris, spacecraft_planet: np.ndarray, events: List[datetime], spacecraft: int,
                     plot_each_point: bool = False):
     args = {}
     normal_size = 10
-    for event in events:
+    # position of the day of each event in the orbiter
+    event_days = np.array(events, dtype='datetime64[D]').astype('datetime64[ns]')
+    event_args = np.searchsorted(orbiter.times_array, event_days)
+    for event, arg in zip(events, event_args):
         density, speed = find_density_and_speed(event, spacecraft)
         classification = classify_wind(density, speed)
         if not np.isnan(density):
@@ -93,7 +96,6 @@ def plot_event_info(ax, orbiter, spacecraft_planet: np.ndarray, events: List[dat
             dens_color = 'k'
             speed_color = 'k'
 
-        arg = orbiter.times.index(datetime(event.year, event.month, event.day))
         if plot_each_point:
             ax.plot(event, spacecraft_planet[arg], marker='o', color=speed_color, markersize=normal_size, alpha=0.8)
             ax.plot(event, spacecraft_planet[arg], marker='+', color=dens_color, markersize=normal_size, mew=3)
@@ -212,8 +214,8 @@ def find_density_and_speed(event: datetime, probe: int, distance: bool = False):
     :return:
     """
     start_analysis = event - timedelta(hours=1)
-    imported_data = HeliosData(start_date=start_analysis.strftime('%d/%m/%Y'), start_hour=start_analysis.hour,
-                               duration=2, probe=probe)
+    imported_data = get_probe_data(start_date=start_analysis.strftime('%d/%m/%Y'), start_hour=start_analysis.hour,
+                                   duration=2, probe=probe)
     imported_data.data.dropna(inplace=True)
     imported_data.create_processed_column('vp_magnitude')
     imported_data.create_processed_column('b_magnitude')
@@ -237,8 +239,8 @@ def find_event_duration(event: datetime, probe: int) ->float:
     :return: duration of the event
     """
     start_analysis = event - timedelta(hours=1)
-    imported_data = HeliosData(start_date=start_analysis.strftime('%d/%m/%Y'), start_hour=start_analysis.hour,
-                               duration=2, probe=probe)
+    imported_data = get_probe_data(start_date=start_analysis.strftime('%d/%m/%Y'), start_hour=start_analysis.hour,
+                                   duration=2, probe=probe)
     imported_data.data.dropna(inplace=True)
     data = imported_data.data.loc[event - timedelta(minutes=4): event + timedelta(minutes=4)]
     duration = []
@@ -256,33 +258,16 @@ def find_event_duration(event: datetime, probe: int) ->float:
     return event_duration
 
 
-def find_data_gaps(probe, start_time: str, end_time: str) -> list:
-    start = datetime.strptime(start_time, '%d/%m/%Y')
-    start, end = datetime(start.year, start.month, 1), datetime.strptime(end_time, '%d/%m/%Y')
-    interval = relativedelta(months=1)
-    directory = r"C:\Users\tilquin\heliopy\data\helios\E1_experiment\New_proton_corefit_data_2017\ascii\helios" + str(
-        probe)
-    date = start
-    missing_data = []
-    while date < end:
-        year, month, day = date.year, date.month, date.day
-        _dir = directory + '\\' + str(year)
-        fls = [files for r, d, files in os.walk(_dir) if files]
-
-        date1 = date
-        date2 = date + interval - timedelta(days=1)
-        days_of_year = []
-        for days in range(int((date2 - date1).total_seconds() / (3600 * 24))):
-            days_of_year.append(datetime.strftime(date1, '%j'))
-            date1 = date1 + timedelta(days=1)
-        missing = 0
-        for doy in days_of_year:
-            if not 'h' + str(probe) + '_' + str(year) + '_' + str(doy) + '_corefit.csv' in (np.array(fls).flatten()):
-                missing += 1
-        if missing > 25:
-            missing_data.append([int(year), int(month)])
-        date = date + interval
-    return missing_data
+def find_data_gaps(probe, start_time: str, end_time: str, coverage: CoverageIndex = coverage_index) -> list:
+    """
+    :param probe: 1 or 2 for Helios 1 or 2
+    :param start_time: start of the analysis, as 'DD/MM/YYYY'
+    :param end_time: end of the analysis, as 'DD/MM/YYYY'
+    :param coverage: index of the days with data
+    :return: year and month of the months with more than 25 days without data
+    """
+    return coverage.get_month_gaps(probe, datetime.strptime(start_time, '%d/%m/%Y'),
+                                   datetime.strptime(end_time, '%d/%m/%Y'))
 
 
 if __name__ == '__main__':
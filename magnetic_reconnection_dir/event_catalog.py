@@ -0,0 +1,231 @@
+import csv
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.expanduser('~'), '.magrec', 'event_catalog.sqlite')
+EPOCH = datetime(1970, 1, 1)
+CSV_FIELDNAMES = ['year', 'month', 'day', 'hours', 'minutes', 'seconds']
+
+
+class EventCatalog:
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH):
+        """
+        Catalog of the events found by the different stages of the detection, kept in a SQLite database instead of
+        many CSV files
+        An event is identified by its time, probe, stage and the hash of the parameters which found it, so that adding
+        events which are already in the catalog does nothing. The events are indexed by probe and time.
+        :param path: path of the database, created when the catalog is first used
+        """
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __repr__(self):
+        return '{}: {}'.format(self.__class__.__name__, self.path)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path)
+            with self._connection:
+                # times are kept as microseconds since the epoch, so that they are compared as integers
+                self._connection.execute('CREATE TABLE IF NOT EXISTS events (time INTEGER NOT NULL, '
+                                         'probe TEXT NOT NULL, stage TEXT NOT NULL, parameters_hash TEXT NOT NULL, '
+                                         'radius REAL, features TEXT, '
+                                         'UNIQUE (time, probe, stage, parameters_hash))')
+                self._connection.execute('CREATE INDEX IF NOT EXISTS events_probe_time ON events (probe, time)')
+                self._connection.execute('CREATE INDEX IF NOT EXISTS events_time ON events (time)')
+        return self._connection
+
+    def close(self):
+        """
+        Closes the connection to the database, which is opened again when needed
+        :return:
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def add_events(self, events_list: List[datetime], probe: Union[int, str], stage: str = '',
+                   parameters: Optional[dict] = None, radii: Optional[Iterable[float]] = None,
+                   features: Optional[List[dict]] = None) -> int:
+        """
+        Appends events to the catalog, the events which are already in it being left out
+        :param events_list: dates of the events
+        :param probe: probe corresponding to the events
+        :param stage: stage of the detection which found the events (such as 'correlation' or 'lmn')
+        :param parameters: parameters which found the events
+        :param radii: distances from the sun at the events
+        :param features: dictionaries of features of each event, made of JSON types
+        :return: number of events which were added
+        """
+        parameters_hash = get_parameters_hash(parameters)
+        radii = [None] * len(events_list) if radii is None else [None if np.isnan(radius) else float(radius) for
+                                                                 radius in radii]
+        features = [None] * len(events_list) if features is None else [json.dumps(_features, sort_keys=True) for
+                                                                       _features in features]
+        rows = [(datetime_to_microseconds(event), str(probe), stage, parameters_hash, radius, _features) for
+                event, radius, _features in zip(events_list, radii, features)]
+        changes = self.connection.total_changes
+        with self.connection:
+            self.connection.executemany('INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?)', rows)
+        return self.connection.total_changes - changes
+
+    def get_table(self, probe: Optional[Union[int, str]] = None, start_datetime: Optional[datetime] = None,
+                  end_datetime: Optional[datetime] = None, stage: Optional[str] = None,
+                  parameters: Optional[dict] = None) -> pd.DataFrame:
+        """
+        :param probe: probe of the events, all the probes if None
+        :param start_datetime: first time of the events (included), no limit if None
+        :param end_datetime: last time of the events (included), no limit if None
+        :param stage: stage which found the events, all the stages if None
+        :param parameters: parameters which found the events, all the parameters if None
+        :return: table of the events sorted by time and probe, with their time, probe, stage, parameters hash, radius
+        (nan if unknown) and features (dictionaries, None if unknown)
+        """
+        conditions, values = get_conditions(probe, start_datetime, end_datetime, stage, parameters)
+        rows = self.connection.execute('SELECT time, probe, stage, parameters_hash, radius, features FROM events' +
+                                       conditions + ' ORDER BY time, probe, stage, parameters_hash', values).fetchall()
+        table = pd.DataFrame(rows, columns=['time', 'probe', 'stage', 'parameters_hash', 'radius', 'features'])
+        table['time'] = [microseconds_to_datetime(time) for time in table['time']]
+        table['probe'] = [get_probe(_probe) for _probe in table['probe']]
+        table['radius'] = table['radius'].astype(np.float64)
+        table['features'] = [None if _features is None else json.loads(_features) for _features in table['features']]
+        return table
+
+    def get_events(self, probe: Optional[Union[int, str]] = None, start_datetime: Optional[datetime] = None,
+                   end_datetime: Optional[datetime] = None, stage: Optional[str] = None,
+                   parameters: Optional[dict] = None) -> List[List[Union[datetime, int, str]]]:
+        """
+        :param probe: probe of the events, all the probes if None
+        :param start_datetime: first time of the events (included), no limit if None
+        :param end_datetime: last time of the events (included), no limit if None
+        :param stage: stage which found the events, all the stages if None
+        :param parameters: parameters which found the events, all the parameters if None
+        :return: distinct events and their probes sorted by time, as create_events_list_from_csv_files
+        """
+        conditions, values = get_conditions(probe, start_datetime, end_datetime, stage, parameters)
+        rows = self.connection.execute('SELECT DISTINCT time, probe FROM events' + conditions + ' ORDER BY time, probe',
+                                       values).fetchall()
+        return [[microseconds_to_datetime(time), get_probe(_probe)] for time, _probe in rows]
+
+    def import_csv(self, filename: str, probe: Union[int, str], stage: str = '',
+                   parameters: Optional[dict] = None) -> int:
+        """
+        Imports a CSV file of events, as written by send_dates_to_csv
+        :param filename: name of the file
+        :param probe: probe corresponding to the events
+        :param stage: stage of the detection which found the events
+        :param parameters: parameters which found the events
+        :return: number of events which were added
+        """
+        events_list, radii = [], []
+        with open(filename) as csv_file:
+            for row in csv.DictReader(csv_file):
+                events_list.append(datetime(*[int(row[fieldname]) for fieldname in CSV_FIELDNAMES]))
+                radii.append(float(row['radius']) if row.get('radius') else np.nan)
+        return self.add_events(events_list, probe, stage=stage, parameters=parameters, radii=radii)
+
+    def import_csv_files(self, files: List[List[Union[str, int]]], stage: str = '',
+                         parameters: Optional[dict] = None) -> int:
+        """
+        :param files: list of lists of files and associated probe, as create_events_list_from_csv_files
+        :param stage: stage of the detection which found the events
+        :param parameters: parameters which found the events
+        :return: number of events which were added
+        """
+        return sum(self.import_csv(file, probe, stage=stage, parameters=parameters) for file, probe in files)
+
+    def export_csv(self, filename: str, probe: Union[int, str], start_datetime: Optional[datetime] = None,
+                   end_datetime: Optional[datetime] = None, stage: Optional[str] = None,
+                   parameters: Optional[dict] = None, add_radius: bool = True):
+        """
+        Exports the distinct events of a probe to a CSV file, in the format of send_dates_to_csv
+        :param filename: name of the file
+        :param probe: probe of the events
+        :param start_datetime: first time of the events (included), no limit if None
+        :param end_datetime: last time of the events (included), no limit if None
+        :param stage: stage which found the events, all the stages if None
+        :param parameters: parameters which found the events, all the parameters if None
+        :param add_radius: if True, adds the known position of the probe at each event
+        :return:
+        """
+        table = self.get_table(probe, start_datetime, end_datetime, stage, parameters)
+        # the radius of an event is taken from any of its rows which has one
+        table = table.sort_values(['time', 'radius']).drop_duplicates('time')
+        fieldnames = CSV_FIELDNAMES + ['radius'] if add_radius else CSV_FIELDNAMES
+        with open(filename, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            writer.writeheader()
+            for event, radius in zip(table['time'], table['radius']):
+                row = dict(zip(CSV_FIELDNAMES, [event.year, event.month, event.day, event.hour, event.minute,
+                                                event.second]))
+                if add_radius:
+                    row['radius'] = radius
+                writer.writerow(row)
+
+
+def get_parameters_hash(parameters: Optional[dict]) -> str:
+    """
+    :param parameters: parameters which found events
+    :return: hash of the parameters, empty for None
+    """
+    if parameters is None:
+        return ''
+    return hashlib.sha1(json.dumps(parameters, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def get_conditions(probe: Optional[Union[int, str]], start_datetime: Optional[datetime],
+                   end_datetime: Optional[datetime], stage: Optional[str], parameters: Optional[dict]) -> tuple:
+    """
+    :param probe: probe of the events, all the probes if None
+    :param start_datetime: first time of the events (included), no limit if None
+    :param end_datetime: last time of the events (included), no limit if None
+    :param stage: stage which found the events, all the stages if None
+    :param parameters: parameters which found the events, all the parameters if None
+    :return: WHERE clause selecting the events, and the values of its parameters
+    """
+    conditions, values = [], []
+    if probe is not None:
+        conditions.append('probe = ?')
+        values.append(str(probe))
+    if start_datetime is not None:
+        conditions.append('time >= ?')
+        values.append(datetime_to_microseconds(start_datetime))
+    if end_datetime is not None:
+        conditions.append('time <= ?')
+        values.append(datetime_to_microseconds(end_datetime))
+    if stage is not None:
+        conditions.append('stage = ?')
+        values.append(stage)
+    if parameters is not None:
+        conditions.append('parameters_hash = ?')
+        values.append(get_parameters_hash(parameters))
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), values
+
+
+def datetime_to_microseconds(date_time: datetime) -> int:
+    return (date_time - EPOCH) // timedelta(microseconds=1)
+
+
+def microseconds_to_datetime(microseconds: int) -> datetime:
+    return EPOCH + timedelta(microseconds=microseconds)
+
+
+def get_probe(probe: str) -> Union[int, str]:
+    """
+    :param probe: probe as stored in the catalog
+    :return: 1 or 2 for Helios 1 or 2, the name of the probe otherwise
+    """
+    return int(probe) if probe.isdigit() else probe
+
+
+event_catalog = EventCatalog()
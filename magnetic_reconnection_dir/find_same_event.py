@@ -1,14 +1,19 @@
 import pprint
 from datetime import datetime, timedelta
-from typing import List, Union, Any
+from typing import Any, List, Optional, Tuple, Union
 import astropy.units as u
 import numpy as np
-from heliopy import spice
 
-from data_handler.data_importer.helios_data import HeliosData
-from data_handler.orbit_with_spice import get_orbiter, kernel_loader, orbit_times_generator, orbit_generator
+from data_handler.data_importer.data_import import get_event_data, get_event_data_blocks, get_probe_data
+from data_handler.data_importer.imported_data import ImportedData
+from data_handler.ephemeris_cache import Ephemeris
+from data_handler.orbit_with_spice import get_ephemeris, get_orbiter
 from magnetic_reconnection_dir.csv_utils import create_events_list_from_csv_files
-from magnetic_reconnection_dir.mva_analysis import hybrid_mva
+from magnetic_reconnection_dir.mva_analysis import get_b, get_side_data, hybrid, mva_batch, stack_b_windows
+
+AU_TO_KM = (1 * u.au).to(u.km).value
+SAME_EVENT_HORIZON = timedelta(days=10)  # not the same after 10 days (supposed to die out in 1/2 days)
+SPEED_DURATION = 20  # hours of data on which the speed of the solar wind is averaged on each side of the events
 
 
 def find_two_same_events(events_list_1: List[datetime], events_list_2: List[datetime]) -> List[
@@ -19,8 +24,9 @@ def find_two_same_events(events_list_1: List[datetime], events_list_2: List[date
     :param events_list_2: list of all events for helios 2
     :return: possible pair of events with their associated probes
     """
-    orbiter1 = get_orbiter(probe=1, start_time='20/01/1976', end_time='01/10/1979')
-    orbiter2 = get_orbiter(probe=2, start_time='20/01/1976', end_time='01/10/1979')
+    # the orbiters are interpolated at the events, so they go on until the day after the last events
+    orbiter1 = get_orbiter(probe=1, start_time='20/01/1976', end_time='02/10/1979')
+    orbiter2 = get_orbiter(probe=2, start_time='20/01/1976', end_time='02/10/1979')
     same_events = get_events_relations(events_list_1, events_list_2, orbiter1, orbiter2)
     possible_double_event = []
     for event1, probe1, event2, probe2, dist in same_events:
@@ -34,77 +40,109 @@ def find_two_same_events(events_list_1: List[datetime], events_list_2: List[date
 
 
 def get_events_relations(helios1_events: List[datetime], helios2_events: List[datetime],
-                         orbiter_helios1: spice.Trajectory, orbiter_helios2: spice.Trajectory,
+                         orbiter_helios1: Ephemeris, orbiter_helios2: Ephemeris,
                          allowed_error: float = 0.2) -> List[List[Union[Union[datetime, int], Any]]]:
     """
     Checks whether two events might be the same by calculating the expected time taken by the solar wind to travel
     between them
+    Only the pairs of events close enough in time are considered, and the speeds of the solar wind around each event
+    are found once, whatever the number of pairs the event is part of.
     :param helios1_events: events detected by Helios 1
     :param helios2_events: events detected by Helios 2
-    :param orbiter_helios1: Helios 1 orbiter
-    :param orbiter_helios2: Helios 2 orbiter
+    :param orbiter_helios1: Helios 1 orbiter, interpolated at the events
+    :param orbiter_helios2: Helios 2 orbiter, interpolated at the events
     :param allowed_error: allowed percentage error between the theoretical and actual time intervals
     :return: possible pair of events with associated probes and the distance between them
     """
-    same_events = []
-    _helios1_events = []
-    for event in helios1_events:
-        if datetime(1976, 1, 20) < event < datetime(1979, 10, 1):
-            _helios1_events.append(event)
-    helios1_events = _helios1_events
-    for event_helios1 in helios1_events:
-        for event_helios2 in helios2_events:
-            if event_helios1 < event_helios2:
-                start, end = event_helios1, event_helios2
-                probe_start, probe_end = 1, 2
-                orbiter_start, orbiter_end = orbiter_helios1, orbiter_helios2
-            else:
-                start, end = event_helios2, event_helios1
-                probe_start, probe_end = 2, 1
-                orbiter_start, orbiter_end = orbiter_helios2, orbiter_helios1
-
-            if (end - start).total_seconds() > 864000:  # not the same after 10 days (supposed to die out in 1/2 days)
-                continue
-            else:
-                imported_data_start = HeliosData(start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour,
-                                                 probe=probe_start, duration=20)
-                _end = end - timedelta(hours=20)
-                imported_data_end = HeliosData(start_date=_end.strftime('%d/%m/%Y'), start_hour=_end.hour,
-                                               probe=probe_end,
-                                               duration=20)
-                imported_data_start.data.dropna(inplace=True)
-                imported_data_end.data.dropna(inplace=True)
-                imported_data_start.create_processed_column('vp_magnitude')
-                imported_data_end.create_processed_column('vp_magnitude')
-                speed_start = np.mean(imported_data_start.data['vp_magnitude'].values)
-                speed_end = np.mean(imported_data_end.data['vp_magnitude'].values)
-                speed = (speed_start + speed_end) / 2
-                speed += (get_alfven(start, probe_start) + get_alfven(end, probe_end)) / 2
-
-                start_position = orbiter_start.times.index(datetime(start.year, start.month, start.day))
-                end_position = orbiter_end.times.index(datetime(end.year, end.month, end.day))
-
-                start_x, start_y, start_z = orbiter_start.x[start_position].to(u.km) / u.km, orbiter_start.y[
-                    start_position].to(u.km) / u.km, orbiter_start.z[start_position].to(u.km) / u.km
-                end_x, end_y, end_z = orbiter_end.x[end_position].to(u.km) / u.km, orbiter_end.y[end_position].to(
-                    u.km) / u.km, orbiter_end.z[end_position].to(u.km) / u.km
-
-                probes_separation = np.sqrt((start_x - end_x) ** 2 + (start_y - end_y) ** 2 + (start_z - end_z) ** 2)
-                time_between_events = (end - start).total_seconds()
-                expected_time = probes_separation / speed
-
-                if 1 - allowed_error < time_between_events / expected_time < 1 + allowed_error:
-                    print(np.abs(orbiter_start.x[start_position] - orbiter_end.x[end_position]),
-                          np.abs(orbiter_start.y[start_position] - orbiter_end.y[end_position]),
-                          np.abs(orbiter_start.z[start_position] - orbiter_end.z[end_position]))
-                    print(time_between_events / expected_time)
-                    print('expected ', start + timedelta(seconds=int(expected_time)), ' but got ', end,
-                          'starting with probe ', probe_start, start, 'and ending with ', probe_end, end)
-                    same_events.append([start, probe_start, end, probe_end, probes_separation])
+    helios1_events = [event for event in helios1_events if datetime(1976, 1, 20) < event < datetime(1979, 10, 1)]
+    helios1_indices, helios2_indices = get_event_pairs(helios1_events, helios2_events)
+    if len(helios1_indices) == 0:
+        return []
+    times1 = np.array(helios1_events, dtype='datetime64[ns]')[helios1_indices]
+    times2 = np.array(helios2_events, dtype='datetime64[ns]')[helios2_indices]
+    starts_with_helios1 = times1 < times2
+
+    # speeds of the solar wind before and after the events, and Alfven speeds at the events
+    speeds1 = get_event_speeds([helios1_events[n] for n in np.unique(helios1_indices)], probe=1)
+    speeds2 = get_event_speeds([helios2_events[n] for n in np.unique(helios2_indices)], probe=2)
+    positions1 = np.searchsorted(np.unique(helios1_indices), helios1_indices)
+    positions2 = np.searchsorted(np.unique(helios2_indices), helios2_indices)
+    speed_after1, speed_before1, alfven1 = speeds1[:, positions1]
+    speed_after2, speed_before2, alfven2 = speeds2[:, positions2]
+    speed = (np.where(starts_with_helios1, speed_after1 + speed_before2, speed_after2 + speed_before1) + alfven1 +
+             alfven2) / 2
+
+    probes_separation = np.linalg.norm(orbiter_helios1.get_positions(times1) - orbiter_helios2.get_positions(times2),
+                                       axis=-1) * AU_TO_KM
+    time_between_events = np.abs(times2 - times1).astype('timedelta64[ns]').astype(np.int64) / 10 ** 9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected_time = probes_separation / speed
+        time_ratio = time_between_events / expected_time
+    is_same_event = (1 - allowed_error < time_ratio) & (time_ratio < 1 + allowed_error)
 
+    same_events = []
+    for n in np.flatnonzero(is_same_event):
+        event1, event2 = helios1_events[helios1_indices[n]], helios2_events[helios2_indices[n]]
+        if starts_with_helios1[n]:
+            start, probe_start, end, probe_end = event1, 1, event2, 2
+        else:
+            start, probe_start, end, probe_end = event2, 2, event1, 1
+        print(time_ratio[n])
+        print('expected ', start + timedelta(seconds=int(expected_time[n])), ' but got ', end,
+              'starting with probe ', probe_start, start, 'and ending with ', probe_end, end)
+        same_events.append([start, probe_start, end, probe_end, probes_separation[n]])
     return same_events
 
 
+def get_event_pairs(events_1: List[datetime], events_2: List[datetime],
+                    horizon: timedelta = SAME_EVENT_HORIZON) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the pairs of events which are at most horizon apart, with a sweep over the sorted events
+    :param events_1: first list of events
+    :param events_2: second list of events
+    :param horizon: maximum time between the events of a pair
+    :return: indices in events_1 and in events_2 of the events of each pair, sorted by index in events_1 and then in
+    events_2
+    """
+    times_1 = np.array(events_1, dtype='datetime64[ns]')
+    times_2 = np.array(events_2, dtype='datetime64[ns]')
+    order_2 = np.argsort(times_2, kind='stable')
+    sorted_times_2 = times_2[order_2]
+    first = np.searchsorted(sorted_times_2, times_1 - np.timedelta64(horizon), side='left')
+    last = np.searchsorted(sorted_times_2, times_1 + np.timedelta64(horizon), side='right')
+    pairs_per_event = last - first
+    indices_1 = np.repeat(np.arange(len(times_1)), pairs_per_event)
+    # position of each pair among the pairs of its event in events_1, added to the first event of events_2 in range
+    offsets = np.arange(len(indices_1)) - np.repeat(np.cumsum(pairs_per_event) - pairs_per_event, pairs_per_event)
+    indices_2 = order_2[np.repeat(first, pairs_per_event) + offsets]
+    order = np.lexsort((indices_2, indices_1))
+    return indices_1[order], indices_2[order]
+
+
+def get_event_speeds(events: List[datetime], probe: int, duration: int = SPEED_DURATION) -> np.ndarray:
+    """
+    Finds the speeds of the solar wind around the events, with the data of each day holding events loaded once
+    :param events: events of the probe
+    :param probe: 1 or 2 for Helios 1 or 2
+    :param duration: duration in hours over which the speed of the solar wind is averaged on each side of the events
+    :return: array of shape (3, number of events), with the mean speed of the solar wind during the duration after
+    each event, during the duration before it and the Alfven speed at the event, nan when there is no data
+    """
+    data_blocks = get_event_data_blocks(probe, events, duration=2 * duration)
+    speeds = np.full((3, len(events)), np.nan)
+    for n, event in enumerate(events):
+        for side, start in enumerate([event, event - timedelta(hours=duration)]):
+            try:
+                imported_data = get_event_data(probe, start, duration, data_blocks)
+            except RuntimeWarning:
+                continue
+            imported_data.data.dropna(inplace=True)
+            imported_data.create_processed_column('vp_magnitude')
+            speeds[side, n] = np.mean(imported_data.data['vp_magnitude'].values)
+    speeds[2] = get_alfven_speeds(events, probe, data_blocks)
+    return speeds
+
+
 def find_directions(event1: datetime, event2: datetime, probe1: int, probe2: int, allowed_error=0.2) -> List[
                     Union[datetime, int]]:
     """
@@ -117,22 +155,14 @@ def find_directions(event1: datetime, event2: datetime, probe1: int, probe2: int
     :param allowed_error: allowed percentage error in the distance difference between the two obtained distances
     :return: possible pair of events with associated probes
     """
-    data1 = HeliosData(start_date=event1.strftime('%d/%m/%Y'), duration=24, probe=probe1)
-    data2 = HeliosData(start_date=event2.strftime('%d/%m/%Y'), duration=24, probe=probe2)
+    data1 = get_probe_data(start_date=event1.strftime('%d/%m/%Y'), duration=24, probe=probe1)
+    data2 = get_probe_data(start_date=event2.strftime('%d/%m/%Y'), duration=24, probe=probe2)
     data1.data.dropna(inplace=True)
     data2.data.dropna(inplace=True)
 
-    times = orbit_times_generator(start_date='20/01/1976', end_date='01/10/1979')
-    orbiter1_sse = kernel_loader(probe1)
-    orbit_generator(orbiter1_sse, times, observing_body='Earth', frame='SSE', probe=probe1)
-    orbiter2_sse = kernel_loader(probe2)
-    orbit_generator(orbiter2_sse, times, observing_body='Earth', frame='SSE', probe=probe2)
-
-    index1 = orbiter1_sse.times.index(datetime(event1.year, event1.month, event1.day))
-    index2 = orbiter2_sse.times.index(datetime(event2.year, event2.month, event2.day))
-    x_orb = (orbiter2_sse.x[index2] - orbiter1_sse.x[index1]).to(u.km) / u.km * 6.68459e-9
-    y_orb = (orbiter2_sse.y[index2] - orbiter1_sse.y[index1]).to(u.km) / u.km * 6.68459e-9
-    z_orb = (orbiter2_sse.z[index2] - orbiter1_sse.z[index1]).to(u.km) / u.km * 6.68459e-9
+    position1 = get_ephemeris(probe1, [event1], observing_body='Earth', frame='SSE').positions[0]
+    position2 = get_ephemeris(probe2, [event2], observing_body='Earth', frame='SSE').positions[0]
+    x_orb, y_orb, z_orb = (position2 - position1) * AU_TO_KM * 6.68459e-9
 
     time_between_events = (event2 - event1).total_seconds()
     v = np.array(
@@ -159,18 +189,44 @@ def get_alfven(event: datetime, probe: int) -> float:
     :param probe: probe corresponding to the event
     :return: Alfven speed
     """
+    return get_alfven_speeds([event], probe)[0]
+
+
+def get_alfven_speeds(events: List[datetime], probe: int,
+                      data_blocks: Optional[List[ImportedData]] = None) -> np.ndarray:
+    """
+    Finds the Alfven speeds at the events, with the LMN coordinates of all the events found at once
+    :param events: events whose Alfven speed we want to find
+    :param probe: probe corresponding to the events
+    :param data_blocks: data of the probe which was already loaded
+    :return: Alfven speeds, nan for the events without data
+    """
     interval = timedelta(minutes=5)
-    start = event - timedelta(hours=2)
-    imported_data = HeliosData(start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour, duration=4, probe=probe)
-    imported_data.data.dropna(inplace=True)
-    L, M, N = hybrid_mva(event, probe, outside_interval=5, inside_interval=1, mva_interval=10)
-    _b = (np.array([np.mean((imported_data.data.loc[event - interval: event + interval, 'Bx']).values),
-                    np.mean((imported_data.data.loc[event - interval: event + interval, 'By']).values),
-                    np.mean((imported_data.data.loc[event - interval: event + interval, 'Bz']).values)]))
-    b_l = np.abs(np.dot(_b, L))
-    n = np.mean((imported_data.data.loc[event - interval: event + interval, 'n_p']).values)
-    alfven_speed = b_l * 10 ** (-9) / np.sqrt(n * 10 ** 6 * 1.67e-27 * np.pi * 4e-7) * 10 ** (-3)  # we want in km
-    return alfven_speed
+    windows, b_windows, side_b = [], [], []
+    for event in events:
+        try:
+            imported_data = get_event_data(probe, event - timedelta(hours=2), 4, data_blocks)
+        except RuntimeWarning:
+            windows.append(None)
+            continue
+        imported_data.data.dropna(inplace=True)
+        windows.append(imported_data.data.loc[event - interval: event + interval])
+        b_windows.append(get_b(imported_data, event, interval=10))
+        side_b.append(get_side_data(imported_data, event, outside_interval=5, inside_interval=1)[:2])
+
+    alfven_speeds = np.full(len(events), np.nan)
+    if not b_windows:
+        return alfven_speeds
+    L, _, _ = mva_batch(stack_b_windows(b_windows))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        L, _, _ = hybrid(L, np.array([b1 for b1, _ in side_b]), np.array([b2 for _, b2 in side_b]))
+    has_data = np.array([window is not None for window in windows])
+    _b = np.array([np.mean(window[['Bx', 'By', 'Bz']].values, axis=0) for window in windows if window is not None])
+    n = np.array([np.mean(window['n_p'].values) for window in windows if window is not None])
+    b_l = np.abs(np.sum(_b * L, axis=1))
+    # we want in km
+    alfven_speeds[has_data] = b_l * 10 ** (-9) / np.sqrt(n * 10 ** 6 * 1.67e-27 * np.pi * 4e-7) * 10 ** (-3)
+    return alfven_speeds
 
 
 if __name__ == '__main__':
@@ -1,21 +1,91 @@
+from collections import OrderedDict
 from datetime import timedelta, datetime
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
 import pandas as pd
 import numpy as np
 import logging
 
 from data_handler.data_importer.imported_data import ImportedData
-from data_handler.utils.column_processing import get_moving_average, get_derivative, get_outliers
+from data_handler.utils.column_processing import get_moving_average, get_derivative, get_outliers, get_window_bounds, \
+    get_nanoseconds, get_outlier_statistics
 from magnetic_reconnection_dir.finder.base_finder import BaseFinder
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CORRELATION_CACHE_SIZE = 256 * 1024 ** 2  # bytes
+CORRELATION_INPUT_COLUMNS = ['Bx', 'By', 'Bz', 'vp_x', 'vp_y', 'vp_z']
+CORRELATION_COLUMNS = ['correlation_x', 'correlation_y', 'correlation_z', 'correlation_sum', 'correlation_diff']
+
+
+class CorrelationCache:
+    def __init__(self, max_size: int = DEFAULT_CORRELATION_CACHE_SIZE):
+        """
+        In memory cache of the correlation columns of the data windows, which do not depend on the parameters of the
+        finder, so that running the finder again on the same windows with other parameters only finds the outliers
+        The windows are identified by a fingerprint of their times, magnetic field and velocity. The least recently used
+        windows are evicted when the cached columns take more than max_size bytes.
+        :param max_size: maximum size of the cached columns in bytes
+        """
+        self.max_size = max_size
+        self.columns: Dict[str, Dict[str, np.ndarray]] = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return '{}: {} windows in {} bytes, {} hits and {} misses'.format(self.__class__.__name__, len(self.columns),
+                                                                          self.size, self.hits, self.misses)
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, np.ndarray]]:
+        """
+        :param fingerprint: fingerprint of the data window
+        :return: correlation columns of the window, None if they are not cached
+        """
+        if fingerprint not in self.columns:
+            self.misses += 1
+            return None
+        self.columns.move_to_end(fingerprint)
+        self.hits += 1
+        return self.columns[fingerprint]
+
+    def put(self, fingerprint: str, columns: Dict[str, np.ndarray]):
+        """
+        Caches the correlation columns of a window, and evicts the least recently used windows if the cache is too big
+        :param fingerprint: fingerprint of the data window
+        :param columns: correlation columns of the window
+        :return:
+        """
+        for values in columns.values():
+            values.flags.writeable = False
+        self.columns[fingerprint] = columns
+        self.size += sum(values.nbytes for values in columns.values())
+        while self.size > self.max_size and self.columns:
+            _, evicted_columns = self.columns.popitem(last=False)
+            self.size -= sum(values.nbytes for values in evicted_columns.values())
+
+    def clear(self):
+        """
+        Removes all the cached windows
+        :return:
+        """
+        self.columns.clear()
+        self.size = 0
+
+
+correlation_cache = CorrelationCache()
+
 
 class CorrelationFinder(BaseFinder):
     coordinates = ['x', 'y', 'z']
 
-    def __init__(self):
+    def __init__(self, cache: Optional[CorrelationCache] = correlation_cache):
+        """
+        :param cache: cache of the correlation columns of the data windows (None to always compute them), shared by
+        default by all the finders of the process
+        """
         super().__init__()
+        self.cache = cache
         # be careful, the limit minutes depend on the interval size (around 4*interval should be fine)
         # self.outlier_intersection_limit_minutes = outlier_intersection_limit_minutes
 
@@ -92,11 +162,31 @@ class CorrelationFinder(BaseFinder):
         Finds the correlations by multiplying the diffs of b and v (divided by the time between the data points)
         These are divided by the standard deviations of b and v to obtain a kind of scaling
         The total correlation is then obtained by summing all correlations
+        The columns are taken from the cache when the same data was already seen
         :param data: ImportedData
         :return: data with additional columns
         """
-        coordinate_correlation_column_names = []
+        if self.cache is None:
+            columns = self.get_correlation_columns(data)
+        else:
+            fingerprint = get_data_fingerprint(data, CORRELATION_INPUT_COLUMNS)
+            columns = self.cache.get(fingerprint)
+            if columns is None:
+                columns = self.get_correlation_columns(data)
+                self.cache.put(fingerprint, columns)
+
+        for column_name in CORRELATION_COLUMNS:
+            data[column_name] = columns[column_name]
+        return data
 
+    def get_correlation_columns(self, data: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """
+        Computes the correlation columns, which do not depend on the parameters of the finder
+        :param data: ImportedData
+        :return: values of the correlation columns
+        """
+        coordinate_correlations = []
+        columns = {}
         for coordinate in self.coordinates:
             field_column_name = 'B' + coordinate
             v_column_name = 'vp_' + coordinate
@@ -110,14 +200,14 @@ class CorrelationFinder(BaseFinder):
             std_v = (data[v_column_name] - get_moving_average(data[v_column_name])).std()
             correlations = delta_b / std_b * delta_v / std_v
 
-            column_name = 'correlation_{}'.format(coordinate)
-            data[column_name] = correlations.abs().apply(np.sqrt) * correlations.apply(np.sign)
-            coordinate_correlation_column_names.append(column_name)
+            correlation = correlations.abs().apply(np.sqrt) * correlations.apply(np.sign)
+            columns['correlation_{}'.format(coordinate)] = correlation.values
+            coordinate_correlations.append(correlation)
 
-        data['correlation_sum'] = data.loc[:, coordinate_correlation_column_names].sum(axis=1)
-        data['correlation_diff'] = get_derivative(data['correlation_sum']).abs()
-
-        return data
+        correlation_sum = pd.concat(coordinate_correlations, axis=1).sum(axis=1)
+        columns['correlation_sum'] = correlation_sum.values
+        columns['correlation_diff'] = get_derivative(correlation_sum).abs().values
+        return columns
 
     def find_outliers(self, data: pd.DataFrame, sigma_sum: float, sigma_diff: float, minutes: float = 10) -> List[
                       datetime]:
@@ -134,36 +224,112 @@ class CorrelationFinder(BaseFinder):
         data['correlation_diff_outliers'] = get_outliers(data['correlation_diff'], standard_deviations=sigma_diff,
                                                          minutes=minutes)
 
-        outlier_datetimes = []
-        for index, value in data['correlation_diff_outliers'].iteritems():
-            index: pd.Timestamp = index
-            interval = timedelta(minutes=minutes)
-            sum_outliers = data.loc[index - interval:index + interval, 'correlation_sum_outliers']
-            # ensure there is a positive and a negative value in sum_outliers
-            if (sum_outliers > 0).any() and (sum_outliers < 0).any():
-                outlier_datetimes.append(index.to_pydatetime())
-
-        n = 0
-        grouped_outliers = []
-        groups = 0
-        while n < len(outlier_datetimes) - 1:
-            grouped_outliers.append([])
-            grouped_outliers[groups].append(outlier_datetimes[n])
-            n += 1
-            while (outlier_datetimes[n] - outlier_datetimes[n - 1]).total_seconds() < 130 and n < len(
-                    outlier_datetimes) - 1:
-                grouped_outliers[groups].append(outlier_datetimes[n])
-                n += 1
-            groups = groups + 1
-
-        datetimes_list = []
-        for group in grouped_outliers:
-            maximum_in_group = data.loc[group, 'correlation_diff_outliers']  # find max correlation_diff_outliers
-            datetimes_list.append(maximum_in_group.idxmax())
+        sum_outliers = data['correlation_sum_outliers'].values
+        times = data.index.values.astype(np.int64)
+        outlier_positions = get_sign_change_positions(times, sum_outliers > 0, sum_outliers < 0, minutes)
+        event_positions = get_group_maxima(times, outlier_positions, data['correlation_diff_outliers'].values,
+                                           data['correlation_diff_outliers'].notna().values)
+        datetimes_list = list(data.index[event_positions])
 
         logger.debug(f'Outliers check returned: {datetimes_list}')
         return datetimes_list
 
+    def sweep_magnetic_reconnections(self, imported_data: ImportedData, sigma_sums: Sequence[float],
+                                     sigma_diffs: Sequence[float], minutes_b: float = 3, minutes: float = 3,
+                                     nt_test: bool = False) -> Dict[Tuple[float, float], List[datetime]]:
+        """
+        Finds the possible events for every pair of sigma_sum and sigma_diff at once
+        The statistics of the outliers tests are found once and compared to all the thresholds together, and the tests
+        of the possible events (which do not depend on the thresholds) are run once for each possible event
+        :param imported_data: ImportedData
+        :param sigma_sums: values of sigma_sum to test
+        :param sigma_diffs: values of sigma_diff to test
+        :param minutes_b: int
+        :param minutes: minutes around which find_outliers will be considered
+        :param nt_test: if True, runs a density and temperature test
+        :return: possible events for each (sigma_sum, sigma_diff), the same as find_magnetic_reconnections
+        """
+        data = imported_data.data
+        self.find_correlations(data)
+        sum_deviations, sum_standard_deviation = get_outlier_statistics(data['correlation_sum'], minutes=minutes,
+                                                                        ignore_minutes_around=3, reference=0)
+        diff_deviations, diff_standard_deviation = get_outlier_statistics(data['correlation_diff'], minutes=minutes)
+        with np.errstate(invalid='ignore'):
+            sum_outliers = sum_deviations > np.multiply.outer(sigma_sums, sum_standard_deviation)
+            diff_outliers = diff_deviations > np.multiply.outer(sigma_diffs, diff_standard_deviation)
+
+        times = data.index.values.astype(np.int64)
+        sum_values = data['correlation_sum'].values
+        diff_values = data['correlation_diff'].values
+        event_positions = {}
+        for sum_index, sigma_sum in enumerate(sigma_sums):
+            outlier_positions = get_sign_change_positions(times, sum_outliers[sum_index] & (sum_values > 0),
+                                                          sum_outliers[sum_index] & (sum_values < 0), minutes)
+            for diff_index, sigma_diff in enumerate(sigma_diffs):
+                event_positions[sigma_sum, sigma_diff] = get_group_maxima(times, outlier_positions, diff_values,
+                                                                          diff_outliers[diff_index])
+
+        # the other tests only depend on the possible event, so they are run once for each of them
+        possible_events = list(data.index[np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + list(
+            event_positions.values())))])
+        accepted_events = set(self.b_changes(possible_events, data, minutes_b=minutes_b))
+        if nt_test:
+            accepted_events = set(self.n_and_t_changes(sorted(accepted_events), data))
+        return {sigmas: [_datetime for _datetime in data.index[positions] if _datetime in accepted_events] for
+                sigmas, positions in event_positions.items()}
+
+
+def get_sign_change_positions(times: np.ndarray, positive_outliers: np.ndarray, negative_outliers: np.ndarray,
+                              minutes: float) -> np.ndarray:
+    """
+    Finds the points which have both a positive and a negative correlation_sum outlier within minutes of them
+    :param times: times of the data in nanoseconds
+    :param positive_outliers: whether each point is a positive outlier
+    :param negative_outliers: whether each point is a negative outlier
+    :param minutes: minutes around each point where the outliers are considered
+    :return: positions of the points, except the last one which is never part of a group
+    """
+    lower, upper = get_window_bounds(times, times - get_nanoseconds(minutes), times + get_nanoseconds(minutes))
+    positive_before = np.concatenate(([0], np.cumsum(positive_outliers)))
+    negative_before = np.concatenate(([0], np.cumsum(negative_outliers)))
+    has_sign_change = (positive_before[upper] > positive_before[lower]) & (
+        negative_before[upper] > negative_before[lower])
+    return np.flatnonzero(has_sign_change)[:-1]
+
+
+def get_group_maxima(times: np.ndarray, outlier_positions: np.ndarray, diff_values: np.ndarray,
+                     diff_outliers: np.ndarray) -> np.ndarray:
+    """
+    Groups the points less than 130 seconds apart, and keeps the highest correlation_diff outlier of each group
+    :param times: times of the data in nanoseconds
+    :param outlier_positions: positions of the points to group, in time order
+    :param diff_values: values of correlation_diff
+    :param diff_outliers: whether each point is a correlation_diff outlier
+    :return: positions of the highest correlation_diff outlier of each group (the first one in case of a tie), for the
+    groups which have one
+    """
+    outlier_times = times[outlier_positions]
+    group_ids = np.cumsum(np.diff(outlier_times, prepend=outlier_times[:1]) >= pd.Timedelta(seconds=130).value)
+    has_diff_outlier = diff_outliers[outlier_positions]
+    positions, group_ids = outlier_positions[has_diff_outlier], group_ids[has_diff_outlier]
+    # the sort is stable, so the first of equal values stays first in its group
+    order = np.lexsort((-diff_values[positions], group_ids))
+    is_group_start = np.diff(group_ids[order], prepend=-1) != 0
+    return positions[order][is_group_start]
+
+
+def get_data_fingerprint(data: pd.DataFrame, column_names: List[str]) -> str:
+    """
+    :param data: data window
+    :param column_names: columns of the data identifying the window
+    :return: fingerprint of the times and of the values of the given columns of the window
+    """
+    fingerprint = hashlib.sha1(data.index.values.astype('datetime64[ns]').tobytes())
+    for column_name in column_names:
+        fingerprint.update(column_name.encode())
+        fingerprint.update(np.ascontiguousarray(data[column_name].values, dtype=np.float64).tobytes())
+    return fingerprint.hexdigest()
+
 
 def get_average_b(_datetime: datetime, data_column: pd.DataFrame, minutes_around: int = 10) -> List[datetime]:
     """
@@ -1,12 +1,13 @@
-from datetime import timedelta, datetime
+from datetime import datetime
+from typing import Optional
 import numpy as np
 import matplotlib.pyplot as plt
 import csv
 
-from data_handler.data_importer.helios_data import HeliosData
 from magnetic_reconnection_dir.finder.base_finder import BaseFinder
 from magnetic_reconnection_dir.finder.correlation_finder import CorrelationFinder
-from magnetic_reconnection_dir.lmn_coordinates import test_reconnection_lmn
+from magnetic_reconnection_dir.finder.parameter_optimisation.mcc_calculations import MccEvaluator, get_event_counts, \
+    get_labelled_event_data, get_mcc
 
 # lists [event, probe, number of reconnection events]
 event_list = [[datetime(1974, 12, 15, 14, 0, 0), 1, 1], [datetime(1974, 12, 15, 20, 0, 0), 1, 1],
@@ -40,22 +41,25 @@ DEFAULT_GENES = [[1, 4], [1, 4], [3, 8], [0.5, 0.95], [1.05, 1.5]]
 def evolution_algorithm(genes_dict: dict, first_population_size: int = 10, best_samples_size: int = 3,
                         randomly_chosen_sample_size: int = 3, number_of_descendants: int = 2,
                         mutation_probability: float = 0.1, event_list_split: int = 30, iterations: int = 40,
-                        finder: BaseFinder = CorrelationFinder()):
+                        finder: BaseFinder = CorrelationFinder(), workers: int = 1):
     genes_keys = list(genes_dict.keys())
     genes = [genes_dict[key] for key in genes_keys]
 
     population = generate_first_population(first_population_size, genes)
     performances = []
-    for loop in range(iterations):
-        print('GENERATION', loop)
-        np.random.shuffle(event_list)
-        sorted_by_performance = performance_per_gene(population, event_list_split, finder)
-        performances.append(sorted_by_performance[0])
-        print('performance', sorted_by_performance)
-        next_generation = selection(sorted_by_performance, best_samples=best_samples_size,
-                                    randomly_chosen_samples=randomly_chosen_sample_size)
-        descendants = crossover(next_generation, descendants_number=number_of_descendants, best_genes=best_samples_size)
-        population = mutation(descendants, mutation_probability)
+    # the data of the events is loaded once, and the genes of each generation are evaluated by the workers
+    with MccEvaluator(event_list, workers=workers, finder=finder) as evaluator:
+        for loop in range(iterations):
+            print('GENERATION', loop)
+            np.random.shuffle(event_list)
+            sorted_by_performance = performance_per_gene(population, event_list_split, finder, evaluator)
+            performances.append(sorted_by_performance[0])
+            print('performance', sorted_by_performance)
+            next_generation = selection(sorted_by_performance, best_samples=best_samples_size,
+                                        randomly_chosen_samples=randomly_chosen_sample_size)
+            descendants = crossover(next_generation, descendants_number=number_of_descendants,
+                                    best_genes=best_samples_size)
+            population = mutation(descendants, mutation_probability)
 
     def get_key(item):
         return item[0]
@@ -85,32 +89,12 @@ def fitness(gene: list, event_list_split: int, finder: BaseFinder):
     # test on random part of the data (avoid over-fitting and allow more iterations of the algorithm in less time)
     events = event_list[:event_list_split]
     f_n, t_n, t_p, f_p = 0, 0, 0, 0
-    gene_split = len(gene) - 2  # split between the finder test and the lmn test (which takes two arguments)
     for event, probe, reconnection_number in events:
-        interval = 3
-        start_time = event - timedelta(hours=interval / 2)
-        start_hour = event.hour
-        data = HeliosData(start_date=start_time.strftime('%d/%m/%Y'), start_hour=start_hour,
-                          duration=interval, probe=probe)
-        reconnection_corr = finder.find_magnetic_reconnections(data, *gene[:gene_split])
-        reconnection = test_reconnection_lmn(reconnection_corr, probe, *gene[gene_split:])
-
-        if reconnection_number == 0:
-            if len(reconnection) == 0:
-                t_n += 1
-            else:
-                f_p += len(reconnection)
-        else:
-            if len(reconnection) < reconnection_number:
-                f_n += reconnection_number - len(reconnection)
-                t_p += len(reconnection)
-            elif len(reconnection) == reconnection_number:
-                t_p += len(reconnection)
-            else:  # more detected than real
-                f_p += len(reconnection) - reconnection_number
-                t_p += reconnection_number
-    mcc = (t_p * t_n + f_n * f_p) / np.sqrt((t_p + f_p) * (t_p + f_n) * (t_n + f_p) * (t_n + f_n))
-    return mcc
+        data, data_block = get_labelled_event_data(event, probe)
+        event_t_p, event_t_n, event_f_p, event_f_n = get_event_counts(gene, data, data_block, probe,
+                                                                      reconnection_number, finder)
+        t_p, t_n, f_p, f_n = t_p + event_t_p, t_n + event_t_n, f_p + event_f_p, f_n + event_f_n
+    return get_mcc(t_p, t_n, f_p, f_n)
 
 
 def gene_generation(genes: list):
@@ -132,18 +116,24 @@ def generate_first_population(population_size: int, genes: list):
     return population
 
 
-def performance_per_gene(population: list, event_list_split: int, finder: BaseFinder):
+def performance_per_gene(population: list, event_list_split: int, finder: BaseFinder,
+                         evaluator: Optional[MccEvaluator] = None):
     """
     Finds the mcc performance of the given gens
     :param population: all the genes that are being considered
     :param event_list_split: number of events to test in the events list
     :param finder: finder to be used in the fitness calculation
+    :param evaluator: if given, evaluates all the genes together (in parallel if it has several workers)
     :return: list of list of mcc and genes
     """
-    performance = []
-    for gene in population:
-        print('GENE', gene)
-        performance.append([fitness(gene, event_list_split, finder), gene])
+    if evaluator is None:
+        performance = []
+        for gene in population:
+            print('GENE', gene)
+            performance.append([fitness(gene, event_list_split, finder), gene])
+    else:
+        mcc_values = evaluator.get_mcc_values(population, event_list[:event_list_split])
+        performance = [[mcc_value, gene] for mcc_value, gene in zip(mcc_values, population)]
 
     def get_key(item):
         return item[0]
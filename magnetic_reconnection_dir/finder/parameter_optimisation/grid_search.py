@@ -1,11 +1,9 @@
-from functools import partial
 import numpy as np
-from multiprocessing import Pool
 import csv
-from typing import List
+from typing import List, Tuple
 
 from magnetic_reconnection_dir.finder.correlation_finder import CorrelationFinder
-from magnetic_reconnection_dir.finder.parameters_optimisation.mcc_calculations import mcc_from_parameters
+from magnetic_reconnection_dir.finder.parameter_optimisation.mcc_calculations import MccEvaluator, mcc_grid_from_sweep
 
 
 def find_best_combinations(all_mcc: list, mcc_params: List[dict]):
@@ -22,6 +20,29 @@ def find_best_combinations(all_mcc: list, mcc_params: List[dict]):
     print(mcc_params[int(maximum_mcc)])
 
 
+def sigma_grid_search(sigma_sums: List[float], sigma_diffs: List[float], minutes_b: float = 5, minutes: float = 3,
+                      minimum_walen: float = 0.9, maximum_walen: float = 1.1) -> Tuple[list, List[dict]]:
+    """
+    Finds the mcc of every pair of sigma_sum and sigma_diff, for about the cost of a single pair
+    :param sigma_sums: values of sigma_sum to test
+    :param sigma_diffs: values of sigma_diff to test
+    :param minutes_b: minutes_b of the finder
+    :param minutes: minutes of the finder
+    :param minimum_walen: minimum walen fraction
+    :param maximum_walen: maximum walen fraction
+    :return: mcc values and corresponding parameters, as used by find_best_combinations and send_to_csv
+    """
+    mcc_grid = mcc_grid_from_sweep(sigma_sums, sigma_diffs, minutes_b, minutes, minimum_walen, maximum_walen,
+                                   finder=CorrelationFinder())
+    mcc, params = [], []
+    for sum_index, sigma_sum in enumerate(sigma_sums):
+        for diff_index, sigma_diff in enumerate(sigma_diffs):
+            mcc.append(mcc_grid[sum_index, diff_index])
+            params.append({'sigma_sum': sigma_sum, 'sigma_diff': sigma_diff, 'minutes_b': minutes_b,
+                           'minutes': minutes, 'minimum walen': minimum_walen, 'maximum walen': maximum_walen})
+    return mcc, params
+
+
 def send_to_csv(name: str, mcc_values: list, mcc_params: List[dict], keys: list):
     """
     Sends the data to a csv file
@@ -52,15 +73,19 @@ if __name__ == '__main__':
                   'maximum walen': max_wal} for sigma_s in parameters['sigma_sum'] for sigma_d in
                  parameters['sigma_diff'] for mins_b in parameters['minutes_b'] for min_wal in
                  parameters['minimum walen'] for max_wal in parameters['maximum walen']]
-    pool = Pool(processes=2)
-    with_finder = partial(mcc_from_parameters, finder=CorrelationFinder())
-    results = pool.map(with_finder, test_args)
+    with MccEvaluator(workers=2, finder=CorrelationFinder()) as evaluator:
+        results = evaluator.get_mcc_from_parameters(test_args)
     mcc = [result[0] for result in results]
     params = [result[1] for result in results]
 
     send_to_csv('mcc_corr_lmn2', mcc, params, parameters_keys)
     find_best_combinations(mcc, params)
 
+    # sigma_sum and sigma_diff can be swept on a fine grid at once
+    # grid_mcc, grid_params = sigma_grid_search(list(np.linspace(1.9, 3.1, 50)), list(np.linspace(1.9, 3.1, 50)))
+    # send_to_csv('mcc_sigma_grid', grid_mcc, grid_params, list(grid_params[0].keys()))
+    # find_best_combinations(grid_mcc, grid_params)
+
     # MCC 0.737711113563
     # {'sigma_sum': 3.100000000000001, 'sigma_diff': 1.8999999999999999, 'minutes_b': 7,
     # 'minimum walen': 0.99999999999999989, 'maximum walen': 1.2000000000000002}
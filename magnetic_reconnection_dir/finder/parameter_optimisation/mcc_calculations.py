@@ -1,11 +1,14 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Union
+from typing import List, Optional, Sequence, Tuple, Union
+import itertools
 import numpy as np
 
-from data_handler.data_importer.data_import import get_probe_data
+from data_handler.data_importer.data_import import get_data_window, get_probe_data
+from data_handler.data_importer.imported_data import ImportedData
 from magnetic_reconnection_dir.finder.base_finder import BaseFinder
 from magnetic_reconnection_dir.finder.correlation_finder import CorrelationFinder
-from magnetic_reconnection_dir.lmn_coordinates import test_reconnection_lmn
+from magnetic_reconnection_dir.lmn_coordinates import LMN_DURATION, test_reconnection_lmn
 
 events_list = (
     [datetime(1974, 12, 15, 14, 0, 0), 1, 1], [datetime(1974, 12, 15, 20, 0, 0), 1, 1],
@@ -43,39 +46,248 @@ def mcc_from_parameters(mcc_parameters: dict, finder: BaseFinder = CorrelationFi
     f_n, t_n, t_p, f_p = 0, 0, 0, 0
     for event, probe, reconnection_number in event_list:
         print(event, reconnection_number)
-        interval = 3
-        start_time = event - timedelta(hours=interval / 2)
-        start_hour = event.hour
-        data = get_probe_data(probe=probe, start_date=start_time.strftime('%d/%m/%Y'), start_hour=start_hour,
-                              duration=interval)
-
+        data, data_block = get_labelled_event_data(event, probe)
         # making sure this function can possibly be used with other finders
         # this way we unfold the arguments necessary for the finder, that are fed in the function
-        split_of_params = len(mcc_parameters) - 2
         list_of_params = [mcc_parameters[key] for key in list(mcc_parameters.keys())]
-        reconnection_corr = finder.find_magnetic_reconnections(data, *list_of_params[:split_of_params])
-        reconnection = test_reconnection_lmn(reconnection_corr, probe, *list_of_params[split_of_params:])
-        if reconnection_number == 0:
-            if len(reconnection) == 0:  # nothing detected, which is good
-                t_n += 1
-            else:  # too many things detected
-                f_p += len(reconnection)
-        else:
-            if len(reconnection) < reconnection_number:  # not enough detected
-                f_n += reconnection_number - len(reconnection)
-                t_p += len(reconnection)
-                print(reconnection_number, len(reconnection))
-            elif len(reconnection) == reconnection_number:  # just enough events detected
-                t_p += len(reconnection)
-            else:  # more detected than real
-                f_p += len(reconnection) - reconnection_number
-                t_p += reconnection_number
+        event_t_p, event_t_n, event_f_p, event_f_n = get_event_counts(list_of_params, data, data_block, probe,
+                                                                      reconnection_number, finder)
+        t_p, t_n, f_p, f_n = t_p + event_t_p, t_n + event_t_n, f_p + event_f_p, f_n + event_f_n
     print(f' true positives: {t_p}\n true negatives: {t_n}\n false positives: {f_p}\n false negatives: {f_n}')
     mcc_value = get_mcc(t_p, t_n, f_p, f_n)
     print('MCC', mcc_value, mcc_parameters)
     return [mcc_value, mcc_parameters]
 
 
+def get_event_counts(parameters: list, data: ImportedData, data_block: ImportedData, probe: Union[int, str],
+                     reconnection_number: int, finder: BaseFinder) -> Tuple[int, int, int, int]:
+    """
+    Runs the finder and the LMN tests on the data of a labelled event
+    :param parameters: parameters of the finder, followed by the minimum and maximum walen fractions
+    :param data: data the finder is run on
+    :param data_block: data covering the LMN data of the events found by the finder
+    :param probe: probe of the event
+    :param reconnection_number: number of reconnection events in the data
+    :param finder: finder to be used in the tests
+    :return: true positives, true negatives, false positives and false negatives of the event
+    """
+    split_of_params = len(parameters) - 2
+    reconnection_corr = finder.find_magnetic_reconnections(data, *parameters[:split_of_params])
+    reconnection = test_reconnection_lmn(reconnection_corr, probe, *parameters[split_of_params:],
+                                         data_blocks=[data_block])
+    return get_confusion_counts(reconnection_number, len(reconnection))
+
+
+def get_confusion_counts(reconnection_number: int, detected_number: int) -> Tuple[int, int, int, int]:
+    """
+    :param reconnection_number: number of reconnection events in the data
+    :param detected_number: number of events that were detected
+    :return: true positives, true negatives, false positives and false negatives
+    """
+    if reconnection_number == 0:
+        if detected_number == 0:  # nothing detected, which is good
+            return 0, 1, 0, 0
+        return 0, 0, detected_number, 0  # too many things detected
+    if detected_number < reconnection_number:  # not enough detected
+        return detected_number, 0, 0, reconnection_number - detected_number
+    if detected_number == reconnection_number:  # just enough events detected
+        return detected_number, 0, 0, 0
+    return reconnection_number, 0, detected_number - reconnection_number, 0  # more detected than real
+
+
+def get_labelled_event_data(event: datetime, probe: Union[int, str],
+                            interval: int = 3) -> Tuple[ImportedData, ImportedData]:
+    """
+    Loads the data around a labelled event once, for both the finder and the LMN tests of the events it finds
+    :param event: date of the labelled event
+    :param probe: probe of the event
+    :param interval: duration of the data the finder is run on, in hours
+    :return: data the finder is run on, and the loaded block which also covers the LMN data of the events found in it
+    """
+    finder_start, block_start = get_labelled_event_starts(event, interval)
+    data_block = get_probe_data(probe=probe, start_date=block_start.strftime('%d/%m/%Y'), start_hour=block_start.hour,
+                                duration=interval + LMN_DURATION, copy=False)
+    return get_data_window(data_block, finder_start, interval), data_block
+
+
+def get_labelled_event_starts(event: datetime, interval: int = 3) -> Tuple[datetime, datetime]:
+    """
+    :param event: date of the labelled event
+    :param interval: duration of the data the finder is run on, in hours
+    :return: start of the data the finder is run on, and start of the block loaded by get_labelled_event_data
+    """
+    start_time = event - timedelta(hours=interval / 2)
+    finder_start = start_time.replace(hour=event.hour, minute=0, second=0, microsecond=0)
+    return finder_start, finder_start - timedelta(hours=LMN_DURATION / 2)
+
+
+def get_labelled_event_windows(event_list=events_list, interval: int = 3) -> List[dict]:
+    """
+    :param event_list: list of labelled events [event, probe, number of reconnection events]
+    :param interval: duration of the data the finder is run on, in hours
+    :return: windows of the blocks loaded by get_labelled_event_data, to build the labelled dataset
+    """
+    return [{'probe': probe, 'start_datetime': get_labelled_event_starts(event, interval)[1],
+             'duration': interval + LMN_DURATION, 'event': event, 'label': reconnection_number} for
+            event, probe, reconnection_number in event_list]
+
+
+def mcc_grid_from_sweep(sigma_sums: Sequence[float], sigma_diffs: Sequence[float], minutes_b: float, minutes: float,
+                        minimum_walen: float, maximum_walen: float, finder: CorrelationFinder = CorrelationFinder(),
+                        event_list=events_list) -> np.ndarray:
+    """
+    Finds the mcc of every pair of sigma_sum and sigma_diff, the other parameters being fixed
+    The data of each event is analysed once: the finder sweeps all the pairs together, and the LMN tests are run once
+    on all the possible events found with any of the pairs.
+    :param sigma_sums: values of sigma_sum to test
+    :param sigma_diffs: values of sigma_diff to test
+    :param minutes_b: minutes_b of the finder
+    :param minutes: minutes of the finder
+    :param minimum_walen: minimum walen fraction
+    :param maximum_walen: maximum walen fraction
+    :param finder: finder to be used in the tests
+    :param event_list: list of events from which the mcc is calculated
+    :return: mcc of each pair, of shape (number of sigma_sums, number of sigma_diffs)
+    """
+    counts = np.zeros((4, len(sigma_sums), len(sigma_diffs)), dtype=np.int64)
+    for event, probe, reconnection_number in event_list:
+        data, data_block = get_labelled_event_data(event, probe)
+        possible_events = finder.sweep_magnetic_reconnections(data, sigma_sums, sigma_diffs, minutes_b=minutes_b,
+                                                              minutes=minutes)
+        all_possible_events = sorted(set(itertools.chain.from_iterable(possible_events.values())))
+        reconnection = set(test_reconnection_lmn(all_possible_events, probe, minimum_walen, maximum_walen,
+                                                 data_blocks=[data_block]))
+        for sum_index, sigma_sum in enumerate(sigma_sums):
+            for diff_index, sigma_diff in enumerate(sigma_diffs):
+                detected_number = len([_event for _event in possible_events[sigma_sum, sigma_diff] if
+                                       _event in reconnection])
+                counts[:, sum_index, diff_index] += get_confusion_counts(reconnection_number, detected_number)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return get_mcc(*counts)
+
+
+class MccEvaluator:
+    def __init__(self, event_list=events_list, workers: int = 1, finder: BaseFinder = CorrelationFinder()):
+        """
+        Evaluates the mcc of many parameter sets, with the (parameter set, event) pairs run by a pool of processes
+        The data of the events is loaded once by each process, and the counts of every pair are added in order, so the
+        mcc values are the same whatever the number of processes.
+        :param event_list: labelled events [event, probe, number of reconnection events] that can be evaluated
+        :param workers: number of processes, 1 to run everything in the current process
+        :param finder: finder to be used in the tests
+        """
+        self.event_list = [tuple(event) for event in event_list]
+        self.workers = workers
+        self.finder = finder
+        # the data of the events is kept by the evaluator when it runs in the current process, so that several
+        # evaluators of the same process do not share it
+        self.event_data: List[Tuple[ImportedData, ImportedData]] = []
+        if workers == 1:
+            self.executor = None
+            self.event_data = [get_labelled_event_data(event, probe) for event, probe, _ in self.event_list]
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=load_labelled_events,
+                                                initargs=(self.event_list, finder))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_counts(self, parameter_sets: List[list],
+                   event_list: Optional[list] = None) -> List[Tuple[int, int, int, int]]:
+        """
+        :param parameter_sets: for each set, parameters of the finder then minimum and maximum walen fractions
+        :param event_list: events to evaluate the parameter sets on, all the events of the evaluator if None
+        :return: true positives, true negatives, false positives and false negatives of each parameter set
+        """
+        event_indices = [self.event_list.index(tuple(event)) for event in
+                         (self.event_list if event_list is None else event_list)]
+        tasks = [(list(parameters), event_index) for parameters in parameter_sets for event_index in event_indices]
+        if self.executor is None:
+            counts = [count_labelled_event(parameters, self.event_list[event_index], self.event_data[event_index],
+                                           self.finder) for parameters, event_index in tasks]
+        else:
+            counts = list(self.executor.map(get_labelled_event_counts, tasks,
+                                            chunksize=max(1, len(tasks) // (4 * self.workers))))
+
+        set_counts = []
+        for set_index in range(len(parameter_sets)):
+            event_counts = counts[set_index * len(event_indices):(set_index + 1) * len(event_indices)]
+            set_counts.append(tuple(sum(count[n] for count in event_counts) for n in range(4)))
+        return set_counts
+
+    def get_mcc_values(self, parameter_sets: List[list], event_list: Optional[list] = None) -> List[float]:
+        """
+        :param parameter_sets: for each set, parameters of the finder then minimum and maximum walen fractions
+        :param event_list: events to evaluate the parameter sets on, all the events of the evaluator if None
+        :return: mcc of each parameter set
+        """
+        return [get_mcc(*counts) for counts in self.get_counts(parameter_sets, event_list)]
+
+    def get_mcc_from_parameters(self, parameter_sets: List[dict]) -> List[List[Union[float, dict]]]:
+        """
+        :param parameter_sets: dictionaries of the parameters to be tested, as given to mcc_from_parameters
+        :return: list containing the mcc and associated parameters for each set
+        """
+        mcc_values = self.get_mcc_values([list(parameters.values()) for parameters in parameter_sets])
+        return [[mcc_value, parameters] for mcc_value, parameters in zip(mcc_values, parameter_sets)]
+
+    def close(self):
+        """
+        Stops the processes of the evaluator
+        :return:
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+# data of the labelled events and finder of a worker process, set by load_labelled_events when the process starts
+_labelled_events: List[tuple] = []
+_labelled_event_data: List[Tuple[ImportedData, ImportedData]] = []
+_labelled_events_finder: Optional[BaseFinder] = None
+
+
+def load_labelled_events(event_list: List[tuple], finder: BaseFinder):
+    """
+    Loads the data of the labelled events in a worker process of MccEvaluator
+    :param event_list: labelled events [event, probe, number of reconnection events]
+    :param finder: finder to be used in the tests
+    :return:
+    """
+    global _labelled_events, _labelled_event_data, _labelled_events_finder
+    _labelled_events = event_list
+    _labelled_event_data = [get_labelled_event_data(event, probe) for event, probe, _ in event_list]
+    _labelled_events_finder = finder
+
+
+def get_labelled_event_counts(task: Tuple[list, int]) -> Tuple[int, int, int, int]:
+    """
+    :param task: parameters to test, and index of the labelled event loaded by load_labelled_events
+    :return: true positives, true negatives, false positives and false negatives of the event
+    """
+    parameters, event_index = task
+    return count_labelled_event(parameters, _labelled_events[event_index], _labelled_event_data[event_index],
+                                _labelled_events_finder)
+
+
+def count_labelled_event(parameters: list, labelled_event: tuple, event_data: Tuple[ImportedData, ImportedData],
+                         finder: BaseFinder) -> Tuple[int, int, int, int]:
+    """
+    :param parameters: parameters of the finder then minimum and maximum walen fractions
+    :param labelled_event: labelled event [event, probe, number of reconnection events]
+    :param event_data: data of the event returned by get_labelled_event_data
+    :param finder: finder to be used in the tests
+    :return: true positives, true negatives, false positives and false negatives of the event
+    """
+    _, probe, reconnection_number = labelled_event
+    data, data_block = event_data
+    # the finder adds columns to the data, so each task works on its own copy
+    data = get_data_window(data, data.start_datetime, data.duration)
+    return get_event_counts(parameters, data, data_block, probe, reconnection_number, finder)
+
+
 def get_mcc(true_positives: int, true_negatives: int, false_positives: int, false_negatives: int) -> float:
     mcc_value = (true_positives * true_negatives - false_positives * false_negatives) / np.sqrt(
         (true_positives + false_positives) * (true_positives + false_negatives) * (true_negatives + false_positives) * (
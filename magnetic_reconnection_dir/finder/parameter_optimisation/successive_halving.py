@@ -0,0 +1,93 @@
+from typing import List, Optional, Union
+import numpy as np
+
+from magnetic_reconnection_dir.finder.correlation_finder import CorrelationFinder
+from magnetic_reconnection_dir.finder.parameter_optimisation.mcc_calculations import MccEvaluator, events_list, get_mcc
+
+
+def generate_parameters(random_state: np.random.RandomState) -> dict:
+    """
+    Generates random parameters, in the same ranges as the random search
+    :param random_state: random state generating the parameters
+    :return: parameters to be tested
+    """
+    return {'sigma_sum': random_state.uniform(1.9, 3.1), 'sigma_diff': random_state.uniform(1.9, 3.1),
+            'minutes_b': random_state.uniform(1, 10), 'minutes': random_state.uniform(1, 10),
+            'minimum walen': random_state.uniform(0.6, 1), 'maximum walen': random_state.uniform(1, 1.4)}
+
+
+def get_mcc_bounds(mcc: float, number_of_events: int, z_score: float = 1.96) -> List[float]:
+    """
+    Finds a confidence interval of the mcc with the Fisher transformation, as for a correlation coefficient
+    :param mcc: mcc value
+    :param number_of_events: number of events the mcc was calculated on
+    :param z_score: z score of the confidence level (1.96 for 95%)
+    :return: lower and upper bounds of the mcc
+    """
+    if number_of_events <= 3:
+        return [-1, 1]
+    fisher_mcc = np.arctanh(np.clip(mcc, -0.999999, 0.999999))
+    margin = z_score / np.sqrt(number_of_events - 3)
+    return [np.tanh(fisher_mcc - margin), np.tanh(fisher_mcc + margin)]
+
+
+def successive_halving(parameter_sets: Optional[List[dict]] = None, number_of_sets: int = 27,
+                       minimum_events: int = 5, reduction_factor: int = 3, z_score: float = 1.96,
+                       event_list=events_list, workers: int = 1,
+                       random_seed: Optional[int] = None) -> List[Union[float, dict]]:
+    """
+    Finds the best parameters by evaluating the parameter sets on growing random subsets of the events, and only
+    keeping the best 1 / reduction_factor of the sets after each subset
+    The counts of the events already evaluated are kept, so each set is only evaluated on the new events of each
+    subset. The search stops early when the confidence interval of the mcc of the best set is above the ones of all the
+    other sets.
+    :param parameter_sets: parameters to be tested, randomly generated if None
+    :param number_of_sets: number of parameter sets to generate if they are not given
+    :param minimum_events: number of events in the first subset
+    :param reduction_factor: the number of sets is divided by this factor, and the number of events multiplied by it,
+    after each subset
+    :param z_score: z score of the confidence level used to stop early
+    :param event_list: list of events from which the mcc is calculated
+    :param workers: number of processes evaluating the parameter sets
+    :param random_seed: seed of the generated parameters and of the order of the events
+    :return: best mcc obtained, with associated parameters
+    """
+    random_state = np.random.RandomState(random_seed)
+    if parameter_sets is None:
+        parameter_sets = [generate_parameters(random_state) for _ in range(number_of_sets)]
+    events = [event_list[n] for n in random_state.permutation(len(event_list))]
+
+    counts = np.zeros((len(parameter_sets), 4), dtype=np.int64)
+    remaining_sets = list(range(len(parameter_sets)))
+    evaluated_events = 0
+    number_of_events = min(minimum_events, len(events))
+    evaluations = 0
+    with MccEvaluator(event_list, workers=workers, finder=CorrelationFinder()) as evaluator:
+        while True:
+            new_events = events[evaluated_events:number_of_events]
+            new_counts = evaluator.get_counts([list(parameter_sets[n].values()) for n in remaining_sets], new_events)
+            counts[remaining_sets] += np.array(new_counts, dtype=np.int64).reshape(-1, 4)
+            evaluations += len(remaining_sets) * len(new_events)
+            evaluated_events = number_of_events
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mcc_values = np.nan_to_num(get_mcc(*counts[remaining_sets].T))
+            remaining_sets = [remaining_sets[n] for n in np.argsort(-mcc_values, kind='stable')]
+            mcc_values = np.sort(mcc_values)[::-1]
+            print('events:', evaluated_events, 'sets:', len(remaining_sets), 'best mcc:', mcc_values[0])
+            if len(remaining_sets) == 1 or evaluated_events == len(events):
+                break
+            best_lower_bound = get_mcc_bounds(mcc_values[0], evaluated_events, z_score)[0]
+            if all(get_mcc_bounds(mcc, evaluated_events, z_score)[1] < best_lower_bound for mcc in mcc_values[1:]):
+                print('The best parameters are separated from the others')
+                break
+            remaining_sets = remaining_sets[:max(1, len(remaining_sets) // reduction_factor)]
+            number_of_events = min(len(events), number_of_events * reduction_factor)
+
+    full_evaluations = len(parameter_sets) * len(events)
+    print('evaluations:', evaluations, 'of', full_evaluations, 'saved:', full_evaluations - evaluations)
+    return [mcc_values[0], parameter_sets[remaining_sets[0]]]
+
+
+if __name__ == '__main__':
+    print(successive_halving(number_of_sets=81))
@@ -1,23 +1,40 @@
 from datetime import timedelta, datetime
-from typing import List, Optional, Union
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple, Union
 import csv
+import itertools
+import time
 import numpy as np
+import pandas as pd
 import logging
 
-from data_handler.data_importer.data_import import get_probe_data
-from data_handler.distances_with_spice import get_imported_data_sets, get_data
+from data_handler.data_importer.data_import import build_labelled_dataset, find_data_block, get_data_window, \
+    get_event_data, get_probe_data
+from data_handler.distances_with_spice import find_radii, get_dates, get_imported_data_sets, get_data, \
+    get_time_indices
 from data_handler.data_importer.imported_data import ImportedData
 from data_handler.data_importer.helios_data import HeliosData
+from data_handler.data_importer.labelled_dataset import LabelledDataset, labelled_dataset
 from data_handler.imported_data_plotter import plot_imported_data, DEFAULT_PLOTTED_COLUMNS
 from data_handler.orbit_with_spice import get_orbiter
+from data_handler.utils.column_processing import get_moving_average, get_derivative
 from magnetic_reconnection_dir.finder.base_finder import BaseFinder
 from magnetic_reconnection_dir.finder.correlation_finder import CorrelationFinder
+from magnetic_reconnection_dir.finder.parameter_optimisation.evolutionary_optimisation import \
+    event_list as evolutionary_event_list
+from magnetic_reconnection_dir.finder.parameter_optimisation.mcc_calculations import events_list, \
+    get_labelled_event_windows
 from magnetic_reconnection_dir.finder.tests.known_events import get_known_magnetic_reconnection_events
+from magnetic_reconnection_dir.lmn_coordinates import LMN_DURATION, get_l_correlations
 from magnetic_reconnection_dir.magnetic_reconnection import MagneticReconnection
+from magnetic_reconnection_dir.mva_analysis import get_b, mva
+from magnetic_reconnection_dir.run_directory import RunDirectory
 
 
 logger = logging.getLogger(__name__)
 
+SHARD_FORMATS = {'year': '%Y', 'month': '%Y-%m', 'day': '%Y-%m-%d'}
+
 
 def test_finder_with_known_events(finder: BaseFinder):
     """
@@ -50,13 +67,39 @@ def get_test_data(known_event: MagneticReconnection, additional_data_padding_hou
     :param additional_data_padding_hours: (hours_before, hours_after)
     :return: ImportedData around the magnetic reconnection
     """
+    start_datetime, duration_hours = get_test_data_window(known_event, additional_data_padding_hours)
+    test_data = get_probe_data(probe=known_event.probe, start_date=start_datetime.strftime('%d/%m/%Y'),
+                               start_hour=start_datetime.hour, duration=duration_hours)
+    return test_data
+
+
+def get_test_data_window(known_event: MagneticReconnection,
+                         additional_data_padding_hours: tuple = (1, 2)) -> Tuple[datetime, int]:
+    """
+    :param known_event: MagneticReconnection with a start_datetime
+    :param additional_data_padding_hours: (hours_before, hours_after)
+    :return: start (at the beginning of its hour) and duration in hours of the data around the magnetic reconnection
+    """
     start_datetime = known_event.start_datetime - timedelta(hours=additional_data_padding_hours[0])
-    start_date = start_datetime.strftime('%d/%m/%Y')
-    start_hour = int(start_datetime.strftime('%H'))
     duration_hours = known_event.duration.seconds // (60 * 60) + sum(additional_data_padding_hours)
-    test_data = HeliosData(start_date=start_date, start_hour=start_hour, probe=known_event.probe,
-                           duration=duration_hours)
-    return test_data
+    return start_datetime.replace(minute=0, second=0, microsecond=0), duration_hours
+
+
+def build_labelled_events_dataset(dataset: LabelledDataset = labelled_dataset, dtype: type = np.float64):
+    """
+    Builds the dataset of the data around all the labelled events (the events of the mcc calculations, of the
+    evolutionary optimisation and the known events), which is then used by get_probe_data instead of importing them
+    :param dataset: dataset to build
+    :param dtype: type of the stored columns
+    :return:
+    """
+    windows = get_labelled_event_windows(events_list) + get_labelled_event_windows(evolutionary_event_list)
+    for known_event in get_known_magnetic_reconnection_events():
+        start_datetime, duration_hours = get_test_data_window(known_event)
+        windows.append({'probe': known_event.probe, 'start_datetime': start_datetime, 'duration': duration_hours,
+                        'event': known_event.start_datetime, 'label': 1})
+    build_labelled_dataset(windows, dataset=dataset, dtype=dtype)
+    print('Built', dataset, 'with', len(dataset.get_index()['segments']), 'segments for', len(windows), 'windows')
 
 
 def test_finder_with_unknown_events(finder: BaseFinder, imported_data: ImportedData, parameters: list,
@@ -70,31 +113,195 @@ def test_finder_with_unknown_events(finder: BaseFinder, imported_data: ImportedD
     :param interval: interval over which the data is analysed to detect events
     :return: list of possible reconnection events and associated radius from the Sun
     """
-    duration = imported_data.duration
-    start = imported_data.start_datetime
-    probe = imported_data.probe
     reconnection_events = []
-    for n in range(np.int(duration / interval)):
-        try:
-            data = get_probe_data(probe=probe, start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour,
-                                  duration=interval)
-            reconnection = finder.find_magnetic_reconnections(data, *parameters)
-            if reconnection:
-                for event in reconnection:
-                    radius = data.data['r_sun'].loc[event]
-                    reconnection_events.append([event, radius])
-
-            if reconnection and plot_reconnection:
-                plot_imported_data(data, DEFAULT_PLOTTED_COLUMNS + [
-                    ('correlation_sum', 'correlation_sum_outliers'),
-                    ('correlation_diff', 'correlation_diff_outliers')])
-        except Exception:
-            print('Exception in test_finder_with_unknown_events')
-        start = start + timedelta(hours=interval)
+    for start in get_finder_windows(imported_data, interval=interval):
+        reconnection_events += find_events_in_window(finder, imported_data.probe, start, parameters,
+                                                     plot_reconnection=plot_reconnection, interval=interval)
+    return reconnection_events
 
+
+def get_finder_windows(imported_data: ImportedData, interval: int = 24) -> List[datetime]:
+    """
+    Splits the data in the windows on which the finder is run
+    :param imported_data: ImportedData
+    :param interval: duration of the windows in hours
+    :return: start of the windows
+    """
+    return [imported_data.start_datetime + timedelta(hours=interval * n) for n in
+            range(int(imported_data.duration / interval))]
+
+
+def find_events_in_window(finder: BaseFinder, probe: Union[int, str], start: datetime, parameters: list,
+                          plot_reconnection: bool = True, interval: int = 24,
+                          failed_windows: Optional[List[datetime]] = None,
+                          lmn_blocks: Optional[List[ImportedData]] = None) -> List[list]:
+    """
+    Returns the possible reconnection times in a window of the data, as well as the distance from the sun at this time
+    :param finder: method to find the reconnection events, right now CorrelationFinder
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start: start of the window
+    :param parameters: parameters that will be used in the finder
+    :param plot_reconnection: if True, every time a reconnection is detected, it is plotted
+    :param interval: duration of the window in hours
+    :param failed_windows: if given, the start of the window is added to it when the window could not be analysed
+    (for another reason than having no data), so that it can be analysed again later
+    :param lmn_blocks: if given, the data of the LMN tests around the events is added to it, cut out of the data of
+    the window when it covers it, so that the LMN tests do not need to load it again
+    :return: list of possible reconnection events and associated radius from the Sun
+    """
+    reconnection_events = []
+    try:
+        window_data = get_probe_data(probe=probe, start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour,
+                                     duration=interval, copy=False)
+        # the finder adds its columns to a copy, so that the data cut out for the LMN tests is left unchanged
+        data = get_data_window(window_data, window_data.start_datetime, interval)
+        reconnection = finder.find_magnetic_reconnections(data, *parameters)
+        if reconnection:
+            for event in reconnection:
+                radius = data.data['r_sun'].loc[event]
+                reconnection_events.append([event, radius])
+                lmn_start = (event - timedelta(hours=LMN_DURATION / 2)).replace(minute=0, second=0, microsecond=0)
+                if lmn_blocks is not None and find_data_block(probe, lmn_start, LMN_DURATION, lmn_blocks[-1:]) is None:
+                    lmn_blocks.append(get_event_data(probe, lmn_start, LMN_DURATION, [window_data]))
+
+        if reconnection and plot_reconnection:
+            plot_imported_data(data, DEFAULT_PLOTTED_COLUMNS + [
+                ('correlation_sum', 'correlation_sum_outliers'),
+                ('correlation_diff', 'correlation_diff_outliers')])
+    except RuntimeWarning:
+        pass  # no data in the window
+    except Exception:
+        print('Exception in test_finder_with_unknown_events')
+        if failed_windows is not None:
+            failed_windows.append(start)
     return reconnection_events
 
 
+def test_moving_average_parity(imported_data: ImportedData, minutes: int = 10) -> bool:
+    """
+    Checks that get_moving_average gives the same averages as taking the mean of the data around every point
+    :param imported_data: ImportedData
+    :param minutes: minutes to the right and to the left of each point that are averaged
+    :return: True if the moving averages of all the columns of the data agree
+    """
+    interval = timedelta(minutes=minutes)
+    agree = True
+    for column_name in imported_data.data.columns:
+        data_column = imported_data.data[column_name]
+        expected = [np.mean(data_column.loc[index - interval:index + interval]) for index in data_column.index]
+        if not np.allclose(get_moving_average(data_column, minutes=minutes).values, expected, equal_nan=True):
+            print('Moving average of ' + column_name + ' does not match the window means')
+            agree = False
+    return agree
+
+
+def get_possible_events_with_loops(data: pd.DataFrame, minutes: float) -> List[datetime]:
+    """
+    Selects the possible events from the outliers columns row by row, as CorrelationFinder.find_outliers used to
+    :param data: data with the correlation_sum_outliers and correlation_diff_outliers columns
+    :param minutes: minutes around each point where the correlation_sum_outliers are considered
+    :return: list of possible events
+    """
+    outlier_datetimes = []
+    for index in data.index:
+        interval = timedelta(minutes=minutes)
+        sum_outliers = data.loc[index - interval:index + interval, 'correlation_sum_outliers']
+        if (sum_outliers > 0).any() and (sum_outliers < 0).any():
+            outlier_datetimes.append(index.to_pydatetime())
+
+    n = 0
+    grouped_outliers = []
+    while n < len(outlier_datetimes) - 1:
+        group = [outlier_datetimes[n]]
+        n += 1
+        while (outlier_datetimes[n] - outlier_datetimes[n - 1]).total_seconds() < 130 and n < len(
+                outlier_datetimes) - 1:
+            group.append(outlier_datetimes[n])
+            n += 1
+        grouped_outliers.append(group)
+
+    datetimes_list = [data.loc[group, 'correlation_diff_outliers'].idxmax() for group in grouped_outliers]
+    return [_datetime for _datetime in datetimes_list if not pd.isnull(_datetime)]
+
+
+def benchmark_find_outliers(days: int = 365, cadence_seconds: float = 40, parameters: Optional[dict] = None,
+                            seed: int = 0):
+    """
+    Times CorrelationFinder.find_outliers on synthetic correlations against the previous row by row selection of the
+    possible events
+    :param days: number of days of synthetic data
+    :param cadence_seconds: time between two data points
+    :param parameters: sigma_sum, sigma_diff and minutes given to find_outliers
+    :param seed: seed of the random correlations
+    :return:
+    """
+    if parameters is None:
+        parameters = {'sigma_sum': 2.29, 'sigma_diff': 2.34, 'minutes': 5.95}
+    random_state = np.random.RandomState(seed)
+    number_of_points = int(days * 24 * 60 * 60 / cadence_seconds)
+    index = pd.date_range('01/01/1976', periods=number_of_points, freq='{}S'.format(cadence_seconds))
+    data = pd.DataFrame({'correlation_sum': random_state.standard_t(3, number_of_points)}, index=index)
+    data['correlation_diff'] = get_derivative(data['correlation_sum']).abs()
+
+    start = time.perf_counter()
+    datetimes_list = CorrelationFinder().find_outliers(data, **parameters)
+    vectorised_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    datetimes_list_with_loops = get_possible_events_with_loops(data, minutes=parameters['minutes'])
+    loops_time = time.perf_counter() - start
+
+    print('find_outliers on {} points: {:.2f}s, including the outliers columns'.format(number_of_points,
+                                                                                      vectorised_time))
+    print('row by row selection of the possible events: {:.2f}s'.format(loops_time))
+    print('same events: ', datetimes_list == datetimes_list_with_loops, len(datetimes_list))
+
+
+def get_l_correlations_with_loops(imported_data: ImportedData, event_date: datetime,
+                                  L: np.ndarray) -> Tuple[float, float]:
+    """
+    Finds the correlations of the changes in B_L and v_L row by row, as changes_in_b_and_v used to
+    :param imported_data: ImportedData
+    :param event_date: date and time of the reconnection event
+    :param L: L vector
+    :return: mean products of the derivatives of B_L and v_L on the left and on the right of the event
+    """
+    bL, vL = [], []
+    for n in range(len(imported_data.data)):
+        bL.append(np.dot(
+            np.array([imported_data.data['Bx'][n], imported_data.data['By'][n], imported_data.data['Bz'][n]]), L))
+        vL.append(np.dot(
+            np.array([imported_data.data['vp_x'][n], imported_data.data['vp_y'][n], imported_data.data['vp_z'][n]]), L))
+    bL_diff = get_derivative(pd.Series(np.array(bL), index=imported_data.data.index))
+    vL_diff = get_derivative(pd.Series(np.array(vL), index=imported_data.data.index))
+    left, right = slice(event_date - timedelta(minutes=15), event_date - timedelta(minutes=2)), slice(
+        event_date + timedelta(minutes=2), event_date + timedelta(minutes=15))
+    return (np.mean(bL_diff.loc[left].values * vL_diff.loc[left].values),
+            np.mean(bL_diff.loc[right].values * vL_diff.loc[right].values))
+
+
+def test_l_correlations_parity(event_dates: List[datetime], probe: Union[int, str], duration: int = 4) -> bool:
+    """
+    Checks that get_l_correlations agrees with the row by row correlations on the windows of recorded events
+    :param event_dates: dates of the recorded events, for example from get_dates_from_csv
+    :param probe: probe that detected the events
+    :param duration: hours of data around each event
+    :return: True if the correlations agree for all the events
+    """
+    agree = True
+    for event_date in event_dates:
+        start_time = event_date - timedelta(hours=duration / 2)
+        imported_data = get_probe_data(probe=probe, start_date=start_time.strftime('%d/%m/%Y'),
+                                       start_hour=start_time.hour, duration=duration)
+        imported_data.data.dropna(inplace=True)
+        L, _, _ = mva(get_b(imported_data, event_date))
+        expected = get_l_correlations_with_loops(imported_data, event_date, L)
+        if not np.allclose(get_l_correlations(imported_data, event_date, L), expected, equal_nan=True):
+            print('Correlations of B_L and v_L do not match on ' + str(event_date))
+            agree = False
+    return agree
+
+
 def send_reconnection_events_to_csv(reconnection_events_list: list, name: str = 'reconnection_events.csv'):
     """
     :param reconnection_events_list: list of reconnection events dates and radius
@@ -140,6 +347,22 @@ def reconnection_detector_with_finder(probe: Union[int, str], parameters: dict,
     :param radius: maximum radius to consider
     :return: all possible reconnection events within the given time frame, with associated radius
     """
+    windows = get_detection_windows(probe, start_time, end_time, radius)
+    all_reconnection_events = find_events_in_windows(probe, parameters, windows)
+    print(start_time, end_time, 'reconnection number: ', str(len(all_reconnection_events)))
+    print(all_reconnection_events)
+    return all_reconnection_events
+
+
+def get_detection_windows(probe: Union[int, str], start_time: str, end_time: str, radius: float) -> List[datetime]:
+    """
+    Finds the windows on which the finder is run, in the data where the probe is within the given radius
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start_time: start time of the analysis
+    :param end_time:  end time of the analysis
+    :param radius: maximum radius to consider
+    :return: start of the windows, in time order
+    """
     try:
         orbiter = get_orbiter(probe=probe, start_time=start_time, end_time=end_time, interval=1)
         imported_data_sets = get_imported_data_sets(probe=probe, orbiter=orbiter, radius=radius)
@@ -153,25 +376,216 @@ def reconnection_detector_with_finder(probe: Union[int, str], parameters: dict,
             start_time = start_time + timedelta(days=1)
         imported_data_sets = get_data(dates=times, probe=probe)
 
-    all_reconnection_events = []
-    for n in range(len(imported_data_sets)):
-        imported_data = imported_data_sets[n]
+    windows = []
+    for imported_data in imported_data_sets:
         print(imported_data)
         print('duration', imported_data.duration)
-        params = [parameters[key] for key in list(parameters.keys())]
-        reconnection_events = test_finder_with_unknown_events(CorrelationFinder(), imported_data,
-                                                              params, plot_reconnection=False)
-        if reconnection_events:
-            for event in reconnection_events:
-                all_reconnection_events.append(event)
-    print(start_time, end_time, 'reconnection number: ', str(len(all_reconnection_events)))
-    print(all_reconnection_events)
+        windows += get_finder_windows(imported_data)
+    return windows
+
+
+def get_detection_window_stream(probe: Union[int, str], start_time: str, end_time: str, radius: float,
+                                interval: int = 24) -> Iterator[datetime]:
+    """
+    Finds the windows on which the finder is run as get_detection_windows, but from the dates when the probe is within
+    the given radius instead of from their imported data, so that no data is imported before the first window is used
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start_time: start time of the analysis
+    :param end_time:  end time of the analysis
+    :param radius: maximum radius to consider
+    :param interval: duration of the windows in hours
+    :return: start of the windows, in time order
+    """
+    try:
+        orbiter = get_orbiter(probe=probe, start_time=start_time, end_time=end_time, interval=1)
+        dates = get_dates(orbiter.times, get_time_indices(find_radii(orbiter, radius=radius)))
+    except NotImplementedError:  # probe not implemented in spice :(
+        print('NO RADIUS ANALYSIS BECAUSE PROBE NOT EXISTING IN SPICE YET')
+        start_time = datetime.strptime(start_time, '%d/%m/%Y')
+        end_time = datetime.strptime(end_time, '%d/%m/%Y')
+        dates = [[start_time + timedelta(days=n), start_time + timedelta(days=n + 1)] for n in
+                 range((end_time - start_time).days)]
+    for start, end in dates:
+        # as with get_data, the data of a period starts at the beginning of its first day
+        period_start = datetime(start.year, start.month, start.day)
+        for n in range(int(int((end - start).total_seconds() / 3600) / interval)):
+            yield period_start + timedelta(hours=interval * n)
+
+
+def get_detection_chunks(probe: Union[int, str], start_time: str, end_time: str, radius: float,
+                         padding_hours: int = 2, interval: int = 24) -> Iterator[Tuple[datetime, ImportedData]]:
+    """
+    Imports the data of the windows of the finder one at a time, so that only one window is held in memory
+    The chunks of consecutive windows overlap, each window being padded on both sides so that the rolling windows of
+    the tests around the events close to its edges have all their data
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param start_time: start time of the analysis
+    :param end_time:  end time of the analysis
+    :param radius: maximum radius to consider
+    :param padding_hours: hours of data added on both sides of each window
+    :param interval: duration of the windows in hours
+    :return: start of each window and data of its chunk (read only), the windows without data are left out
+    """
+    for start in get_detection_window_stream(probe, start_time, end_time, radius, interval=interval):
+        chunk_start = start - timedelta(hours=padding_hours)
+        try:
+            chunk = get_probe_data(probe=probe, start_date=chunk_start.strftime('%d/%m/%Y'),
+                                   start_hour=chunk_start.hour, duration=interval + 2 * padding_hours, copy=False)
+        except RuntimeWarning:
+            print('No data between', start, 'and', start + timedelta(hours=interval))
+            continue
+        yield start, chunk
+
+
+def find_events_in_chunk(finder: BaseFinder, start: datetime, chunk: ImportedData, parameters: list,
+                         interval: int = 24) -> List[list]:
+    """
+    Returns the possible reconnection times in a window, as well as the distance from the sun at this time
+    The finder is run on the whole chunk, and only the events inside the window are kept so that the events of the
+    overlapping chunks are not found twice
+    :param finder: method to find the reconnection events, right now CorrelationFinder
+    :param start: start of the window
+    :param chunk: data of the window with its padding, which is left unchanged by the finder
+    :param parameters: parameters that will be used in the finder
+    :param interval: duration of the window in hours
+    :return: list of possible reconnection events and associated radius from the Sun
+    """
+    reconnection_events = []
+    try:
+        data = get_data_window(chunk, chunk.start_datetime, chunk.duration)
+        for event in finder.find_magnetic_reconnections(data, *parameters):
+            if start <= event < start + timedelta(hours=interval):
+                reconnection_events.append([event, data.data['r_sun'].loc[event]])
+    except RuntimeWarning:
+        pass  # no data in the window
+    return reconnection_events
+
+
+def stream_possible_reconnection_events(probe: Union[int, str], parameters: dict, start_time: str, end_time: str,
+                                        radius: float = 1, padding_hours: int = 2) -> Iterator[list]:
+    """
+    Finds the possible reconnection events one window at a time, yielding the events of each window as soon as it has
+    been analysed
+    With padding_hours=0, the events are the ones returned by get_possible_reconnection_events.
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param parameters: dictionary of parameters for the finder
+    :param start_time: time when the search starts
+    :param end_time: time when the search ends
+    :param radius: maximum radius to be considered
+    :param padding_hours: hours of data added on both sides of each window
+    :return: possible reconnection events and associated radius, in time order
+    """
+    params = [parameters[key] for key in list(parameters.keys())]
+    finder = CorrelationFinder()
+    for start, chunk in get_detection_chunks(probe, start_time, end_time, radius, padding_hours=padding_hours):
+        yield from find_events_in_chunk(finder, start, chunk, params)
+
+
+def find_events_in_windows(probe: Union[int, str], parameters: dict, windows: List[datetime],
+                           failed_windows: Optional[List[datetime]] = None,
+                           lmn_blocks: Optional[List[ImportedData]] = None) -> List[list]:
+    """
+    Runs the finder on each window in turn
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param parameters: dictionary of parameters for the finder
+    :param windows: start of the windows
+    :param failed_windows: if given, the start of the windows which could not be analysed are added to it
+    :param lmn_blocks: if given, the data of the LMN tests around the events is added to it
+    :return: all possible reconnection events in the windows, with associated radius
+    """
+    params = [parameters[key] for key in list(parameters.keys())]
+    all_reconnection_events = []
+    for start in windows:
+        all_reconnection_events += find_events_in_window(CorrelationFinder(), probe, start, params,
+                                                         plot_reconnection=False, failed_windows=failed_windows,
+                                                         lmn_blocks=lmn_blocks)
     return all_reconnection_events
 
 
+def find_shard_events(probe: Union[int, str], parameters: dict, windows: List[datetime],
+                      keep_lmn_data: bool = False) -> Tuple[List[list], List[datetime], List[ImportedData]]:
+    """
+    Runs the finder on the windows of a shard, in the current process or in a worker process
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param parameters: dictionary of parameters for the finder
+    :param windows: start of the windows of the shard
+    :param keep_lmn_data: if True, the data of the LMN tests around the events is returned with them
+    :return: possible reconnection events in the windows with associated radius, start of the windows which could
+    not be analysed, and data of the LMN tests around the events (empty if keep_lmn_data is False)
+    """
+    failed_windows, lmn_blocks = [], []
+    events = find_events_in_windows(probe, parameters, windows, failed_windows=failed_windows,
+                                    lmn_blocks=lmn_blocks if keep_lmn_data else None)
+    return events, failed_windows, lmn_blocks
+
+
+def find_events_in_shards(probe: Union[int, str], parameters: dict, windows: List[datetime], workers: int = 1,
+                          shard: str = 'year', run_directory: Optional[RunDirectory] = None,
+                          lmn_blocks: Optional[List[ImportedData]] = None,
+                          incomplete_shards: Optional[List[str]] = None) -> List[list]:
+    """
+    Runs the finder on the windows, with the windows of each year, month or day sent to one of the worker processes
+    Shards are made of whole windows of the finder, and each window only looks at its own data (as in the serial run),
+    so events at the boundaries of the shards are neither lost nor found twice
+    :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
+    :param parameters: dictionary of parameters for the finder
+    :param windows: start of the windows, in time order
+    :param workers: number of processes to use, 1 to run everything in the current process
+    :param shard: 'year', 'month' or 'day', the windows which are sent together to a process
+    :param run_directory: if given, the events of each shard are saved there as soon as the shard is done, and the
+    shards already saved are not run again. Shards with windows which could not be analysed (for example because the
+    data could not be downloaded) are not saved, so that they are run again by the next run
+    :param lmn_blocks: if given, the data of the LMN tests around the events of the shards which are run is added to
+    it (the shards taken from the run directory have none)
+    :param incomplete_shards: if given, the names of the shards with windows which could not be analysed are added to
+    it, so that the results made from their events are not saved either
+    :return: all possible reconnection events in the windows in time order, with associated radius
+    """
+    if shard not in SHARD_FORMATS:
+        raise ValueError('Shards can only be made by {}'.format(', '.join(SHARD_FORMATS)))
+    shards = [(key, list(shard_windows)) for key, shard_windows in
+              itertools.groupby(windows, key=lambda window: 'shard_' + window.strftime(SHARD_FORMATS[shard]))]
+
+    results = {}
+    if run_directory is not None:
+        for key, _ in shards:
+            events = run_directory.load(key)
+            if events is not None:
+                results[key] = events
+    missing_shards = [(key, shard_windows) for key, shard_windows in shards if key not in results]
+
+    def save_shard(_key: str, shard_result: Tuple[List[list], List[datetime], List[ImportedData]]):
+        events, failed_windows, shard_lmn_blocks = shard_result
+        results[_key] = events
+        if lmn_blocks is not None:
+            lmn_blocks.extend(shard_lmn_blocks)
+        if failed_windows:
+            print('Windows of', _key, 'which could not be analysed:', failed_windows)
+            if incomplete_shards is not None:
+                incomplete_shards.append(_key)
+            if run_directory is not None:
+                run_directory.mark_incomplete(_key)
+        elif run_directory is not None:
+            run_directory.save(_key, events)
+
+    if workers == 1:
+        for key, shard_windows in missing_shards:
+            save_shard(key, find_shard_events(probe, parameters, shard_windows, lmn_blocks is not None))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(find_shard_events, probe, parameters, shard_windows,
+                                       lmn_blocks is not None): key for key, shard_windows in missing_shards}
+            for future in as_completed(futures):
+                save_shard(futures[future], future.result())
+    return [event for key, _ in shards for event in results[key]]
+
+
 def get_possible_reconnection_events(probe: Union[int, str], parameters: dict, start_time: str = '17/12/1974',
                                      end_time: str = '21/12/1975', radius: float = 1, to_csv: bool = False,
-                                     data_split: Optional[str] = None) -> List[list]:
+                                     data_split: Optional[str] = None, workers: int = 1, shard: str = 'year',
+                                     run_directory: Optional[RunDirectory] = None,
+                                     lmn_blocks: Optional[List[ImportedData]] = None,
+                                     incomplete_shards: Optional[List[str]] = None) -> List[list]:
     """
     :param probe: 1 or 2 for Helios 1 or 2, imp_8, ulysses, wind or ace
     :param parameters: dictionary of parameters for the finder
@@ -180,13 +594,20 @@ def get_possible_reconnection_events(probe: Union[int, str], parameters: dict, s
     :param radius: maximum radius to be considered
     :param to_csv: true if we want the data to be sent to csv, false otherwise
     :param data_split: None if we want to download in bulk, 'yearly' otherwise (recommended option for Helios 1 for now)
+    :param workers: number of processes running the finder, the events are the same as with a single process
+    :param shard: 'year', 'month' or 'day', the windows of the finder which are sent together to a process
+    :param run_directory: if given, the windows and the events of each shard are saved there, and the ones already
+    saved are not computed again
+    :param lmn_blocks: if given, the data of the LMN tests around the events is added to it, so that the LMN tests do
+    not need to load it again
+    :param incomplete_shards: if given, the names of the shards with windows which could not be analysed are added to
+    it
     :return: list of all possible reconnection events and associated radius
     """
     supported_options = [None, 'yearly']
-    all_reconnection_events = []
+    splits = []
     if data_split is None:
-        all_reconnection_events = reconnection_detector_with_finder(probe, parameters, start_time, end_time,
-                                                                    radius=radius)
+        splits = [(start_time, end_time)]
     elif data_split == 'yearly':
         start_year = datetime.strptime(start_time, '%d/%m/%Y').year
         end_year = datetime.strptime(end_time, '%d/%m/%Y').year
@@ -194,14 +615,27 @@ def get_possible_reconnection_events(probe: Union[int, str], parameters: dict, s
         _start_time = datetime.strptime(start_time, '%d/%m/%Y')
         for n in range(number_of_years):
             _end_time = datetime(start_year + 1, 1, 1, 0, 0)
-            reconnection_events = reconnection_detector_with_finder(probe, parameters, _start_time.strftime('%d/%m/%Y'),
-                                                                    _end_time.strftime('%d/%m/%Y'), radius=radius)
-            for reconnection in reconnection_events:
-                all_reconnection_events.append(reconnection)
+            splits.append((_start_time.strftime('%d/%m/%Y'), _end_time.strftime('%d/%m/%Y')))
             start_year += 1
             _start_time = _end_time
     else:
         print('SORRY, THIS OPTION HAS NOT BEEN IMPLEMENTED. THE IMPLEMENTED OPTIONS ARE', supported_options)
+
+    windows = []
+    for split_start, split_end in splits:
+        # the windows are found from the orbit of the probe and not from its imported data, so that the periods which
+        # could not be downloaded are still in the saved windows, and are analysed again by the next run
+        def get_split_windows() -> List[datetime]:
+            return list(get_detection_window_stream(probe, split_start, split_end, radius=radius))
+
+        if run_directory is None:
+            windows += get_split_windows()
+        else:
+            name = 'windows_' + datetime.strptime(split_start, '%d/%m/%Y').strftime('%Y-%m-%d')
+            windows += run_directory.get_result(name, get_split_windows)
+    all_reconnection_events = find_events_in_shards(probe, parameters, windows, workers=workers, shard=shard,
+                                                    run_directory=run_directory, lmn_blocks=lmn_blocks,
+                                                    incomplete_shards=incomplete_shards)
     print(start_time, end_time, 'reconnection number: ', str(len(all_reconnection_events)))
     print(all_reconnection_events)
     if to_csv:
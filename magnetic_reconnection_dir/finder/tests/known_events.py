@@ -1,12 +1,13 @@
 from datetime import datetime, timedelta
 import json
+import os
 from typing import List
 
 from magnetic_reconnection_dir.magnetic_reconnection import MagneticReconnection
 
 
 def get_known_magnetic_reconnection_events() -> List[MagneticReconnection]:
-    with open('known_events.json', 'r') as f:
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'known_events.json'), 'r') as f:
         loaded_json = json.load(f)
 
     def parse_json_dict_to_magnetic_reconnection(json_dict):
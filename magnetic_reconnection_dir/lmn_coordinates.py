@@ -6,12 +6,12 @@ import pandas as pd
 from typing import List, Tuple, Union, Optional
 import logging
 
-from data_handler.data_importer.data_import import get_probe_data
+from data_handler.data_importer.data_import import FetchCounter, get_event_data, get_probe_data
 from data_handler.data_importer.imported_data import ImportedData
 from data_handler.imported_data_plotter import plot_imported_data, DEFAULT_PLOTTED_COLUMNS
-from data_handler.utils.column_processing import get_derivative
 from magnetic_reconnection_dir.csv_utils import get_dates_from_csv, send_dates_to_csv
-from magnetic_reconnection_dir.mva_analysis import get_b, mva, hybrid, get_side_data, hybrid_mva
+from magnetic_reconnection_dir.mva_analysis import get_b, mva, mva_batch, hybrid, get_side_data, hybrid_mva, \
+    stack_b_windows
 import data_handler.utils.plotting_utils
 
 logger = logging.getLogger(__name__)
@@ -19,6 +19,7 @@ logger = logging.getLogger(__name__)
 mu_0 = 4e-7 * np.pi
 k = 1.38e-23
 proton_mass = 1.67e-27
+LMN_DURATION = 4  # hours of data around each event used by the LMN tests
 
 
 def change_b_and_v(b1: np.ndarray, b2: np.ndarray, v1: np.ndarray, v2: np.ndarray, L: np.ndarray, M: np.ndarray,
@@ -193,29 +194,9 @@ def changes_in_b_and_v(b1: np.ndarray, b2: np.ndarray, v1: np.ndarray, v2: np.nd
         logger.debug('v wrong')
 
     # changes in bl and vl are correlated on one side and anti-correlated on the other side
-    bL, vL = [], []
-    for n in range(len(imported_data.data)):
-        bL.append(np.dot(
-            np.array([imported_data.data['Bx'][n], imported_data.data['By'][n], imported_data.data['Bz'][n]]), L))
-        vL.append(np.dot(
-            np.array([imported_data.data['vp_x'][n], imported_data.data['vp_y'][n], imported_data.data['vp_z'][n]]), L))
-    bL = pd.Series(np.array(bL), index=imported_data.data.index)
-    vL = pd.Series(np.array(vL), index=imported_data.data.index)
-    bL_diff = get_derivative(bL)
-    vL_diff = get_derivative(vL)
-
-    left_correlation = bL_diff.loc[
-                       event_date - timedelta(minutes=15): event_date - timedelta(minutes=2)].values * vL_diff.loc[
-                                                                            event_date - timedelta(
-                                                                                minutes=15): event_date - timedelta(
-                                                                                minutes=2)].values
-    right_correlation = bL_diff.loc[
-                        event_date + timedelta(minutes=2):event_date + timedelta(minutes=15)].values * vL_diff.loc[
-                                                                            event_date + timedelta(
-                                                                                minutes=2):event_date + timedelta(
-                                                                                minutes=15)].values
-
-    if np.sign(np.mean(left_correlation)) != np.sign(np.mean(right_correlation)):
+    left_correlation, right_correlation = get_l_correlations(imported_data, event_date, L)
+
+    if np.sign(left_correlation) != np.sign(right_correlation):
         reconnection_points = reconnection_points + 1
     else:
         logger.debug('correlation error')
@@ -225,6 +206,32 @@ def changes_in_b_and_v(b1: np.ndarray, b2: np.ndarray, v1: np.ndarray, v2: np.nd
         return False
 
 
+def get_l_correlations(imported_data: ImportedData, event_date: datetime, L: np.ndarray,
+                       outside_interval: int = 15, inside_interval: int = 2) -> Tuple[float, float]:
+    """
+    Finds how the changes in B_L and v_L are correlated on each side of the event
+    :param imported_data: ImportedData
+    :param event_date: date and time of the reconnection event
+    :param L: L vector
+    :param outside_interval: outside limit of the sides, in minutes from the event
+    :param inside_interval: inside limit of the sides, in minutes from the event
+    :return: mean products of the derivatives of B_L and v_L on the left and on the right of the event
+    """
+    times = imported_data.data.index.values
+    b_l = imported_data.data[['Bx', 'By', 'Bz']].values.astype(np.float64) @ L
+    v_l = imported_data.data[['vp_x', 'vp_y', 'vp_z']].values.astype(np.float64) @ L
+    seconds = np.diff(times.astype(np.int64)) / 1e9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # like get_derivative, the derivative of the first point is nan
+        correlation = np.concatenate([[np.nan], np.diff(b_l) / seconds * (np.diff(v_l) / seconds)])
+
+    event_date = np.datetime64(event_date, 'ns')
+    outside, inside = np.timedelta64(outside_interval, 'm'), np.timedelta64(inside_interval, 'm')
+    left_start, right_start = np.searchsorted(times, [event_date - outside, event_date + inside], side='left')
+    left_end, right_end = np.searchsorted(times, [event_date - inside, event_date + outside], side='right')
+    return np.mean(correlation[left_start:left_end]), np.mean(correlation[right_start:right_end])
+
+
 def plot_lmn(imported_data: ImportedData, L: np.ndarray, M: np.ndarray, N: np.ndarray, event_date: datetime, probe: int,
              boundaries: Optional[List[datetime]] = None, save: bool = False):
     """
@@ -274,7 +281,9 @@ def plot_lmn(imported_data: ImportedData, L: np.ndarray, M: np.ndarray, N: np.nd
 
 
 def test_reconnection_lmn(event_dates: List[datetime], probe: Union[int, str], minimum_fraction: float,
-                          maximum_fraction: float, plot: bool = False, mode: str = 'static') -> List[datetime]:
+                          maximum_fraction: float, plot: bool = False, mode: str = 'static',
+                          data_blocks: Optional[List[ImportedData]] = None,
+                          fetch_counter: Optional[FetchCounter] = None) -> List[datetime]:
     """
     Checks a list of type datetime to determine whether they are reconnection events
     :param event_dates: list of possible reconnection dates
@@ -283,37 +292,51 @@ def test_reconnection_lmn(event_dates: List[datetime], probe: Union[int, str], m
     :param maximum_fraction: maximum walen fraction
     :param plot: bool, true of we want to plot reconnection events that passed the test
     :param mode: interactive (human input to the code, more precise but time consuming) or static (purely computational)
+    :param data_blocks: data of the probe which was already loaded (for example by the correlation finder), the data
+    around the events is cut out of it instead of being fetched again when it covers the events
+    :param fetch_counter: counter of the fetched and avoided windows of data around the events
     :return: all events that managed to pass the lmn tests
     """
     implemented_modes = ['static', 'interactive']
     if mode not in implemented_modes:
         raise NotImplementedError('This mode is not implemented.')
-    duration = 4
+    duration = LMN_DURATION
     events_that_passed_test = []
     known_events = []  # get_dates_from_csv('helios2_magrec2.csv')
     rogue_events = []  # if mode == 'interactive'
+    if probe == 1 or probe == 2 or probe == 'imp_8' or probe == 'ace' or probe == 'wind':
+        mva_interval, outside_interval, inside_interval, min_len = 30, 10, 2, 70
+    elif probe == 'ulysses':
+        mva_interval, outside_interval, inside_interval, min_len = 60, 30, 10, 5
+    else:
+        raise NotImplementedError(
+            'The probes that have been implemented so far are Helios 1, Helios 2, Imp 8, Ace, Wind and Ulysses')
+
+    candidates = []
     for event_date in event_dates:
         try:
-            start_time = event_date - timedelta(hours=duration / 2)
-            imported_data = get_probe_data(probe=probe, start_date=start_time.strftime('%d/%m/%Y'),
-                                           start_hour=start_time.hour, duration=duration)
+            imported_data = get_event_data(probe, event_date - timedelta(hours=duration / 2), duration, data_blocks,
+                                           fetch_counter)
             imported_data.data.dropna(inplace=True)
-            if probe == 1 or probe == 2 or probe == 'imp_8' or probe == 'ace' or probe == 'wind':
-                b = get_b(imported_data, event_date, 30)
-                L, M, N = mva(b)
-                b1, b2, v1, v2, density_1, density_2, t_par_1, t_perp_1, t_par_2, t_perp_2 = get_side_data(
-                    imported_data, event_date, 10, 2)
-                min_len = 70
-            elif probe == 'ulysses':
-                b = get_b(imported_data, event_date, 60)
-                L, M, N = mva(b)
-                b1, b2, v1, v2, density_1, density_2, t_par_1, t_perp_1, t_par_2, t_perp_2 = get_side_data(
-                    imported_data, event_date, 30, 10)
-                min_len = 5
-            else:
-                raise NotImplementedError(
-                    'The probes that have been implemented so far are Helios 1, Helios 2, Imp 8, Ace, Wind and Ulysses')
-            L, M, N = hybrid(L, b1, b2)
+            b = get_b(imported_data, event_date, mva_interval)
+            side_data = get_side_data(imported_data, event_date, outside_interval, inside_interval)
+            candidates.append((event_date, imported_data, b, side_data))
+        except ValueError:
+            logger.debug('could not take care of mva analysis')
+
+    # the mva of all the candidates is done at once
+    all_b1 = np.array([side_data[0] for _, _, _, side_data in candidates]).reshape(-1, 3)
+    all_b2 = np.array([side_data[1] for _, _, _, side_data in candidates]).reshape(-1, 3)
+    all_L, _, _ = mva_batch(stack_b_windows([b for _, _, b, _ in candidates]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        all_L, all_M, all_N = hybrid(all_L, all_b1, all_b2)
+
+    for (event_date, imported_data, _, side_data), L, M, N in zip(candidates, all_L, all_M, all_N):
+        b1, b2, v1, v2, density_1, density_2, t_par_1, t_perp_1, t_par_2, t_perp_2 = side_data
+        if not np.all(np.isfinite([L, M, N])):
+            logger.debug('could not take care of mva analysis')
+            continue
+        try:
             logger.debug('LMN:', L, M, N, np.dot(L, M), np.dot(L, N), np.dot(M, N), np.dot(np.cross(L, M), N))
 
             b1_changed, b2_changed, v1_changed, v2_changed = change_b_and_v(b1, b2, v1, v2, L, M, N)
@@ -1,14 +1,22 @@
-from typing import Union
+from datetime import datetime
+from typing import Any, Callable, Iterator, List, Optional, Union
 import os
 
-from magnetic_reconnection_dir.csv_utils import send_dates_to_csv
-from magnetic_reconnection_dir.finder.tests.finder_test import get_possible_reconnection_events
-from magnetic_reconnection_dir.lmn_coordinates import test_reconnection_lmn
+from data_handler.data_importer.data_import import FetchCounter, get_event_data_blocks
+from magnetic_reconnection_dir.csv_utils import get_event_radii, send_dates_to_csv
+from magnetic_reconnection_dir.event_catalog import EventCatalog
+from magnetic_reconnection_dir.finder.correlation_finder import CorrelationFinder
+from magnetic_reconnection_dir.finder.tests.finder_test import find_events_in_chunk, get_detection_chunks, \
+    get_possible_reconnection_events
+from magnetic_reconnection_dir.lmn_coordinates import LMN_DURATION, test_reconnection_lmn
+from magnetic_reconnection_dir.run_directory import RunDirectory
 
 
 def df_magnetic_reconnection_events(probe: Union[int, str], parameters: dict, min_walen: float, max_walen: float,
                                     start_date: str, end_date: str, radius_to_consider: float,
-                                    noise_when_part1_done: bool, noise_when_part2_done: bool):
+                                    noise_when_part1_done: bool, noise_when_part2_done: bool, workers: int = 1,
+                                    shard: str = 'year', run_directory: Optional[str] = None,
+                                    catalog: Optional[EventCatalog] = None):
     """
     Stands for detect and find magnetic reconnection events
     Sends all possible events for a given probe between given times to a csv file
@@ -23,33 +31,129 @@ def df_magnetic_reconnection_events(probe: Union[int, str], parameters: dict, mi
     :param radius_to_consider: maximum radius from the Sun of the events to consider
     :param noise_when_part1_done: if True, will warn the user when the first part of the program is finished
     :param noise_when_part2_done: if True, warns the user when the program has finished running
+    :param workers: number of processes running the correlation part, which finds the same events as a single process
+    :param shard: 'year', 'month' or 'day', the data which is sent together to one of the processes
+    :param run_directory: if given, the results of each shard and stage are saved in a directory of the run in there, so
+    that running again with the same parameters only computes what is missing
+    :param catalog: if given, the events found by the correlation and LMN parts are also added to the catalog
     :return:
     """
 
+    run = None
+    if run_directory is not None:
+        run = RunDirectory(run_directory, probe=probe, parameters=parameters, min_walen=min_walen,
+                           max_walen=max_walen, start_date=start_date, end_date=end_date,
+                           radius_to_consider=radius_to_consider, shard=shard)
+
     # During the part 1, changes in correlation are detected
-    possible_reconnection_events = get_possible_reconnection_events(probe=probe, parameters=parameters,
-                                                                    start_time=start_date, end_time=end_date,
-                                                                    radius=radius_to_consider, data_split='yearly')
-    possible_reconnection_dates = [possible_reconnection[0] for possible_reconnection in possible_reconnection_events]
+    # the data around the events is kept for the LMN tests, so that the part 2 does not load it again
+    lmn_blocks = []
+    # the results made from shards with windows which could not be analysed are not saved, so that the next run
+    # analyses them again
+    incomplete_shards = []
+
+    def is_complete() -> bool:
+        return not incomplete_shards
+
+    def get_possible_reconnection_dates() -> List[datetime]:
+        possible_reconnection_events = get_possible_reconnection_events(probe=probe, parameters=parameters,
+                                                                        start_time=start_date, end_time=end_date,
+                                                                        radius=radius_to_consider, data_split='yearly',
+                                                                        workers=workers, shard=shard,
+                                                                        run_directory=run, lmn_blocks=lmn_blocks,
+                                                                        incomplete_shards=incomplete_shards)
+        return [possible_reconnection[0] for possible_reconnection in possible_reconnection_events]
+
+    possible_reconnection_dates = get_stage_result(run, 'correlation_events', get_possible_reconnection_dates,
+                                                   is_complete)
 
     # The user is warned when part 1 is done
     if noise_when_part1_done:
         beep()
 
     # The events are then run though a series of tests in LMN coordinates
-    lmn_events = test_reconnection_lmn(event_dates=possible_reconnection_dates, probe=probe, minimum_fraction=min_walen,
-                                       maximum_fraction=max_walen)
+    # the data kept by the part 1 is used, and the data of each day with events which it does not cover (the events
+    # of the shards taken from the run directory) is loaded once and shared by all the events of the day
+    def get_lmn_events() -> List[datetime]:
+        fetch_counter = FetchCounter()
+        data_blocks = get_event_data_blocks(probe, possible_reconnection_dates, LMN_DURATION, fetch_counter,
+                                            data_blocks=lmn_blocks)
+        events = test_reconnection_lmn(event_dates=possible_reconnection_dates, probe=probe, minimum_fraction=min_walen,
+                                       maximum_fraction=max_walen, data_blocks=data_blocks,
+                                       fetch_counter=fetch_counter)
+        print(fetch_counter)
+        return events
+
+    lmn_events = get_stage_result(run, 'lmn_events', get_lmn_events, is_complete)
     print(lmn_events)
 
+    # the radii are found once for the csv file and the catalog
+    lmn_radii = get_stage_result(run, 'lmn_radii', lambda: get_event_radii(lmn_events, probe).tolist(),
+                                 is_complete)
+
     # the possible dates are sent to a csv file
     file_name = 'probe' + str(probe) + '_reconnection_events' + '.csv'
-    send_dates_to_csv(filename=file_name, events_list=lmn_events, probe=probe, add_radius=True)
+
+    def send_to_csv() -> str:
+        send_dates_to_csv(filename=file_name, events_list=lmn_events, probe=probe, add_radius=True, radii=lmn_radii)
+        return file_name
+
+    get_stage_result(run, 'csv', send_to_csv, is_complete)
+    if catalog is not None:
+        catalog.add_events(possible_reconnection_dates, probe, stage='correlation', parameters=parameters)
+        # the LMN events also depend on the limits of the Walen test
+        catalog.add_events(lmn_events, probe, stage='lmn',
+                           parameters=dict(parameters, min_walen=min_walen, max_walen=max_walen), radii=lmn_radii)
+    if run is not None:
+        print(run.summary())
 
     if noise_when_part2_done:
         for loop in range(5):
             beep()
 
 
+def stream_magnetic_reconnection_events(probe: Union[int, str], parameters: dict, min_walen: float, max_walen: float,
+                                        start_date: str, end_date: str, radius_to_consider: float,
+                                        padding_hours: int = 2) -> Iterator[datetime]:
+    """
+    Runs the correlation and LMN parts of the detection one window of the data at a time, yielding the events as soon
+    as they pass the LMN tests, so that only the data of one window is held in memory
+    :param probe: 1, 2 or ulysses for now
+    :param parameters: parameters to be used for the correlation tests
+    :param min_walen: minimum fraction of the Alfven speed that the event must have at the exhaust
+    :param max_walen: maximum fraction of the Alfven speed that the event must have at the exhaust
+    :param start_date: start date of the analysis, must be a string
+    :param end_date: end date of the analysis, must be a string
+    :param radius_to_consider: maximum radius from the Sun of the events to consider
+    :param padding_hours: hours of data added on both sides of each window, the default covers the LMN data of all the
+    events of the window
+    :return: events which passed the LMN tests, in time order
+    """
+    params = [parameters[key] for key in list(parameters.keys())]
+    finder = CorrelationFinder()
+    for start, chunk in get_detection_chunks(probe, start_date, end_date, radius_to_consider,
+                                             padding_hours=padding_hours):
+        possible_reconnection_dates = [event for event, _ in find_events_in_chunk(finder, start, chunk, params)]
+        if possible_reconnection_dates:
+            yield from test_reconnection_lmn(event_dates=possible_reconnection_dates, probe=probe,
+                                             minimum_fraction=min_walen, maximum_fraction=max_walen,
+                                             data_blocks=[chunk])
+
+
+def get_stage_result(run: Optional[RunDirectory], name: str, compute: Callable[[], Any],
+                     is_complete: Optional[Callable[[], bool]] = None) -> Any:
+    """
+    :param run: directory of the run, None if the results are not saved
+    :param name: name of the stage
+    :param compute: function running the stage
+    :param is_complete: if given, the result of the stage is only saved when it returns True after the stage is run
+    :return: result of the stage, taken from the run directory if the stage was already done
+    """
+    if run is None:
+        return compute()
+    return run.get_result(name, compute, is_complete)
+
+
 def beep():
     return os.system("echo '\a'")
 
@@ -64,7 +168,10 @@ if __name__ == '__main__':
     probe_radius_to_consider = 1
     noise1 = True
     noise2 = True
+    number_of_workers = 1
+    runs_directory = 'detection_runs'
     df_magnetic_reconnection_events(probe=space_probe, parameters=probe_parameters, min_walen=probe_min_walen,
                                     max_walen=probe_max_walen, start_date=probe_start_date, end_date=probe_end_date,
                                     radius_to_consider=probe_radius_to_consider, noise_when_part1_done=noise1,
-                                    noise_when_part2_done=noise2)
+                                    noise_when_part2_done=noise2, workers=number_of_workers,
+                                    run_directory=runs_directory)
@@ -1,5 +1,5 @@
 from datetime import timedelta, datetime
-from typing import List, Tuple
+from typing import List, Tuple, Union
 import numpy as np
 from numpy import linalg as la
 
@@ -7,20 +7,29 @@ from data_handler.data_importer.data_import import get_probe_data
 from data_handler.data_importer.imported_data import ImportedData
 
 
-def get_b(imported_data: ImportedData, event_date, interval: int = 30) -> List[np.ndarray]:
+def get_b(imported_data: ImportedData, event_date, interval: int = 30) -> np.ndarray:
     """
     Returns the imported data in a suitable vector form to be analysed
     :param imported_data: ImportedData
     :param event_date: time of the possible reconnection event
     :param interval: interval over which we get the magnetic field
-    :return: array [bx, by, bz]
+    :return: array of shape (n, 3), with rows [bx, by, bz]
     """
-    b = []
     data = imported_data.data[event_date - timedelta(minutes=interval):event_date + timedelta(minutes=interval)]
-    b_x, b_y, b_z = data['Bx'].values, data['By'].values, data['Bz'].values
-    for n in range(len(b_x)):
-        b.append(np.array([b_x[n], b_y[n], b_z[n]]))
-    return b
+    return data[['Bx', 'By', 'Bz']].values.astype(np.float64)
+
+
+def stack_b_windows(b_windows: List[np.ndarray]) -> np.ndarray:
+    """
+    Stacks windows of the magnetic field of different lengths, so that they can be analysed together
+    :param b_windows: arrays of shape (n, 3) returned by get_b
+    :return: array of shape (number of windows, longest window, 3), where the shorter windows are padded with nan
+    """
+    length = max([len(b) for b in b_windows], default=0)
+    stacked = np.full((len(b_windows), length, 3), np.nan)
+    for window, b in enumerate(b_windows):
+        stacked[window, :len(b)] = b
+    return stacked
 
 
 def get_side_data(imported_data: ImportedData, event_date: datetime, outside_interval: int = 10,
@@ -59,46 +68,57 @@ def get_side_data(imported_data: ImportedData, event_date: datetime, outside_int
     return b1, b2, v1, v2, density_1, density_2, t_par_1, t_perp_1, t_par_2, t_perp_2
 
 
-def mva(b: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+def mva_batch(b: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Finds the LMN components of the new coordinates systems of many windows at once, by solving the magnetic matrix
+    eigenvalue problems of all the windows together
+    :param b: field of the windows, of shape (number of windows, points, 3), where the rows containing nan are ignored
+    :return: the L, M, and N vectors, each of shape (number of windows, 3), nan for windows with less than two points
+    """
+    b = np.asarray(b, dtype=np.float64)
+    is_valid = np.all(np.isfinite(b), axis=2)
+    b = np.where(is_valid[:, :, np.newaxis], b, 0)
+    number_of_points = is_valid.sum(axis=1)
+    has_enough_points = number_of_points > 1
+    weights = 1 / np.maximum(number_of_points, 1)
+
+    b_mean = b.sum(axis=1) * weights[:, np.newaxis]
+    magnetic_matrix = np.einsum('wpi,wpj->wij', b, b) * weights[:, np.newaxis, np.newaxis] - np.einsum(
+        'wi,wj->wij', b_mean, b_mean)
+    magnetic_matrix[~has_enough_points] = np.eye(3)
+
+    # the matrices are symmetric, so the eigenvalues are real and sorted in ascending order
+    _, v = la.eigh(magnetic_matrix)
+    v[~has_enough_points] = np.nan
+    L = v[:, :, 2]  # maximum eigenvalue gives L
+    M = v[:, :, 1]
+    N = v[:, :, 0]  # minimum eigenvalue gives N
+    return L, M, N
+
+
+def mva(b: Union[List[np.ndarray], np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Finds the LMN component of the new coordinates system, by solving the magnetic matrix eigenvalue problem
     :param b: field around interval that will be considered
     :return: the L, M, and N vectors
     """
-    magnetic_matrix = np.matrix([[0, 0, 0], [0, 0, 0], [0, 0, 0]])
-    for n in range(3):
-        bn = np.array([b[n] for b in b])
-        for m in range(3):
-            bm = np.array([b[m] for b in b])
-
-            magnetic_matrix[n, m] = np.mean(bn * bm) - np.mean(bn) * np.mean(bm)
-
-    w, v = la.eig(magnetic_matrix)
-    w_max = np.argmax(w)  # maximum value gives L
-    w_min = np.argmin(w)  # minimum eigenvalue gives N
-    w_intermediate = np.min(np.delete([0, 1, 2], [w_min, w_max]))
-
-    L, N, M = np.zeros(3), np.zeros(3), np.zeros(3)
-    for coordinate in range(len(v[:, w_max])):
-        L[coordinate] = v[:, w_max][coordinate]
-        N[coordinate] = v[:, w_min][coordinate]
-        M[coordinate] = v[:, w_intermediate][coordinate]
-
-    return L, M, N
+    L, M, N = mva_batch(np.asarray(b, dtype=np.float64).reshape(1, -1, 3))
+    return L[0], M[0], N[0]
 
 
 def hybrid(_l: np.ndarray, b1: np.ndarray, b2: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
     """
     Finds the other components of the new coordinates system, useful if eigenvalues not well resolved
+    Works on single vectors as well as on arrays of shape (number of events, 3) of vectors
     :param _l: L vector found with mva
     :param b1: mean magnetic field vector from inflow region 1
     :param b2: mean magnetic field vector from inflow region 2
     :return: L, M, N vectors
     """
     cross_of_b = np.cross(b1, b2)
-    N = cross_of_b / np.sqrt(cross_of_b[0] ** 2 + cross_of_b[1] ** 2 + cross_of_b[2] ** 2)  # normalised vector
+    N = cross_of_b / la.norm(cross_of_b, axis=-1, keepdims=True)  # normalised vector
     cross_n_l = np.cross(N, _l)
-    M = cross_n_l / np.sqrt(cross_n_l[0] ** 2 + cross_n_l[1] ** 2 + cross_n_l[2] ** 2)
+    M = cross_n_l / la.norm(cross_n_l, axis=-1, keepdims=True)
     L = np.cross(M, N)
     return L, M, N
 
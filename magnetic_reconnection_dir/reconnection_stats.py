@@ -1,15 +1,14 @@
-import os
 import pprint
 import numpy as np
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import matplotlib.pyplot as plt
 from scipy.stats import chi2
 # import data_handler.utils.plotting_utils  # plotting_utils are useful for large legends
 
-from data_handler.data_importer.helios_data import HeliosData
-from data_handler.orbit_with_spice import kernel_loader, orbit_times_generator, orbit_generator, get_orbiter
-from magnetic_reconnection_dir.csv_utils import create_events_list_from_csv_files
+from data_handler.data_importer.coverage_index import CoverageIndex, coverage_index
+from data_handler.orbit_with_spice import orbit_times_generator, get_orbiter
+from magnetic_reconnection_dir.csv_utils import create_events_list_from_csv_files, get_event_radii
 
 months = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september', 'october',
           'november', 'december']
@@ -17,12 +16,6 @@ radii_divisions = [0, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9]
 radii_names = ['less than 0.3 au', '0.3 to 0.4 au', '0.4 to 0.5 au', '0.5 to 0.6 au', '0.6 to 0.7 au', '0.7 to 0.8 au',
                '0.8 to 0.9 au', 'above 0.9 au']
 
-global helios_dir
-helios_dir = r"C:\Users\Hanae\heliopy\data\helios\E1_experiment\New_proton_corefit_data_2017\ascii\helios"
-potential_files = [files for r, d, files in os.walk(helios_dir + str(1) + '\\' + str(1974))]
-if not potential_files:
-    raise ValueError('Please enter the location of the helios files on your computer')
-
 
 def distances_stats(events_list: List[datetime], probe: int, only_stats: bool = True) -> dict:
     """
@@ -34,21 +27,10 @@ def distances_stats(events_list: List[datetime], probe: int, only_stats: bool =
     times_and_radii = {}
     for key in radii_names:
         times_and_radii[key] = []
-    for event in events_list:
-        start_time = event
-        imported_data = HeliosData(start_date=start_time.strftime('%d/%m/%Y'), start_hour=start_time.hour,
-                                   duration=1, probe=probe)
-        try:
-            radius = imported_data.data['r_sun'].loc[event]
-        except ValueError:
-            radius = np.mean(imported_data.data['r_sun'].values)
-            print('exception in finding the radius')
-        for n in range(len(radii_divisions)):
-            radius_division = radii_divisions[len(radii_divisions) - n - 1]
-            if radius > radius_division:
-                radius_type = radii_names[len(radii_divisions) - n - 1]
-                times_and_radii[radius_type].append([event, radius])
-                break
+    radii = get_event_radii(events_list, probe)
+    for event, radius, radius_type in zip(events_list, radii, get_radius_types(radii)):
+        if radius_type >= 0:
+            times_and_radii[radii_names[radius_type]].append([event, radius])
     for key in times_and_radii.keys():
         if only_stats:
             times_and_radii[key] = len(times_and_radii[key])
@@ -59,6 +41,17 @@ def distances_stats(events_list: List[datetime], probe: int, only_stats: bool =
     return times_and_radii
 
 
+def get_radius_types(radii: np.ndarray, right: bool = True) -> np.ndarray:
+    """
+    :param radii: distances from the sun
+    :param right: if True, a radius equal to a division belongs to the type below it, otherwise to the type above it
+    :return: index in radii_names of the type of each radius, -1 for the radii below the first division or nan
+    """
+    radius_types = np.digitize(radii, radii_divisions, right=right) - 1
+    radius_types[np.isnan(radii)] = -1
+    return radius_types
+
+
 def time_stats(events_list: List[datetime], mode: str = 'yearly') -> dict:
     """
     :param events_list: list of reconnection events
@@ -90,37 +83,29 @@ def time_stats(events_list: List[datetime], mode: str = 'yearly') -> dict:
     return times
 
 
-def time_spent_at_distances(probe: int, start_date: str, end_date: str) -> dict:
+def time_spent_at_distances(probe: int, start_date: str, end_date: str,
+                            coverage: CoverageIndex = coverage_index) -> dict:
     """
     :param probe: 1 or 2 for Helios 1 or 2
     :param start_date: start date of analysis
     :param end_date: end date of analysis
+    :param coverage: index of the days with data
     :return: dictionary of the time spent per distance from the sun
     """
     orbiter = get_orbiter(start_time=start_date, end_time=end_date, probe=probe, interval=1)
     radii = np.array(np.sqrt(orbiter.x ** 2 + orbiter.y ** 2 + orbiter.z ** 2))
     time_spent = {}
-    radius_types = radii_divisions + [100]
-    for n in range(len(radii_divisions)):
-        time_spent[radii_names[n]] = len(radii[np.all([radii >= radius_types[n], radii < radius_types[n + 1]], axis=0)])
+    radius_types = get_radius_types(radii[radii < 100], right=False)
+    for n, count in enumerate(np.bincount(radius_types[radius_types >= 0], minlength=len(radii_names))):
+        time_spent[radii_names[n]] = int(count)
 
     time_spent['total time'] = len(radii[np.all([radii < 1.2], axis=0)])
-    for n in range(len(orbiter.times)):
-        date = orbiter.times[n]
-        _dir = helios_dir
-        directory = _dir + str(probe) + '\\' + str(date.year)
-        fls = [files for r, d, files in os.walk(directory) if files]
-        day_of_year = date.strftime('%j')
-        if 'h' + str(probe) + '_' + str(date.year) + '_' + str(day_of_year) + '_corefit.csv' not in fls[0]:
-            radius = radii[n]
-            time_spent['total time'] -= 1
-            for m in range(len(radii_divisions)):
-                radius_division = radii_divisions[len(radii_divisions) - m - 1]
-                if radius > radius_division:
-                    radius_type = radii_names[len(radii_divisions) - m - 1]
-                    time_spent[radius_type] -= 1
-                    break
-            print('no such file: ', 'h' + str(probe) + '_' + str(date.year) + '_' + str(day_of_year) + '_corefit.csv')
+    missing = ~coverage.is_available(probe, list(orbiter.times))
+    time_spent['total time'] -= int(np.sum(missing))
+    missing_types = get_radius_types(radii[missing])
+    for n, count in enumerate(np.bincount(missing_types[missing_types >= 0], minlength=len(radii_names))):
+        time_spent[radii_names[n]] -= int(count)
+    print('no data on', int(np.sum(missing)), 'of the', len(radii), 'days')
     pprint.pprint(time_spent)
     return time_spent
 
@@ -135,9 +120,7 @@ def time_spent_at_date(probe: int, start_date: str, end_date: str, accuracy: flo
     :return: time spent per year or per month
     """
     implemented_modes = ['yearly', 'monthly']
-    orbiter = kernel_loader(probe)
     times = orbit_times_generator(start_date, end_date, interval=accuracy)
-    orbit_generator(orbiter, times)
     time_spent = {}
     for time in times:
         if str(time.year) not in time_spent.keys():
@@ -237,27 +220,19 @@ def get_month_dict(days_of_year: list, year: int) -> dict:
     return days_per_month
 
 
-def filecount(probe: int, year: int = 0):
+def filecount(probe: int, year: int = 0, coverage: CoverageIndex = coverage_index):
     """
     :param probe: 1 or 2 for Helios 1 or 2
     :param year: year ot analyse, if within the probe mission dates, counts only the files in that year
-    :return:
+    :param coverage: index of the days with data
+    :return: number of days with data, and their days of the year
     """
-    directory = helios_dir + str(probe)
-    if probe == 1:
-        if 1974 <= year <= 1984:
-            directory = directory + '\\' + str(year)
-    if probe == 2:
-        if 1976 <= year <= 1979:
-            directory = directory + '\\' + str(year)
-
-    fls = [files for r, d, files in os.walk(directory) if files]
-    days_of_year = []
-    for file in fls[0]:
-        doy = int(file[8] + file[9] + file[10])
-        days_of_year.append(doy)
-    file_number = sum([len(files) for r, d, files in os.walk(directory) if files])
-    return file_number, days_of_year
+    first_day, available, _ = coverage.get_coverage(probe)
+    start_day, end_day = first_day.astype(date), (first_day + max(len(available) - 1, 0)).astype(date)
+    if (probe == 1 and 1974 <= year <= 1984) or (probe == 2 and 1976 <= year <= 1979):
+        start_day, end_day = date(year, 1, 1), date(year, 12, 31)
+    days = coverage.get_available_days(probe, start_day, end_day)
+    return len(days), [day.timetuple().tm_yday for day in days]
 
 
 def analyse_all_probes(mode: str = 'radius'):
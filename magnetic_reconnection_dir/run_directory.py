@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class RunDirectory:
+    def __init__(self, base_directory: str, **run_parameters):
+        """
+        Directory holding the results of the stages of a long run, so that a run which stopped can be resumed
+        Runs with the same parameters share the same directory, and the results found there are used instead of being
+        computed again.
+        :param base_directory: directory in which the directories of all the runs are kept
+        :param run_parameters: parameters of the run (probe, dates, finder parameters...)
+        """
+        run_key = json.dumps(run_parameters, sort_keys=True, default=str)
+        self.path = os.path.join(base_directory, hashlib.sha1(run_key.encode()).hexdigest()[:16])
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, 'run.json'), 'w') as run_file:
+            json.dump(run_parameters, run_file, default=str, indent=4)
+        self.cached: List[str] = []
+        self.recomputed: List[str] = []
+        self.incomplete: List[str] = []
+
+    def __repr__(self):
+        return '{}: {}'.format(self.__class__.__name__, self.path)
+
+    def load(self, name: str) -> Optional[Any]:
+        """
+        :param name: name of the result
+        :return: result saved under the given name, None if it has not been saved
+        """
+        try:
+            with open(os.path.join(self.path, name + '.json')) as result_file:
+                result = json.load(result_file, object_hook=decode_datetime)
+        except (FileNotFoundError, ValueError):
+            return None
+        self.cached.append(name)
+        return result
+
+    def save(self, name: str, result: Any):
+        """
+        Saves a result, which marks the stage that computed it as done
+        :param name: name of the result
+        :param result: result to save, made of JSON types, numbers and datetimes
+        :return:
+        """
+        file_path = os.path.join(self.path, name + '.json')
+        temporary_file_path = '{}.{}.tmp'.format(file_path, os.getpid())
+        with open(temporary_file_path, 'w') as result_file:
+            json.dump(result, result_file, default=encode_datetime)
+        os.replace(temporary_file_path, file_path)
+        self.recomputed.append(name)
+
+    def mark_incomplete(self, name: str):
+        """
+        Records a result which was computed during this run but is not saved because it is incomplete, so that the
+        next run computes it again
+        :param name: name of the result
+        :return:
+        """
+        self.recomputed.append(name)
+        self.incomplete.append(name)
+
+    def get_result(self, name: str, compute: Callable[[], Any],
+                   is_complete: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        :param name: name of the result
+        :param compute: function computing the result when it has not been saved yet
+        :param is_complete: if given, called after compute, and the result is only saved if it returns True (otherwise
+        it is marked as incomplete, so that the next run computes it again)
+        :return: result saved under the given name, or computed and then saved
+        """
+        result = self.load(name)
+        if result is None:
+            result = compute()
+            if is_complete is None or is_complete():
+                self.save(name, result)
+            else:
+                self.mark_incomplete(name)
+        return result
+
+    def summary(self) -> str:
+        """
+        :return: numbers of results which were taken from the run directory and which were computed during this run,
+        and the computed results which were incomplete and not saved
+        """
+        return '{}: {} results cached ({}), {} recomputed ({}), {} incomplete and not saved ({})'.format(
+            self.path, len(self.cached), ', '.join(self.cached), len(self.recomputed), ', '.join(self.recomputed),
+            len(self.incomplete), ', '.join(self.incomplete))
+
+
+def encode_datetime(value: Any) -> Any:
+    """
+    Encodes the values which are not JSON serializable
+    :param value: datetime or numpy number
+    :return: JSON serializable value
+    """
+    if isinstance(value, datetime):
+        return {'datetime': value.strftime(DATETIME_FORMAT)}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('{} is not JSON serializable'.format(value))
+
+
+def decode_datetime(dictionary: dict) -> Any:
+    """
+    :param dictionary: JSON object
+    :return: datetime if the object was encoded by encode_datetime, the object otherwise
+    """
+    if list(dictionary.keys()) == ['datetime']:
+        return datetime.strptime(dictionary['datetime'], DATETIME_FORMAT)
+    return dictionary
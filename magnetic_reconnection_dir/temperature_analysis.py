@@ -7,11 +7,12 @@ import matplotlib
 import matplotlib.lines as m_lines
 from scipy.stats import linregress
 
-from data_handler.data_importer.data_import import get_probe_data
+from data_handler.data_importer.data_import import get_event_data, get_event_data_blocks
 from data_handler.data_importer.imported_data import ImportedData
 from data_handler.utils.column_processing import get_outliers, get_derivative
 from magnetic_reconnection_dir.csv_utils import create_events_list_from_csv_files
-from magnetic_reconnection_dir.mva_analysis import hybrid_mva
+from magnetic_reconnection_dir.mva_analysis import get_b, get_side_data, hybrid, hybrid_mva, mva_batch, \
+    stack_b_windows
 import data_handler.utils.plotting_utils
 
 proton_mass = 1.67 * 10e-27
@@ -19,78 +20,46 @@ mu_0 = np.pi * 4e-7
 electron_charge = 1.6e-19
 k_b = 1.38e-23
 
+# outside, inside and mva intervals of the hybrid mva of each probe, in minutes
+MVA_INTERVALS = {1: (5, 1, 10), 2: (5, 1, 10), 'ulysses': (30, 10, 60)}
+OUTLIER_MINUTES = 10
 
-def temperature_analysis(events: List[List[Union[datetime, int]]]) -> List[float]:
+
+def temperature_analysis(events: List[List[Union[datetime, int]]],
+                         features: Optional[pd.DataFrame] = None) -> List[float]:
     """
     Analyses the actual and theoretical temperature increases
     :param events: list of reconnection events dates and associated probes
+    :param features: table of the features of the events returned by get_event_feature_table, built if None
     :return: relations between theoretical and actual temperature increases
     """
-    satisfied_test = 0
-    use_2_b = True
     print(len(events))
-    total_t, par_t, perp_t, t_diff = [], [], [], []
-    shear, small_shear, big_shear, medium_shear = get_shear_angle(events)
-    for event, probe in events:
-        print(event, probe)
-        try:
-            start = event - timedelta(hours=2)
-            imported_data = get_probe_data(probe=probe, start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour,
-                                           duration=4)
-            imported_data.data.dropna(inplace=True)
-            radius = imported_data.data.loc[event - timedelta(minutes=4):event, 'r_sun'][0]
-            duration, event_start, event_end = find_intervals(imported_data, event)
-            left_interval_end, right_interval_start = event_start, event_end
-            left_interval_start = event_start - timedelta(minutes=5)
-            right_interval_end = event_end + timedelta(minutes=5)
-
-            b_l_left, b_l_right, n_left, n_right, L, M, N = get_n_b(event, probe, imported_data, left_interval_start,
-                                                                    left_interval_end, right_interval_start,
-                                                                    right_interval_end)
-
-            if use_2_b:
-                b_l, n = [b_l_left, b_l_right], [n_left, n_right]
-            else:
-                b_l, n = [(b_l_left + b_l_right) / 2], [(n_left + n_right) / 2]
-
-            delta_t, dt_perp, dt_par = find_temperature(imported_data, b_l, n, left_interval_start, left_interval_end,
-                                                        right_interval_start, right_interval_end)
-            predicted_increase, alfven_speed = find_predicted_temperature(b_l, n)
-            if 0.8 * delta_t <= predicted_increase * 0.13 <= 1.2 * delta_t:
-                satisfied_test += 1
-            if radius < 0.5:
-                if [event, probe] in small_shear:
-                    s = 'small'
-                elif [event, probe] in big_shear:
-                    s = 'big'
-                else:
-                    s = 'medium'
-                print('small radius', radius, s)
-
-            if delta_t > 15:
-                print('DELTA T > 15', delta_t, event, radius)
-            if delta_t < 0:
-                print('delta t smaller than 0 ', delta_t, event, radius)
-
-            if [event, probe] in small_shear:
-                total_t.append([predicted_increase, delta_t, 'r', 'small shear'])
-                par_t.append([predicted_increase, dt_par, 'r', 'small shear '])
-                perp_t.append([predicted_increase, dt_perp, 'r', 'small shear '])
-                t_diff.append([dt_par, dt_perp, 'r', 'small shear '])
-            elif [event, probe] in big_shear:
-                total_t.append([predicted_increase, delta_t, 'b', 'big shear'])
-                par_t.append([predicted_increase, dt_par, 'b', 'big shear'])
-                perp_t.append([predicted_increase, dt_perp, 'b', 'big shear'])
-                t_diff.append([dt_par, dt_perp, 'b', 'big shear'])
-            else:
-                total_t.append([predicted_increase, delta_t, 'g', 'medium shear'])
-                par_t.append([predicted_increase, dt_par, 'g', 'medium shear'])
-                perp_t.append([predicted_increase, dt_perp, 'g', 'medium shear'])
-                t_diff.append([dt_par, dt_perp, 'g', 'medium shear'])
-        except ValueError:
-            print('value error')
+    if features is None:
+        features = get_event_feature_table(events)
+    shear_types = get_shear_types(features['shear_angle'].values)
+    satisfied_test = int(np.sum((0.8 * features['delta_t'] <= features['predicted_increase'] * 0.13) & (
+            features['predicted_increase'] * 0.13 <= 1.2 * features['delta_t'])))
+    for event, radius, delta_t, shear_type in zip(features['event'], features['radius'], features['delta_t'],
+                                                  shear_types):
+        if radius < 0.5:
+            print('small radius', radius, shear_type)
+        if delta_t > 15:
+            print('DELTA T > 15', delta_t, event, radius)
+        if delta_t < 0:
+            print('delta t smaller than 0 ', delta_t, event, radius)
     print('satisfied test: ', satisfied_test)
 
+    colors = {'small': 'r', 'big': 'b', 'medium': 'g'}
+    total_t, par_t, perp_t, t_diff = [], [], [], []
+    for predicted_increase, delta_t, dt_perp, dt_par, shear_type in zip(features['predicted_increase'],
+                                                                        features['delta_t'], features['delta_t_perp'],
+                                                                        features['delta_t_par'], shear_types):
+        label = shear_type + ' shear'
+        total_t.append([predicted_increase, delta_t, colors[shear_type], label])
+        par_t.append([predicted_increase, dt_par, colors[shear_type], label])
+        perp_t.append([predicted_increase, dt_perp, colors[shear_type], label])
+        t_diff.append([dt_par, dt_perp, colors[shear_type], label])
+
     slopes = plot_relations([[total_t, 'Proton temperature change versus ' + r'$mv_A^2$'],
                              [par_t, 'Parallel proton temperature change versus ' + r'$mv_A^2$'],
                              [perp_t, 'Perpendicular proton temperature change versus ' + r'$mv_A^2$'],
@@ -98,6 +67,103 @@ def temperature_analysis(events: List[List[Union[datetime, int]]]) -> List[float
     return slopes
 
 
+def get_event_feature_table(events: List[List[Union[datetime, int]]], use_2_b: bool = True) -> pd.DataFrame:
+    """
+    Finds the features of the events used by the temperature analysis in one pass, with the data of each day holding
+    events loaded once and the LMN coordinates of all the events of a probe found at once
+    :param events: list of reconnection events dates and associated probes
+    :param use_2_b: if True, the inflow temperatures and the Alfven speeds are found with the fields and densities of
+    both sides of the events, otherwise with their means
+    :return: table with one row per event (in the order of the events), with the event and probe, the radius, the
+    start, end and duration of the event, the shear angle, the L and M fields and the densities on both sides, the
+    changes in total, perpendicular and parallel temperatures (in eV), the exhaust temperature (in K), and the
+    predicted temperature increase (in eV) and Alfven speed (in m/s), nan where the data is missing
+    """
+    columns = ['event', 'probe', 'radius', 'event_start', 'event_end', 'duration', 'shear_angle', 'b_l_left',
+               'b_l_right', 'b_m_left', 'b_m_right', 'n_left', 'n_right', 'delta_t', 'delta_t_perp', 'delta_t_par',
+               'exhaust_temperature', 'predicted_increase', 'alfven_speed']
+    rows = [dict.fromkeys(columns, np.nan) for _ in events]
+    for row, (event, probe) in zip(rows, events):
+        row['event'], row['probe'] = event, probe
+
+    for probe in dict.fromkeys(probe for _, probe in events):
+        if probe not in MVA_INTERVALS:
+            raise NotImplementedError('The implemented probes are Helios 1, Helios 2 and Ulysses')
+        outside_interval, inside_interval, mva_interval = MVA_INTERVALS[probe]
+        positions = [position for position, (_, _probe) in enumerate(events) if _probe == probe]
+        data_blocks = get_event_data_blocks(probe, [events[position][0] for position in positions], duration=4)
+        windows, b_windows, side_b = [], [], []
+        for position in positions:
+            event = events[position][0]
+            try:
+                imported_data = get_event_data(probe, event - timedelta(hours=2), 4, data_blocks)
+            except RuntimeWarning:
+                continue
+            imported_data.data.dropna(inplace=True)
+            windows.append([position, imported_data])
+            b_windows.append(get_b(imported_data, event, interval=mva_interval))
+            side_b.append(get_side_data(imported_data, event, outside_interval, inside_interval)[:2])
+        if not windows:
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            L, _, _ = mva_batch(stack_b_windows(b_windows))
+            L, M, _ = hybrid(L, np.array([b1 for b1, _ in side_b]), np.array([b2 for _, b2 in side_b]))
+
+        for (position, imported_data), _l, _m in zip(windows, L, M):
+            row, event, data = rows[position], events[position][0], imported_data.data
+            r_sun = data.loc[event - timedelta(minutes=4):event, 'r_sun'].values
+            row['radius'] = r_sun[0] if len(r_sun) else np.nan
+            row['duration'], row['event_start'], row['event_end'] = find_intervals(imported_data, event)
+            left_interval_end, right_interval_start = row['event_start'], row['event_end']
+            left_interval_start = row['event_start'] - timedelta(minutes=5)
+            right_interval_end = row['event_end'] + timedelta(minutes=5)
+
+            with np.errstate(invalid='ignore'):
+                b_left = np.mean(data.loc[left_interval_start:left_interval_end, ['Bx', 'By', 'Bz']].values, axis=0)
+                b_right = np.mean(data.loc[right_interval_start:right_interval_end, ['Bx', 'By', 'Bz']].values, axis=0)
+                row['n_left'] = np.mean(data.loc[left_interval_start:left_interval_end, 'n_p'].values)
+                row['n_right'] = np.mean(data.loc[right_interval_start:right_interval_end, 'n_p'].values)
+                row['shear_angle'] = np.degrees(np.arccos(np.dot(b_right, b_left) / (
+                        np.linalg.norm(b_left) * np.linalg.norm(b_right))))
+            row['b_l_left'], row['b_l_right'] = np.abs(np.dot(b_left, _l)), np.abs(np.dot(b_right, _l))
+            row['b_m_left'], row['b_m_right'] = np.abs(np.dot(b_left, _m)), np.abs(np.dot(b_right, _m))
+
+            if use_2_b:
+                b_l, n = [row['b_l_left'], row['b_l_right']], [row['n_left'], row['n_right']]
+            else:
+                b_l, n = [(row['b_l_left'] + row['b_l_right']) / 2], [(row['n_left'] + row['n_right']) / 2]
+            try:
+                row['delta_t'], row['delta_t_perp'], row['delta_t_par'] = find_temperature(
+                    imported_data, b_l, n, left_interval_start, left_interval_end, right_interval_start,
+                    right_interval_end)
+                total_temperature = (2 * data['Tp_perp'] + data['Tp_par']) / 3
+                row['exhaust_temperature'] = np.percentile(
+                    total_temperature.loc[left_interval_end:right_interval_start].values, 90)
+            except (ValueError, IndexError):
+                print('no data inside the event', event, probe)
+
+    features = pd.DataFrame(rows, columns=columns)
+    if use_2_b:
+        b_l, n = [features['b_l_left'].values, features['b_l_right'].values], [features['n_left'].values,
+                                                                               features['n_right'].values]
+    else:
+        b_l = [(features['b_l_left'].values + features['b_l_right'].values) / 2]
+        n = [(features['n_left'].values + features['n_right'].values) / 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features['predicted_increase'], features['alfven_speed'] = find_predicted_temperature(b_l, n)
+    return features
+
+
+def get_shear_types(shear_angles: np.ndarray) -> np.ndarray:
+    """
+    :param shear_angles: shear angles in degrees
+    :return: 'small' for the angles up to 90 degrees, 'big' for the angles above 135 degrees and 'medium' otherwise
+    (and for nan)
+    """
+    with np.errstate(invalid='ignore'):
+        return np.where(shear_angles <= 90, 'small', np.where(shear_angles > 135, 'big', 'medium'))
+
+
 def plot_relations(related_lists: List[list], slope: Optional[float] = None) -> List[float]:
     """
     Plots the relations between predicted increase in temperature and actual increase in temperature
@@ -172,7 +238,6 @@ def find_intervals(imported_data: ImportedData, event: datetime) -> Tuple:
     :param event: time and date of reconnection
     :return: duration of the event, start of the event, end of the event
     """
-    duration = []
     if imported_data.probe == 1 or imported_data.probe == 2 or imported_data.probe == 'ace' or imported_data.probe == 'wind':
         max_interval = timedelta(minutes=2)
         default_event_duration = 2
@@ -182,14 +247,17 @@ def find_intervals(imported_data: ImportedData, event: datetime) -> Tuple:
     else:
         raise NotImplementedError('The implemented probes are Helios 1, Helios 2 and Ulysses')
     try:
-        perp_outliers = get_outliers(get_derivative(imported_data.data['Tp_perp']), standard_deviations=1.5,
-                                     reference='median')
-        par_outliers = get_outliers(get_derivative(imported_data.data['Tp_par']), standard_deviations=1.5,
+        # the outliers only depend on the points within OUTLIER_MINUTES of them, so only the data around the event is
+        # analysed (with a margin for the derivatives)
+        margin = max_interval + timedelta(minutes=OUTLIER_MINUTES + 5)
+        data = imported_data.data.loc[event - margin:event + margin]
+        perp_outliers = get_outliers(get_derivative(data['Tp_perp']), minutes=OUTLIER_MINUTES,
+                                     standard_deviations=1.5, reference='median')
+        par_outliers = get_outliers(get_derivative(data['Tp_par']), minutes=OUTLIER_MINUTES, standard_deviations=1.5,
                                     reference='median')
-        for n in range(len(perp_outliers)):
-            if not np.isnan(perp_outliers[n]) and not np.isnan(par_outliers[n]):
-                if event - max_interval < perp_outliers.index[n] < event + max_interval:
-                    duration.append(perp_outliers.index[n])
+        times = perp_outliers.index
+        is_close = (times > event - max_interval) & (times < event + max_interval)
+        duration = list(times[is_close & perp_outliers.notna().values & par_outliers.notna().values])
         if len(duration) <= 1:
             event_duration = default_event_duration
             if len(duration) == 0:
@@ -285,12 +353,11 @@ def get_n_b(event: datetime, probe: int, imported_data: ImportedData, left_inter
     :param guide_field: if True, returns bm_left and bm_right
     :return: the left and right L magnetic fields and densities, and the L, M, N vectors
     """
-    if probe == 1 or probe == 2:
-        L, M, N = hybrid_mva(event, probe, outside_interval=5, inside_interval=1, mva_interval=10)
-    elif probe == 'ulysses':
-        L, M, N = hybrid_mva(event, probe, outside_interval=30, inside_interval=10, mva_interval=60)
-    else:
+    if probe not in MVA_INTERVALS:
         raise NotImplementedError('The implemented probes are Helios 1, Helios 2 and Ulysses')
+    outside_interval, inside_interval, mva_interval = MVA_INTERVALS[probe]
+    L, M, N = hybrid_mva(event, probe, outside_interval=outside_interval, inside_interval=inside_interval,
+                         mva_interval=mva_interval)
     b_left = (np.array([np.mean((imported_data.data.loc[left_interval_start:left_interval_end, 'Bx']).values),
                         np.mean((imported_data.data.loc[left_interval_start:left_interval_end, 'By']).values),
                         np.mean((imported_data.data.loc[left_interval_start:left_interval_end, 'Bz']).values)]))
@@ -313,113 +380,57 @@ def n_to_shear():
     Plots relationships between solar wind characteristics
     :return:
     """
-    density, angle, guide = [], [], []
     events = create_events_list_from_csv_files([['helios1_magrec2.csv', 1], ['helios1mag_rec3.csv', 1]])
     events += create_events_list_from_csv_files([['helios2_magrec2.csv', 2], ['helios2mag_rec3.csv', 2]])
-    for n in range(len(events)):
-        print(events[n])
-        start = events[n][0] - timedelta(hours=2)
-        imported_data = get_probe_data(probe=events[n][1], start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour,
-                                       duration=4)
-        imported_data.data.dropna(inplace=True)
-        duration, event_start, event_end = find_intervals(imported_data, events[n][0])
-        left_interval_end, right_interval_start = event_start, event_end
-        left_interval_start = event_start - timedelta(minutes=5)
-        right_interval_end = event_end + timedelta(minutes=5)
-        b_l_left, b_l_right, b_m_left, b_m_right, n_left, n_right = get_n_b(events[n][0], events[n][1], imported_data,
-                                                                            left_interval_start, left_interval_end,
-                                                                            right_interval_start, right_interval_end,
-                                                                            guide_field=True)
-        b_g = (b_l_left + b_l_right) / (b_m_left + b_m_right)
-        shear, a, b, c = get_shear_angle([events[n]])
-        if shear:
-            angle.append(shear[0])
-            n_p = (n_left + n_right) / 2
-            density.append(n_p)
-            guide.append(b_g)
+    features = get_event_feature_table(events)
+    features = features[features['shear_angle'].notna()]
+    angle = features['shear_angle'].values
+    density = ((features['n_left'] + features['n_right']) / 2).values
+    guide = ((features['b_l_left'] + features['b_l_right']) / (features['b_m_left'] + features['b_m_right'])).values
 
     plt.scatter(angle, density)
     plt.show()
 
 
-def get_shear_angle(events_list: List[List[Union[datetime, int]]]) -> Tuple[
+def get_shear_angle(events_list: List[List[Union[datetime, int]]], features: Optional[pd.DataFrame] = None) -> Tuple[
     List[np.ndarray], List[list], List[list], List[list]]:
     """
     Finds the shear angle of events
     :param events_list: list of events to be analysed
+    :param features: table of the features of the events returned by get_event_feature_table, built if None
     :return: shear angles, and lists of events with low, medium and high shear angles
     """
-    shear, small_shear, big_shear, medium_shear = [], [], [], []
-    probe_for_title = []
-    for event, probe in events_list:
-        print(event)
-        if probe not in probe_for_title:
-            probe_for_title.append(probe)
-        start = event - timedelta(hours=1)
-        imported_data = get_probe_data(probe=probe, start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour,
-                                       duration=2)
-        imported_data.data.dropna(inplace=True)
-        duration, event_start, event_end = find_intervals(imported_data, event)
-        left_interval_end, right_interval_start = event_start, event_end
-        left_interval_start = event_start - timedelta(minutes=5)
-        right_interval_end = event_end + timedelta(minutes=5)
-
-        b_left = (np.array([np.mean((imported_data.data.loc[left_interval_start:left_interval_end, 'Bx']).values),
-                            np.mean((imported_data.data.loc[left_interval_start:left_interval_end, 'By']).values),
-                            np.mean((imported_data.data.loc[left_interval_start:left_interval_end, 'Bz']).values)]))
-        b_right = (np.array([np.mean((imported_data.data.loc[right_interval_start: right_interval_end, 'Bx']).values),
-                             np.mean((imported_data.data.loc[right_interval_start: right_interval_end, 'By']).values),
-                             np.mean((imported_data.data.loc[right_interval_start: right_interval_end, 'Bz']).values)]))
-        br_mag = np.sqrt(b_left[0] ** 2 + b_left[1] ** 2 + b_left[2] ** 2)
-        bl_mag = np.sqrt(b_right[0] ** 2 + b_right[1] ** 2 + b_right[2] ** 2)
-        theta = np.arccos((np.dot(b_right, b_left) / (bl_mag * br_mag)))
-        theta = np.degrees(theta)
-        if not np.isnan(theta):
-            shear.append(theta)
-        if theta <= 90:
-            small_shear.append([event, probe])
-        elif theta > 135:
-            big_shear.append([event, probe])
-        else:
-            medium_shear.append([event, probe])
+    if features is None:
+        features = get_event_feature_table(events_list)
+    shear_angles = features['shear_angle'].values
+    shear = list(shear_angles[~np.isnan(shear_angles)])
+    small_shear, big_shear, medium_shear = [], [], []
+    shear_lists = {'small': small_shear, 'big': big_shear, 'medium': medium_shear}
+    for event, probe, shear_type in zip(features['event'], features['probe'], get_shear_types(shear_angles)):
+        shear_lists[shear_type].append([event, probe])
     print('shear', shear)
     # plt.hist(shear, bins=10, width=10)
     # plt.xlabel('Shear angle in degrees')
     # plt.ylabel('Frequency')
-    # title_for_probe = ''
-    # for loop in range(len(probe_for_title)):
-    #     if len(probe_for_title) == 1 or loop == len(probe_for_title)-1:
-    #         comma = ''
-    #     else:
-    #         comma = ','
-    #     title_for_probe = title_for_probe + str(probe_for_title[loop]) + comma
-    #
-    # plt.title('Shear angle analysis for probes ' + title_for_probe)
+    # plt.title('Shear angle analysis for probes ' + ','.join(str(probe) for probe in features['probe'].unique()))
     # plt.show()
     return shear, small_shear, big_shear, medium_shear
 
 
-def plot_temperature_as_function_of_dist(events: List[List[Union[datetime, int]]]):
-    temp, dist = [], []
-    for event, probe in events:
-        try:
-            start = event - timedelta(hours=2)
-            imported_data = get_probe_data(probe=probe, start_date=start.strftime('%d/%m/%Y'), start_hour=start.hour,
-                                           duration=4)
-            imported_data.data.dropna(inplace=True)
-            radius = imported_data.data.loc[event - timedelta(minutes=4):event, 'r_sun'][0]
-            duration, event_start, event_end = find_intervals(imported_data, event)
-            left_interval_end, right_interval_start = event_start, event_end
-            perpendicular_temperature, parallel_temperature = imported_data.data['Tp_perp'], imported_data.data[
-                'Tp_par']
-            total_temperature = (2 * perpendicular_temperature + parallel_temperature) / 3
-            t_exhaust = np.percentile((total_temperature.loc[left_interval_end:right_interval_start]).values, 90)
-            print(event, probe, t_exhaust)
-            dist.append(radius)
-            temp.append(t_exhaust)
-        except ValueError:
-            print('Value error')
-    plt.plot(dist, temp, '.')
+def plot_temperature_as_function_of_dist(events: List[List[Union[datetime, int]]],
+                                         features: Optional[pd.DataFrame] = None):
+    """
+    Plots the exhaust temperatures of the events against their distances from the sun
+    :param events: list of reconnection events dates and associated probes
+    :param features: table of the features of the events returned by get_event_feature_table, built if None
+    :return:
+    """
+    if features is None:
+        features = get_event_feature_table(events)
+    features = features[features['exhaust_temperature'].notna()]
+    for event, probe, t_exhaust in zip(features['event'], features['probe'], features['exhaust_temperature']):
+        print(event, probe, t_exhaust)
+    plt.plot(features['radius'].values, features['exhaust_temperature'].values, '.')
     plt.title('Exhaust temperature against distance from the sun')
     plt.xlabel('Distance from the sun [AU]')
     plt.ylabel('Exhaust temperature [K]')